@@ -0,0 +1,190 @@
+import asyncio, json, math, os, time
+from collections import deque
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError, DBAPIError
+from starlette.responses import JSONResponse
+import metrics, coalesce
+
+# Admission control for expensive routes. Each route class has a concurrency limit and
+# a bounded FIFO queue: a full queue answers 429, a request that waits longer than the
+# queue timeout answers 503, both with Retry-After estimated from recent service times.
+# Limits are per worker process. Report sessions also get a per-statement timeout
+# (statement_timeout on Postgres, a progress handler on SQLite) and their running
+# query is cancelled when the client disconnects.
+
+# class -> (max concurrent, max queued, queue timeout seconds); ADMISSION_LIMITS (JSON)
+# overrides, e.g. {"reports": [8, 32, 5]}
+LIMITS = {"reports": (4, 16, 10.0), "upload": (2, 4, 30.0)}
+LIMITS.update({k: tuple(v) for k, v in json.loads(os.getenv("ADMISSION_LIMITS", "{}")).items()})
+STATEMENT_TIMEOUT_MS = int(os.getenv("REPORT_STATEMENT_TIMEOUT_MS", "30000"))
+
+def route_class(scope):
+    path = scope.get("path", "")
+    if path.startswith("/reports"):
+        return "reports"
+    if path.startswith("/upload") or path.endswith("/upload"):
+        return "upload"
+    return None
+
+class Rejected(Exception):
+    def __init__(self, status, retry_after):
+        self.status, self.retry_after = status, retry_after
+
+class Limiter:
+    def __init__(self, name, limit, queue, timeout):
+        self.name, self.limit, self.queue, self.timeout = name, limit, queue, timeout
+        self.active = 0
+        self.waiters = deque()
+        self.avg_seconds = 1.0  # EWMA of service time, for Retry-After
+        self.rejected = {429: 0, 503: 0}
+
+    def retry_after(self):
+        return max(1, math.ceil(self.avg_seconds * (len(self.waiters) + 1) / self.limit))
+
+    async def acquire(self):
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return
+        if len(self.waiters) >= self.queue:
+            self.rejected[429] += 1
+            raise Rejected(429, self.retry_after())
+        fut = asyncio.get_running_loop().create_future()
+        self.waiters.append(fut)
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), self.timeout)
+        except asyncio.TimeoutError:
+            if fut.done():
+                return  # slot handed over just as we timed out
+            self.waiters.remove(fut)
+            self.rejected[503] += 1
+            raise Rejected(503, self.retry_after())
+        except BaseException:
+            if fut.done():
+                self.release(0)
+            else:
+                self.waiters.remove(fut)
+            raise
+
+    def release(self, seconds):
+        if seconds:
+            self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * seconds
+        while self.waiters:
+            fut = self.waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)  # the slot passes to the next waiter
+                return
+        self.active -= 1
+
+limiters = {name: Limiter(name, *cfg) for name, cfg in LIMITS.items()}
+
+class AdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limiter = limiters.get(route_class(scope)) if scope["type"] == "http" else None
+        if limiter is None:
+            return await self.app(scope, receive, send)
+        try:
+            await limiter.acquire()
+        except Rejected as r:
+            detail = "Too many queued requests" if r.status == 429 else "Timed out waiting for capacity"
+            return await JSONResponse({"detail": f"{detail} for {limiter.name}"}, status_code=r.status,
+                                      headers={"Retry-After": str(r.retry_after)})(scope, receive, send)
+        started = time.monotonic()
+        try:
+            await self._run_cancellable(scope, receive, send)
+        finally:
+            limiter.release(time.monotonic() - started)
+
+    async def _run_cancellable(self, scope, receive, send):
+        # a pump owns receive() so a client disconnect is seen while a sync handler is
+        # still running; handlers register cancel callbacks in scope["db_cancel"]
+        callbacks = scope["db_cancel"] = []
+        queue = asyncio.Queue()
+        done = False
+
+        async def pump():
+            while True:
+                message = await receive()
+                await queue.put(message)
+                if message["type"] == "http.disconnect":
+                    if not done:
+                        for cancel in list(callbacks):
+                            cancel()
+                    return
+
+        async def send_wrapper(message):
+            nonlocal done
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                done = True  # servers report a disconnect once the response is complete
+            await send(message)
+
+        task = asyncio.create_task(pump())
+        try:
+            await self.app(scope, queue.get, send_wrapper)
+        finally:
+            done = True
+            task.cancel()
+
+def render():
+    out = ["# HELP admission_in_flight Requests holding an admission slot", "# TYPE admission_in_flight gauge"]
+    out += [f'admission_in_flight{{class="{n}"}} {l.active}' for n, l in limiters.items()]
+    out += ["# HELP admission_queued Requests waiting for an admission slot", "# TYPE admission_queued gauge"]
+    out += [f'admission_queued{{class="{n}"}} {len(l.waiters)}' for n, l in limiters.items()]
+    out += ["# HELP admission_rejected_total Requests turned away by admission control", "# TYPE admission_rejected_total counter"]
+    out += [f'admission_rejected_total{{class="{n}",status="{s}"}} {c}' for n, l in limiters.items() for s, c in l.rejected.items()]
+    return out
+
+metrics.collectors.append(render)
+
+# Statement timeouts and cancellation for report sessions
+@event.listens_for(Engine, "before_cursor_execute")
+def _stamp_statement(conn, cursor, statement, parameters, context, executemany):
+    if "statement_timeout" in conn.info:
+        conn.info["statement_started"] = time.monotonic()
+
+def guard_session(db, scope, timeout_ms=None):
+    # apply the statement timeout to db's connection and register its cancellation for
+    # a client disconnect; returns a function that undoes both
+    timeout_ms = STATEMENT_TIMEOUT_MS if timeout_ms is None else timeout_ms
+    conn = db.connection()
+    raw = conn.connection.driver_connection
+    dialect = conn.dialect.name
+    cleanup = []
+    if timeout_ms and dialect == "postgresql":
+        conn.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+    elif timeout_ms and dialect == "sqlite":
+        info = conn.info
+        info["statement_timeout"] = timeout_ms / 1000
+        info["statement_started"] = time.monotonic()
+        raw.set_progress_handler(lambda: int(time.monotonic() - info.get("statement_started", 0) > info.get("statement_timeout", math.inf)), 10000)
+        def reset():
+            raw.set_progress_handler(None, 0)
+            info.pop("statement_timeout", None); info.pop("statement_started", None)
+        cleanup.append(reset)
+    cancel = getattr(raw, "cancel", None) or getattr(raw, "interrupt", None)
+    callbacks = scope.get("db_cancel")
+    if cancel and callbacks is not None:
+        # a coalesced report is shared with other requests (see coalesce.abandon)
+        db.info["db_cancel"] = cancel
+        def on_disconnect():
+            if coalesce.abandon(db):
+                cancel()
+        callbacks.append(on_disconnect)
+        def unregister():
+            callbacks.remove(on_disconnect)
+            db.info.pop("db_cancel", None)
+        cleanup.append(unregister)
+    def release():
+        for fn in cleanup:
+            fn()
+    return release
+
+def is_timeout(exc):
+    # statement timeout / interrupt surfaced by the driver
+    if not isinstance(exc, (OperationalError, DBAPIError)):
+        return False
+    msg = str(getattr(exc, "orig", exc)).lower()
+    return "statement timeout" in msg or "interrupted" in msg or "canceling statement" in msg
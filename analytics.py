@@ -0,0 +1,311 @@
+import atexit, logging, os, sys, threading, time
+from sqlalchemy import create_engine, select, func, inspect, MetaData, Table, Column, Date, DateTime, Numeric
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import sessionmaker
+from database import engine as primary
+import models, changefeed
+
+# Optional columnar mirror of the reporting tables in an embedded DuckDB file. The
+# crud.report_* functions run unchanged against a session bound to it (?engine=columnar),
+# so heavy scans leave the primary alone. A background thread keeps it in sync, woken
+# by the change feed: append-mostly tables copy new rows by id high-water mark, reload
+# the rows the feed names as updated or deleted, and are copied again in full only when
+# it reports a rewrite without row ids; small tables are replaced when the feed names
+# them or their row count/max id moved. Requests wait up to ANALYTICS_MAX_WAIT for
+# pending updates/deletes and get a 503 rather than stale rows. Writes made outside this
+# process on SQLite do not reach the feed; their inserts and deletes are still picked
+# up, updates only by the periodic full rebuild.
+# DuckDB lets one process open a file read-write, or any number read-only, never both,
+# and a read-only opener would not see another process's syncs. So every worker keeps
+# its own mirror: "{pid}" in ANALYTICS_URL (the default) names a file per process,
+# removed at exit. A URL without it can only be used by a single worker.
+# Needs the change feed (CHANGEFEED=1) and the duckdb and duckdb-engine packages.
+
+ENABLED = os.getenv("ANALYTICS", "0") == "1"  # start syncing at boot, not on first use
+ANALYTICS_URL = os.getenv("ANALYTICS_URL", "duckdb:///./analytics.{pid}.duckdb")
+SYNC_INTERVAL = float(os.getenv("ANALYTICS_SYNC_INTERVAL", "30"))
+REBUILD_INTERVAL = float(os.getenv("ANALYTICS_REBUILD_INTERVAL", "3600"))
+MAX_WAIT = float(os.getenv("ANALYTICS_MAX_WAIT", "2"))
+MAX_LAG = float(os.getenv("ANALYTICS_MAX_LAG", str(3 * SYNC_INTERVAL)))
+BATCH = int(os.getenv("ANALYTICS_BATCH", "100000"))
+ID_BATCH = 1000
+DEBOUNCE = 0.2
+log = logging.getLogger("balancebuilt.analytics")
+
+# order headers are rewritten by every line change (order_totals), by id
+INCREMENTAL = [models.JournalEntry, models.JournalEntryLine, models.SalesOrder, models.SalesOrderLine, models.PurchaseOrder,
+               models.PurchaseOrderLine, models.CashFlow, models.TaxLedger]
+SNAPSHOT = [models.GLAccount, models.Product, models.Customer, models.Vendor, models.Inventory, models.AccountsReceivable, models.AccountsPayable, models.Budget, models.FixedAsset,
+            models.FXRate, models.Forecast, models.PeriodClose, models.PeriodSummary, models.ArchivedPeriod]
+MIRRORED = {m.__tablename__ for m in INCREMENTAL + SNAPSHOT}
+INCREMENTAL_TABLES = {m.__tablename__ for m in INCREMENTAL}
+# archiving deletes journals, possibly from another process
+ARCHIVED = {"journal_entries", "journal_entry_lines"}
+
+class ColumnarUnavailable(RuntimeError):
+    pass
+
+class ColumnarStale(RuntimeError):
+    pass
+
+_lock = threading.Lock()     # engine setup
+_sync_lock = threading.Lock()  # one sync at a time
+_state = threading.Condition()
+_engine = None
+_Session = None
+_syncer = None
+_seq = 0            # change events seen
+_dirty = {}         # table -> seq of its latest change not yet copied
+_rewritten = {}     # incremental table -> seq of its latest update/delete of unknown rows not yet copied
+_rows = {}          # incremental table -> {id: seq} of updated/deleted rows not yet reloaded
+_full = True        # the next sync copies everything
+_built = False
+_synced_at = None
+_rebuilt_at = None
+
+def _mirror_metadata():
+    # same tables and columns, no constraints/indexes/sequences: the mirror is loaded
+    # in bulk and scanned, never written row by row
+    md = MetaData()
+    for model in INCREMENTAL + SNAPSHOT:
+        t = model.__table__
+        Table(t.name, md, *[Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False) for c in t.columns])
+    return md
+
+def mirror_url():
+    return ANALYTICS_URL.replace("{pid}", str(os.getpid()))
+
+def get_engine():
+    global _engine, _Session
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                try:
+                    import duckdb_engine  # noqa: F401
+                except ImportError:
+                    raise ColumnarUnavailable("the columnar engine needs the duckdb and duckdb-engine packages")
+                eng = create_engine(mirror_url())
+                md = _mirror_metadata()
+                try:
+                    names = inspect(eng).get_table_names()
+                except DBAPIError as e:
+                    eng.dispose()
+                    raise ColumnarUnavailable(f"cannot open the columnar mirror (is another worker using it?): {e.orig}")
+                for t in md.sorted_tables:
+                    # a table whose columns changed is dropped and copied again in full
+                    if t.name in names and {c["name"] for c in inspect(eng).get_columns(t.name)} != set(t.c.keys()):
+                        t.drop(eng)
+                md.create_all(eng)
+                _engine, _Session = eng, sessionmaker(autocommit=False, autoflush=False, bind=eng)
+    return _engine
+
+def _frame(table, rows):
+    import pandas as pd
+    df = pd.DataFrame(rows, columns=[c.name for c in table.columns])
+    for c in table.columns:
+        if isinstance(c.type, (Date, DateTime)):
+            df[c.name] = pd.to_datetime(df[c.name], errors="coerce")
+        elif isinstance(c.type, Numeric):
+            df[c.name] = pd.to_numeric(df[c.name], errors="coerce")
+    return df
+
+def _load(conn, table, rows):
+    if not rows:
+        return 0
+    raw = conn.connection.driver_connection
+    dialect = conn.engine.dialect
+    cols = ", ".join(f'CAST("{c.name}" AS {c.type.compile(dialect=dialect)}) AS "{c.name}"' for c in table.columns)
+    raw.register("_batch", _frame(table, rows))
+    try:
+        raw.execute(f'INSERT INTO "{table.name}" SELECT {cols} FROM _batch')
+    finally:
+        raw.unregister("_batch")
+    return len(rows)
+
+def _changed(ev):
+    # change feed hook, on the committing (or listening) thread; None: events were missed
+    global _seq, _full
+    with _state:
+        _seq += 1
+        if ev is None:
+            _full = True
+        else:
+            for t in MIRRORED.intersection(ev["tables"]):
+                _dirty[t] = _seq
+            rows = ev.get("rows") or {}
+            for t in INCREMENTAL_TABLES.intersection(ev.get("rewritten", ())):
+                if t in rows:
+                    _rows.setdefault(t, {}).update(dict.fromkeys(rows[t], _seq))
+                else:
+                    _rewritten[t] = _seq
+        _state.notify_all()
+
+def _pending():
+    return _full or bool(_dirty) or bool(_rewritten) or bool(_rows)
+
+def sync(full: bool = False):
+    # bring the mirror up to date; returns rows copied per table touched
+    global _full, _built, _synced_at, _rebuilt_at
+    eng = get_engine()
+    with _sync_lock:
+        with _state:
+            seq = _seq
+            full = full or _full or _rebuilt_at is None or time.monotonic() - _rebuilt_at > REBUILD_INTERVAL
+            dirty, rewritten = set(_dirty), set(_rewritten)
+            rows = {t: set(ids) for t, ids in _rows.items()}
+            _full = False
+        try:
+            with primary.connect() as src, eng.begin() as dst:
+                copied = _copy(src, dst, full, dirty, rewritten, rows)
+        except Exception:
+            with _state:
+                _full = _full or full
+            raise
+        with _state:
+            # changes that arrived during the copy stay pending for the next sync
+            for pending in (_dirty, _rewritten):
+                for t in [t for t, s in pending.items() if s <= seq]:
+                    del pending[t]
+            for t, ids in list(_rows.items()):
+                for i in [i for i, s in ids.items() if s <= seq]:
+                    del ids[i]
+                if not ids:
+                    del _rows[t]
+            _synced_at = time.monotonic()
+            if full:
+                _built, _rebuilt_at = True, _synced_at
+            _state.notify_all()
+    return copied
+
+def _fingerprint(conn, t):
+    return tuple(conn.execute(select(func.count(), func.max(t.c.id)).select_from(t)).one())
+
+def _reload(src, dst, t, ids, hwm):
+    # replace the mirror's copy of rows updated or deleted since they were copied; rows
+    # above the high-water mark are not in the mirror yet
+    ids = sorted(i for i in ids if hwm is not None and i <= hwm)
+    n = 0
+    for start in range(0, len(ids), ID_BATCH):
+        chunk = ids[start:start + ID_BATCH]
+        dst.execute(t.delete().where(t.c.id.in_(chunk)))
+        n += _load(dst, t, src.execute(select(t).where(t.c.id.in_(chunk)).order_by(t.c.id)).all())
+    return n
+
+def _copy(src, dst, full, dirty, rewritten, rewritten_ids=None):
+    copied = {}
+    ap = models.ArchivedPeriod.__table__
+    if not full and _fingerprint(src, ap) != _fingerprint(dst, ap):
+        rewritten |= ARCHIVED
+    for model in INCREMENTAL + SNAPSHOT:
+        t = model.__table__
+        if model in SNAPSHOT:
+            replace = full or t.name in dirty or _fingerprint(src, t) != _fingerprint(dst, t)
+            if not replace:
+                continue
+        else:
+            replace = full or t.name in rewritten
+        n = 0
+        if replace:
+            dst.exec_driver_sql(f'DELETE FROM "{t.name}"')
+            hwm = None
+        else:
+            hwm = dst.exec_driver_sql(f'SELECT max(id) FROM "{t.name}"').scalar()
+            if rewritten_ids and rewritten_ids.get(t.name):
+                n += _reload(src, dst, t, rewritten_ids[t.name], hwm)
+        while True:
+            stmt = select(t).order_by(t.c.id).limit(BATCH)
+            if hwm is not None:
+                stmt = stmt.where(t.c.id > hwm)
+            rows = src.execute(stmt).all()
+            n += _load(dst, t, rows)
+            if len(rows) < BATCH:
+                break
+            hwm = rows[-1][0]
+        if replace or n:
+            copied[t.name] = n
+    return copied
+
+class Syncer(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True, name="analytics-syncer")
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                sync()
+            except Exception:
+                log.exception("columnar sync failed")
+                self.stopped.wait(SYNC_INTERVAL)
+                continue
+            with _state:
+                if not _pending():
+                    _state.wait(SYNC_INTERVAL)
+            # let a burst of commits land in one sync
+            self.stopped.wait(DEBOUNCE)
+
+    def stop(self):
+        # at exit, so no copy is cut off mid-way inside DuckDB
+        self.stopped.set()
+        with _state:
+            _state.notify_all()
+        self.join(timeout=30)
+
+def _shutdown():
+    _syncer.stop()
+    _engine.dispose()
+    if "{pid}" in ANALYTICS_URL:
+        # a per-process mirror is rebuilt in full by the next process anyway
+        path = _engine.url.database
+        for f in (path, path + ".wal"):
+            try:
+                os.remove(f)
+            except OSError:
+                pass
+
+def _start_syncer():
+    global _syncer
+    if _syncer is None:
+        if not changefeed.ENABLED:
+            raise ColumnarUnavailable("the columnar engine needs the change feed (CHANGEFEED=1)")
+        get_engine()
+        with _lock:
+            if _syncer is None:
+                changefeed.bus.hooks.append(_changed)
+                _syncer = Syncer()
+                _syncer.start()
+                atexit.register(_shutdown)
+    return _syncer
+
+def start():
+    # at app startup; with ANALYTICS=1 the mirror is built before the first columnar request
+    if ENABLED:
+        try:
+            return _start_syncer()
+        except ColumnarUnavailable as e:
+            log.warning("columnar mirror not started: %s", e)
+    return None
+
+def get_db():
+    # report session on the mirror; waits up to MAX_WAIT for a first build or for pending
+    # updates/deletes to journal and line tables, then refuses rather than serve stale rows
+    _start_syncer()
+    deadline = time.monotonic() + MAX_WAIT
+    with _state:
+        while not _built or _full or _rewritten or _rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ColumnarStale("the columnar mirror is catching up with recent changes")
+            _state.wait(remaining)
+        if time.monotonic() - _synced_at > MAX_LAG:
+            raise ColumnarStale(f"the columnar mirror has not synced for {time.monotonic() - _synced_at:.0f}s")
+    db = _Session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    # python analytics.py [--full]: one sync by hand into a fixed ANALYTICS_URL, while no
+    # app worker holds that file
+    print(sync(full="--full" in sys.argv))
@@ -1,8 +1,9 @@
 import os
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from database import Base, engine, get_db
-import models
+from fastapi.responses import JSONResponse, PlainTextResponse
+from database import get_db, WriteQueueTimeout
+import models, crud, fx, periods, metrics, profiling, compression, admission, matviews, changefeed, analytics
 from routers import (
     vendors, customers, products, warehouses,
     purchase_orders, purchase_order_lines, sales_orders, sales_order_lines,
@@ -11,16 +12,24 @@ from routers import (
     budgets, fixed_assets, fx_rates, journal_entries, journal_lines,
     cost_centers, tax_ledger, cash_flow, reconciliation,
     forecasts, calendar_events,
-    search, reports
+    search, reports, events
 )
 from dotenv import load_dotenv
 load_dotenv()
 
-app = FastAPI(title="BalanceBuilt ERP API", version="1.0.0")
+app = FastAPI(title="BalanceBuilt ERP API", version="1.0.0", default_response_class=metrics.JSONResponse)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(admission.AdmissionMiddleware)
+app.add_middleware(profiling.ProfileMiddleware)
+app.add_middleware(compression.CompressionMiddleware)
+# added last so it wraps everything else
+app.add_middleware(metrics.MetricsMiddleware)
+profiling.start_background()
+matviews.start()
+changefeed.start()
+analytics.start()
 
-# create tables
-Base.metadata.create_all(bind=engine)
+# schema is managed by migrate.py, run once per deploy before the workers start
 
 # include routers
 app.include_router(vendors.router)
@@ -50,11 +59,36 @@ app.include_router(forecasts.router)
 app.include_router(calendar_events.router)
 app.include_router(search.router)
 app.include_router(reports.router)
+app.include_router(events.router)
+
+@app.exception_handler(crud.InvalidParameter)
+def invalid_parameter(request: Request, exc: crud.InvalidParameter):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(fx.RateNotFound)
+def rate_not_found(request: Request, exc: fx.RateNotFound):
+    return JSONResponse(status_code=422, content={"detail": str(exc)})
+
+@app.exception_handler(periods.PeriodClosedError)
+def period_closed(request: Request, exc: periods.PeriodClosedError):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+@app.exception_handler(WriteQueueTimeout)
+def write_queue_timeout(request: Request, exc: WriteQueueTimeout):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
 
 @app.get("/health")
 def health():
     return {"status":"ok"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/slow_queries")
+def slow_queries():
+    return list(metrics.slow_queries)
+
 # generic upload mapping
 crud_table_mapping = {
     "vendors": models.Vendor,
@@ -0,0 +1,154 @@
+import argparse, datetime, os
+from sqlalchemy import select, delete, insert, or_, text
+from sqlalchemy.orm import Session
+from database import engine
+import models, periods, partitions, matviews, changefeed
+
+# Cold-period archival. `python archive.py --period 2023-01` (or --before) exports a
+# closed period's journals and journal lines to Parquet under ARCHIVE_DIR and removes
+# them from the database: with a partitioned journal_entry_lines the month's partition
+# is detached and dropped, otherwise the rows are deleted. archived_periods records
+# what moved where. The closed-period summaries stay, and the journal reports add
+# archived months back from the Parquet files (read once per file and kept as daily
+# per-account sums), so totals do not change. Archived periods cannot be reopened.
+# ARCHIVE_DIR must be shared by every worker. Requires the pyarrow package.
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "zstd")
+CHANGED = {"journal_entries", "journal_entry_lines", "archived_periods"}
+
+class ArchiveError(RuntimeError):
+    pass
+
+def _pandas():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ArchiveError("archiving needs the pyarrow package")
+    import pandas as pd
+    return pd
+
+def _month(period: str):
+    try:
+        return datetime.datetime.strptime(period, "%Y-%m").date()
+    except ValueError:
+        raise ArchiveError(f"period must be YYYY-MM, got {period!r}")
+
+def lines_path(period: str):
+    return os.path.join(ARCHIVE_DIR, "journal_entry_lines", f"period={period}.parquet")
+
+def entries_path(period: str):
+    return os.path.join(ARCHIVE_DIR, "journal_entries", f"period={period}.parquet")
+
+def _write(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    df.to_parquet(tmp, compression=COMPRESSION, index=False)
+    os.replace(tmp, path)
+
+def archived(db: Session):
+    # period -> journal lines file, for every archived period
+    ap = models.ArchivedPeriod
+    return dict(db.execute(select(ap.period, ap.path)).all())
+
+def archive_period(period: str):
+    pd = _pandas()
+    first = _month(period)
+    after = partitions.next_month(first)
+    je, jel, ap = models.JournalEntry.__table__, models.JournalEntryLine.__table__, models.ArchivedPeriod.__table__
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('archive'))"))
+        if conn.execute(select(models.PeriodClose.id).where(models.PeriodClose.period == period)).first() is None:
+            raise ArchiveError(f"period {period} is not closed")
+        if conn.execute(select(ap.c.id).where(ap.c.period == period)).first() is not None:
+            raise ArchiveError(f"period {period} is already archived")
+        journal_ids = select(je.c.id).where(je.c.date >= first, je.c.date < after)
+        in_period = or_(jel.c.date.between(first, after - datetime.timedelta(days=1)), jel.c.journal_id.in_(journal_ids))
+        entries = pd.read_sql(select(je).where(je.c.date >= first, je.c.date < after).order_by(je.c.id), conn)
+        lines = pd.read_sql(select(jel).where(in_period).order_by(jel.c.id), conn)
+        # undated lines take their journal's date so the archive aggregates by day
+        lines["date"] = lines["date"].where(lines["date"].notna(), lines["journal_id"].map(dict(zip(entries["id"], entries["date"]))))
+        _write(entries, entries_path(period))
+        _write(lines, lines_path(period))
+        partition = partitions.partitions(conn).get(first) if partitions.is_partitioned(conn) else None
+        if partition:
+            conn.execute(text(f"ALTER TABLE {partitions.TABLE} DETACH PARTITION {partition}"))
+            conn.execute(text(f"DROP TABLE {partition}"))
+        conn.execute(delete(jel).where(in_period))
+        conn.execute(delete(je).where(je.c.date >= first, je.c.date < after))
+        conn.execute(insert(ap).values(period=period, archived_at=datetime.datetime.utcnow(), journal_entries=len(entries),
+                                       journal_lines=len(lines), path=lines_path(period)))
+        if changefeed.ENABLED and conn.dialect.name == "postgresql":
+            changefeed.notify(conn, CHANGED, changefeed.JOURNALS)
+    if changefeed.ENABLED and engine.dialect.name != "postgresql":
+        # reaches this process's subscribers only, e.g. when archiving from inside the app
+        changefeed.bus.publish(CHANGED, changefeed.JOURNALS)
+    if matviews.ENABLED and engine.dialect.name == "postgresql":
+        matviews.refresh("mv_gl_monthly")
+    return {"period": period, "journal_entries": len(entries), "journal_lines": len(lines), "partition": partition}
+
+def archive_before(period: str):
+    # every closed, not yet archived period before `period`
+    _month(period)
+    with Session(engine) as db:
+        todo = sorted(p for p in periods.closed_periods(db) if p < period and p not in archived(db))
+    return [archive_period(p) for p in todo]
+
+# Reading archived periods back
+_sums = {}
+
+def _daily_sums(path):
+    # (date, account_code, cost_center, debit, credit) per day, account and cost center;
+    # cached per file and modification time
+    try:
+        mtime = os.path.getmtime(path)
+    except FileNotFoundError:
+        raise ArchiveError(f"archived journals missing at {path}; is ARCHIVE_DIR shared?")
+    hit = _sums.get(path)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    pd = _pandas()
+    df = pd.read_parquet(path, columns=["date", "account_code", "cost_center", "debit", "credit"])
+    df = df.astype({"debit": float, "credit": float}).fillna({"debit": 0.0, "credit": 0.0})
+    grouped = df.groupby(["date", "account_code", "cost_center"], dropna=False, sort=False)[["debit", "credit"]].sum().reset_index()
+    rows = [tuple(None if pd.isna(v) else v for v in r[:3]) + (float(r[3]), float(r[4])) for r in grouped.itertuples(index=False)]
+    _sums[path] = (mtime, rows)
+    return rows
+
+KEYS = {"date": 0, "account_code": 1, "cost_center": 2}
+
+def gl_totals(db: Session, by, first: datetime.date = None, last: datetime.date = None):
+    # archived journal line sums as (*by, debit, credit), by any of date, month
+    # ('YYYY-MM'), account_code and cost_center, for archived days in [first, last]
+    files = archived(db)
+    lo = periods.period_of(first) if first else None
+    hi = periods.period_of(last) if last else None
+    files = [path for p, path in sorted(files.items()) if (lo is None or p >= lo) and (hi is None or p <= hi)]
+    if not files:
+        return []
+    totals = {}
+    for path in files:
+        for row in _daily_sums(path):
+            d = row[0]
+            if d is None or (first and d < first) or (last and d > last):
+                continue
+            key = tuple(periods.period_of(d) if k == "month" else row[KEYS[k]] for k in by)
+            t = totals.setdefault(key, [0.0, 0.0])
+            t[0] += row[3]; t[1] += row[4]
+    return [(*k, dr, cr) for k, (dr, cr) in totals.items()]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive closed periods' journals to Parquet")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--period", help="archive one closed period (YYYY-MM)")
+    group.add_argument("--before", help="archive every closed period before this one (YYYY-MM)")
+    args = parser.parse_args()
+    try:
+        done = [archive_period(args.period)] if args.period else archive_before(args.before)
+    except ArchiveError as e:
+        parser.error(str(e))
+    for r in done:
+        print(f"archived {r['period']}: {r['journal_entries']} journals, {r['journal_lines']} lines" + (f" (dropped {r['partition']})" if r["partition"] else ""))
+    if not done:
+        print("nothing to archive")
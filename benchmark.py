@@ -0,0 +1,202 @@
+import argparse, datetime, json, os, socket, statistics, subprocess, sys, threading, time, uuid
+import urllib.request, urllib.error
+from urllib.parse import urlencode
+
+# HTTP benchmark against a running server (load it with synthetic_data.py first).
+# Times every /reports/* endpoint, list pagination, search and bulk upload, writes
+# the results as JSON and, given --baseline, flags cases whose p50 regressed by more
+# than --threshold. Exits 1 on regressions so it can gate CI.
+#   python benchmark.py --base-url http://localhost:10000 --out bench.json
+#   python benchmark.py --base-url ... --baseline bench.json
+# --startup instead measures cold start locally: `import app` in a fresh interpreter
+# and uvicorn launch to first /health response, against DATABASE_URL.
+# --concurrency N runs N client threads for --seconds, mixing vendor inserts
+# (--write-ratio) with list/report reads, and reports throughput and error rates.
+
+def cases(today):
+    period = (today.replace(day=1) - datetime.timedelta(days=1)).strftime("%Y-%m")
+    # synthetic_data.py closes months older than a year
+    closed = today.replace(year=today.year - 2).strftime("%Y-%m")
+    year = today.year
+    reports = [
+        ("trial_balance", {}), ("trial_balance", {"period": period}), ("trial_balance", {"period": period, "currency": "EUR"}),
+        ("trial_balance", {"period": closed}),
+        ("pnl", {"period": period}), ("net_sales", {"period": period}),
+        ("actual_vs_forecast", {"metric": "net_sales", "start": f"{year - 1}-01", "end": period}),
+        ("ar_aging", {}), ("inventory_value", {}), ("inventory_metrics", {}), ("top_customers_vendors", {}),
+        ("budget_vs_actual", {"year": year}), ("cash_flow", {"granularity": "month"}), ("cash_flow/projection", {}),
+        ("tax_summary", {"period": period}), ("period_summary", {"period": closed}),
+        ("cube", {"fact": "sales_lines", "dims": "month,customer", "measures": "qty,revenue"}),
+        ("cube", {"fact": "purchase_lines", "dims": "vendor,product", "measures": "cost", "rollup": "true"}),
+        ("depreciation", {"start": f"{year}-01", "periods": 12}),
+    ]
+    out = [(f"GET /reports/{path}" + (f"?{urlencode(q)}" if q else ""), "GET", f"/reports/{path}", q) for path, q in reports]
+    for table in ("journal_lines", "sales_orders", "accounts_receivable"):
+        for skip in (0, 10000, 100000):
+            q = {"skip": skip, "limit": 100}
+            out.append((f"GET /{table}/?{urlencode(q)}", "GET", f"/{table}/", q))
+    for term in ("Vendor", "Product 1", "zzz-no-match"):
+        out.append((f"GET /search/?q={term}", "GET", "/search/", {"q": term}))
+    return out
+
+def _request(base_url, method, path, query=None, body=None, headers=None):
+    url = base_url.rstrip("/") + path + (f"?{urlencode(query)}" if query else "")
+    req = urllib.request.Request(url, data=body, method=method, headers=headers or {})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req) as resp:
+            size = len(resp.read()); status = resp.status
+    except urllib.error.HTTPError as e:
+        size = len(e.read()); status = e.code
+    return (time.perf_counter() - start) * 1000, status, size
+
+def _upload_body(rows):
+    # multipart/form-data with a CSV of new vendors
+    boundary = uuid.uuid4().hex
+    run = uuid.uuid4().hex[:8]
+    csv = "name,email\n" + "".join(f"Bench {run}-{i},b{i}@bench.example\n" for i in range(rows))
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"vendors.csv\"\r\n"
+            f"Content-Type: text/csv\r\n\r\n{csv}\r\n--{boundary}--\r\n").encode()
+    return body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+def _summary(times, statuses, sizes):
+    times = sorted(times)
+    return {"n": len(times), "p50_ms": round(statistics.median(times), 2),
+            "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))], 2),
+            "mean_ms": round(statistics.fmean(times), 2), "status": sorted(set(statuses)), "bytes": max(sizes)}
+
+def run(base_url, repeat=5, warmup=1, upload_rows=1000, today=None):
+    today = today or datetime.date.today()
+    results = {}
+    for name, method, path, query in cases(today):
+        for _ in range(warmup):
+            _request(base_url, method, path, query)
+        samples = [_request(base_url, method, path, query) for _ in range(repeat)]
+        results[name] = _summary(*zip(*samples))
+        print(f"{name:80s} {results[name]['p50_ms']:>10.2f} ms", file=sys.stderr)
+    samples = []
+    for _ in range(repeat):
+        body, headers = _upload_body(upload_rows)
+        samples.append(_request(base_url, "POST", "/vendors/upload", body=body, headers=headers))
+    name = f"POST /vendors/upload ({upload_rows} rows)"
+    results[name] = _summary(*zip(*samples))
+    print(f"{name:80s} {results[name]['p50_ms']:>10.2f} ms", file=sys.stderr)
+    return {"base_url": base_url, "at": datetime.datetime.now().isoformat(timespec="seconds"), "repeat": repeat, "results": results}
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def startup(repeat=5):
+    here = os.path.dirname(os.path.abspath(__file__))
+    imports, boots = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import app"], cwd=here, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        imports.append((time.perf_counter() - start) * 1000)
+        port = _free_port()
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port)], cwd=here, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1).read()
+                    break
+                except (urllib.error.URLError, ConnectionError):
+                    if proc.poll() is not None or time.perf_counter() - start > 60:
+                        raise RuntimeError("server did not come up")
+                    time.sleep(0.02)
+            boots.append((time.perf_counter() - start) * 1000)
+        finally:
+            proc.terminate(); proc.wait()
+    results = {"startup: import app": _summary(imports, [0] * repeat, [0] * repeat),
+               "startup: uvicorn to first /health": _summary(boots, [200] * repeat, [0] * repeat)}
+    for name, r in results.items():
+        print(f"{name:80s} {r['p50_ms']:>10.2f} ms", file=sys.stderr)
+    return {"base_url": None, "at": datetime.datetime.now().isoformat(timespec="seconds"), "repeat": repeat, "results": results}
+
+def concurrency(base_url, threads=16, seconds=10.0, write_ratio=0.2):
+    reads = [("/vendors/", {"limit": 50}), ("/journal_lines/", {"limit": 100}), ("/reports/ar_aging", None)]
+    run_id = uuid.uuid4().hex[:8]
+    stats = {"read": [], "write": []}
+    errors = {"read": 0, "write": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(n):
+        i = 0
+        while time.perf_counter() < deadline:
+            i += 1
+            if (i * 7919 + n) % 100 < write_ratio * 100:
+                kind = "write"
+                body = json.dumps({"name": f"Bench {run_id}-{n}-{i}"}).encode()
+                ms, status, _ = _request(base_url, "POST", "/vendors/", body=body, headers={"Content-Type": "application/json"})
+            else:
+                kind = "read"
+                path, query = reads[i % len(reads)]
+                ms, status, _ = _request(base_url, "GET", path, query)
+            with lock:
+                stats[kind].append((ms, status, 0))
+                if status >= 400:
+                    errors[kind] += 1
+
+    workers = [threading.Thread(target=client, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for w in workers: w.start()
+    for w in workers: w.join()
+    elapsed = time.perf_counter() - started
+    results = {}
+    for kind, samples in stats.items():
+        if samples:
+            r = _summary(*zip(*samples))
+            r.update({"ops_per_s": round(len(samples) / elapsed, 1), "errors": errors[kind]})
+            results[f"concurrency {threads}x: {kind}"] = r
+            print(f"{kind:6s} {r['ops_per_s']:>8.1f} ops/s  p50 {r['p50_ms']:.1f} ms  p95 {r['p95_ms']:.1f} ms  errors {errors[kind]}", file=sys.stderr)
+    return {"base_url": base_url, "at": datetime.datetime.now().isoformat(timespec="seconds"), "threads": threads, "results": results}
+
+def compare(current, baseline, threshold=0.2, floor_ms=5.0):
+    # a case regresses when its p50 grows by more than threshold (relative) and floor_ms
+    regressions = []
+    for name, cur in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            continue
+        delta = cur["p50_ms"] - old["p50_ms"]
+        if delta > floor_ms and delta > old["p50_ms"] * threshold:
+            regressions.append({"case": name, "baseline_ms": old["p50_ms"], "current_ms": cur["p50_ms"],
+                                "change": f"+{delta / old['p50_ms'] * 100:.0f}%" if old["p50_ms"] else "new"})
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the HTTP API")
+    parser.add_argument("--base-url", default="http://localhost:10000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--upload-rows", type=int, default=1000)
+    parser.add_argument("--today", type=datetime.date.fromisoformat, default=None, help="anchor date used for report periods")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare against an earlier --out file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p50 growth (default 0.2)")
+    parser.add_argument("--startup", action="store_true", help="measure cold start instead of endpoints")
+    parser.add_argument("--concurrency", type=int, help="client threads for the mixed read/write throughput run")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+    if args.startup:
+        current = startup(args.repeat)
+    elif args.concurrency:
+        current = concurrency(args.base_url, args.concurrency, args.seconds, args.write_ratio)
+    else:
+        current = run(args.base_url, args.repeat, args.warmup, args.upload_rows, args.today)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(current, json.load(f), args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['case']}: {r['baseline_ms']} ms -> {r['current_ms']} ms ({r['change']})")
+        sys.exit(1 if regressions else 0)
+    if not args.out:
+        print(json.dumps(current, indent=2))
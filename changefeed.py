@@ -0,0 +1,312 @@
+import asyncio, datetime, json, logging, os, select as _select, threading, time
+from collections import deque
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from database import engine
+import metrics
+
+# Table change feed for live dashboards. Every committed session that wrote rows
+# (ORM flushes, bulk uploads, core INSERT/UPDATE/DELETE through a session) produces
+# one event naming the tables it touched and the reports that read them; clients
+# subscribe at /events/stream and refetch only those. On Postgres the event is a
+# NOTIFY sent inside the writing transaction (delivered on commit, dropped on
+# rollback) and every worker LISTENs, so all workers see every write. Elsewhere
+# (SQLite) events go through an in-process bus and a worker only sees its own writes.
+# Connection-level writes (order_totals, partitions, archive) emit their events explicitly.
+# Events carry no row data; internally they also name the tables that had rows updated
+# or deleted ("rewritten") and, where known and few, the ids of those rows ("rows"),
+# which in-process hooks such as the columnar mirror use.
+
+ENABLED = os.getenv("CHANGEFEED", "1") == "1"
+CHANNEL = "balancebuilt_changes"
+KEEPALIVE = float(os.getenv("CHANGEFEED_KEEPALIVE", "15"))
+DEBOUNCE = float(os.getenv("CHANGEFEED_DEBOUNCE_MS", "200")) / 1000
+QUEUE_SIZE = 256
+ROW_LIMIT = 500  # rewritten ids carried per table; beyond it the whole table counts as rewritten
+HISTORY = 1000
+log = logging.getLogger("balancebuilt.changefeed")
+
+JOURNALS = {"journal_entries", "journal_entry_lines"}
+# report -> tables it reads
+REPORT_TABLES = {
+    "trial_balance": JOURNALS | {"period_closes", "period_summaries", "fx_rates"},
+    "pnl": JOURNALS | {"gl_accounts", "fx_rates"},
+    "net_sales": {"sales_orders", "sales_order_lines", "fx_rates"},
+    "actual_vs_forecast": JOURNALS | {"gl_accounts", "sales_orders", "sales_order_lines", "forecasts"},
+    "ar_aging": {"accounts_receivable", "fx_rates"},
+    "inventory_value": {"products", "inventory"},
+    "inventory_metrics": JOURNALS | {"gl_accounts", "products", "inventory"},
+    "top_customers_vendors": {"accounts_receivable", "accounts_payable", "customers", "vendors"},
+    "budget_vs_actual": JOURNALS | {"gl_accounts", "budgets"},
+    "cash_flow": {"cash_flow"},
+    "cash_flow_projection": {"cash_flow", "accounts_receivable", "accounts_payable"},
+    "tax_summary": {"tax_ledger", "period_closes", "period_summaries"},
+    "period_summary": {"period_closes", "period_summaries"},
+    "depreciation": {"fixed_assets"},
+    "cube": {"sales_orders", "sales_order_lines", "purchase_orders", "purchase_order_lines", "products", "customers", "vendors"},
+}
+
+def reports_for(tables):
+    return sorted(r for r, sources in REPORT_TABLES.items() if sources & set(tables))
+
+# In-process bus
+BOOT = f"{os.getpid():x}{int(time.time()):x}"
+
+class Subscription:
+    def __init__(self, loop, tables=None, reports=None):
+        self.loop = loop
+        self.tables, self.reports = set(tables or ()), set(reports or ())
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def match(self, ev):
+        # the event narrowed to what this subscriber asked for, or None
+        if not self.tables and not self.reports:
+            return ev
+        tables = [t for t in ev["tables"] if t in self.tables]
+        reports = [r for r in ev["reports"] if r in self.reports]
+        if not tables and not reports:
+            return None
+        return {**ev, "tables": tables, "reports": reports}
+
+    def offer(self, ev):
+        # any thread; None asks the client to refetch everything
+        if ev is not None:
+            ev = self.match(ev)
+            if ev is None:
+                return
+        try:
+            self.loop.call_soon_threadsafe(self._put, ev)
+        except RuntimeError:
+            pass  # the subscriber's loop is gone
+
+    def _put(self, ev):
+        if ev is not None:
+            try:
+                self.queue.put_nowait(ev)
+                return
+            except asyncio.QueueFull:
+                pass  # a slow client refetches everything instead
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+class Bus:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.seq = 0
+        self.recent = deque(maxlen=HISTORY)
+        self.published = 0
+        # plain callables run on the publishing thread with every event (None on resync)
+        self.hooks = []
+
+    def publish(self, tables, rewritten=(), rows=None):
+        tables = sorted(tables)
+        with self.lock:
+            self.seq += 1
+            ev = {"id": f"{BOOT}-{self.seq}", "seq": self.seq, "tables": tables, "reports": reports_for(tables),
+                  "rewritten": sorted(rewritten), "rows": {t: sorted(ids) for t, ids in (rows or {}).items()}, "at": datetime.datetime.utcnow().isoformat(timespec="milliseconds") + "Z"}
+            self.recent.append(ev)
+            self.published += 1
+            subs = list(self.subscribers)
+        self._run_hooks(ev)
+        for sub in subs:
+            sub.offer(ev)
+        return ev
+
+    def resync(self):
+        with self.lock:
+            subs = list(self.subscribers)
+        self._run_hooks(None)
+        for sub in subs:
+            sub.offer(None)
+
+    def _run_hooks(self, ev):
+        for hook in list(self.hooks):
+            try:
+                hook(ev)
+            except Exception:
+                log.exception("change feed hook failed")
+
+    def subscribe(self, loop, tables=None, reports=None, last_event_id=None):
+        # returns the subscription and the events it missed since last_event_id; None
+        # there means the id is unknown here (another worker, or too old): refetch all
+        sub = Subscription(loop, tables, reports)
+        with self.lock:
+            self.subscribers.add(sub)
+            missed = []
+            if last_event_id:
+                boot, _, seq = last_event_id.rpartition("-")
+                if boot == BOOT and seq.isdigit() and int(seq) >= self.seq - len(self.recent):
+                    missed = [e for e in self.recent if e["seq"] > int(seq)]
+                else:
+                    missed = None
+        if missed:
+            missed = [m for m in map(sub.match, missed) if m is not None]
+        return sub, missed
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscribers.discard(sub)
+
+bus = Bus()
+
+# Capturing writes
+def notify(conn, tables, rewritten=(), rows=None):
+    # NOTIFY inside conn's transaction; Postgres only
+    payload = {"tables": sorted(tables), "rewritten": sorted(rewritten), "rows": {t: sorted(ids) for t, ids in (rows or {}).items()}}
+    conn.execute(text("SELECT pg_notify(:c, :p)"), {"c": CHANNEL, "p": json.dumps(payload)})
+
+def record(session, tables, rewritten=(), rows=None):
+    # also called directly by writes through session.connection(), which raise no ORM events;
+    # rows: table -> ids of its rewritten rows, where known
+    tables = {t for t in tables if t}
+    rewritten = {t for t in rewritten if t}
+    if not ENABLED or not tables:
+        return
+    pending = session.info.setdefault("changefeed", set())
+    pending_rewritten = session.info.setdefault("changefeed_rewritten", set())
+    # table -> rewritten ids so far, None once a rewrite of unknown (or too many) rows is seen
+    pending_rows = session.info.setdefault("changefeed_rows", {})
+    new, new_rewritten, new_rows = tables - pending, rewritten - pending_rewritten, {}
+    for t in rewritten:
+        if t in pending_rows and pending_rows[t] is None:
+            continue
+        ids = (rows or {}).get(t)
+        known = pending_rows.get(t, set())
+        if ids is None or len(known) + len(ids) > ROW_LIMIT:
+            pending_rows[t] = None
+            new_rewritten.add(t)
+        elif set(ids) - known or t in new_rewritten:
+            new_rows[t] = set(ids) - known
+            pending_rows[t] = known | new_rows[t]
+            new_rewritten.add(t)
+    if not new and not new_rewritten:
+        return
+    pending |= new
+    pending_rewritten |= new_rewritten
+    if session.get_bind().dialect.name == "postgresql":
+        notify(session.connection(), new | new_rewritten, new_rewritten, new_rows)
+
+def _published_rows(session):
+    rows = session.info.pop("changefeed_rows", None) or {}
+    return {t: ids for t, ids in rows.items() if ids is not None}
+
+@event.listens_for(Session, "after_flush")
+def _flushed(session, flush_context):
+    name = lambda objs: {getattr(obj, "__tablename__", None) for obj in objs}
+    rewrites = (*session.dirty, *session.deleted)
+    rows = {}
+    for obj in rewrites:
+        if getattr(obj, "__tablename__", None) and getattr(obj, "id", None) is not None:
+            rows.setdefault(obj.__tablename__, set()).add(obj.id)
+    record(session, name((*session.new, *rewrites)), name(rewrites), rows)
+
+@event.listens_for(Session, "do_orm_execute")
+def _dml(state):
+    if state.is_insert or state.is_update or state.is_delete:
+        t = getattr(state.statement, "table", None)
+        if t is not None:
+            record(state.session, {t.name}, {t.name} if state.is_update or state.is_delete else ())
+
+@event.listens_for(Session, "after_commit")
+def _committed(session):
+    tables = session.info.pop("changefeed", None)
+    rewritten = session.info.pop("changefeed_rewritten", ())
+    rows = _published_rows(session)
+    if tables and session.get_bind().dialect.name != "postgresql":
+        bus.publish(tables, rewritten, rows)
+
+@event.listens_for(Session, "after_rollback")
+def _rolled_back(session):
+    session.info.pop("changefeed", None)
+    session.info.pop("changefeed_rewritten", None)
+    session.info.pop("changefeed_rows", None)
+
+# Postgres fan-out
+class Listener(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True, name="changefeed-listener")
+        self.stopped = threading.Event()
+
+    def run(self):
+        failed = False
+        while not self.stopped.is_set():
+            raw = None
+            try:
+                # a dedicated connection, taken out of the pool for good
+                raw = engine.raw_connection()
+                raw.detach()
+                conn = raw.driver_connection
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {CHANNEL}")
+                if failed:
+                    bus.resync()  # events may have been missed while disconnected
+                    failed = False
+                while not self.stopped.is_set():
+                    if _select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        payload = json.loads(conn.notifies.pop(0).payload)
+                        bus.publish(payload["tables"], payload.get("rewritten", ()), payload.get("rows"))
+            except Exception:
+                log.exception("change feed listener failed; reconnecting")
+                failed = True
+                self.stopped.wait(5.0)
+            finally:
+                if raw is not None:
+                    raw.close()
+
+listener = None
+
+def start():
+    global listener
+    if ENABLED and engine.dialect.name == "postgresql" and listener is None:
+        listener = Listener()
+        listener.start()
+    return listener
+
+# SSE
+def _sse(ev):
+    if ev is None:
+        return "event: resync\ndata: {}\n\n"
+    return f"id: {ev['id']}\nevent: change\ndata: {json.dumps({k: ev[k] for k in ('tables', 'reports', 'at')})}\n\n"
+
+def _merge(a, b):
+    return {**b, "tables": sorted(set(a["tables"]) | set(b["tables"])), "reports": sorted(set(a["reports"]) | set(b["reports"]))}
+
+async def stream(tables=None, reports=None, last_event_id=None):
+    # text/event-stream body; events arriving within DEBOUNCE of each other go out as one
+    sub, missed = bus.subscribe(asyncio.get_running_loop(), tables, reports, last_event_id)
+    try:
+        yield "retry: 3000\n\n"
+        if missed is None:
+            yield _sse(None)
+        for ev in missed or ():
+            yield _sse(ev)
+        while True:
+            try:
+                ev = await asyncio.wait_for(sub.queue.get(), KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            deadline = time.monotonic() + DEBOUNCE
+            while ev is not None:
+                remaining = deadline - time.monotonic()
+                try:
+                    more = sub.queue.get_nowait() if remaining <= 0 else await asyncio.wait_for(sub.queue.get(), remaining)
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                ev = None if more is None else _merge(ev, more)
+            yield _sse(ev)
+    finally:
+        bus.unsubscribe(sub)
+
+def render():
+    return ["# HELP changefeed_subscribers Open change feed streams", "# TYPE changefeed_subscribers gauge",
+            f"changefeed_subscribers {len(bus.subscribers)}",
+            "# HELP changefeed_events_total Change events received by this worker", "# TYPE changefeed_events_total counter",
+            f"changefeed_events_total {bus.published}"]
+
+metrics.collectors.append(render)
@@ -0,0 +1,107 @@
+import functools, os, threading
+import metrics
+
+# Single-flight for report functions: concurrent calls with the same report, arguments
+# and database share one in-flight computation. The first caller runs it; callers that
+# arrive while it is running wait and get the same result (or exception). Nothing is
+# cached once the call finishes, so a result is never older than the request that
+# joined it. A caller whose client disconnects detaches (see abandon); the shared query
+# is cancelled only when the last attached caller has gone.
+
+ENABLED = os.getenv("REPORT_COALESCE", "1") == "1"
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters", "cancel")
+    def __init__(self, cancel=None):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 1  # attached callers whose clients are still connected
+        self.cancel = cancel  # cancels the leader's query
+
+_lock = threading.Lock()
+_calls = {}
+executed = {}
+coalesced = {}
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    return value
+
+def single_flight(fn):
+    # fn(db, *args, **kwargs); the key includes the session's bind so primary and
+    # columnar calls are never merged
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(db, *args, **kwargs):
+        if not ENABLED:
+            return fn(db, *args, **kwargs)
+        key = (name, str(db.get_bind().url), _freeze(args), _freeze(kwargs))
+        with _lock:
+            call = _calls.get(key)
+            leader = call is None
+            if leader:
+                call = _calls[key] = _Call(db.info.get("db_cancel"))
+                executed[name] = executed.get(name, 0) + 1
+            else:
+                call.waiters += 1
+                coalesced[name] = coalesced.get(name, 0) + 1
+            db.info["single_flight"] = call
+        if not leader:
+            try:
+                call.done.wait()
+            finally:
+                with _lock:
+                    db.info.pop("single_flight", None)
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn(db, *args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with _lock:
+                del _calls[key]
+                db.info.pop("single_flight", None)
+                call.cancel = None
+            call.done.set()
+    return wrapper
+
+def abandon(db):
+    # db's client went away. Returns True if db's own query should be cancelled; a
+    # caller in a shared call detaches instead, and the last one to go cancels it.
+    with _lock:
+        call = db.info.pop("single_flight", None)
+        if call is None:
+            return True
+        call.waiters -= 1
+        cancel = call.cancel if call.waiters == 0 else None
+    if cancel:
+        cancel()
+    return False
+
+def render():
+    with _lock:
+        names = sorted(set(executed) | set(coalesced))
+        out = ["# HELP report_calls_total Report calls by outcome (executed or joined an in-flight call)",
+               "# TYPE report_calls_total counter"]
+        for n in names:
+            out.append(f'report_calls_total{{report="{n}",outcome="executed"}} {executed.get(n, 0)}')
+            out.append(f'report_calls_total{{report="{n}",outcome="coalesced"}} {coalesced.get(n, 0)}')
+        out += ["# HELP report_coalescing_ratio Share of report calls served by another in-flight call",
+                "# TYPE report_coalescing_ratio gauge"]
+        for n in names:
+            total = executed.get(n, 0) + coalesced.get(n, 0)
+            out.append(f'report_coalescing_ratio{{report="{n}"}} {coalesced.get(n, 0) / total if total else 0}')
+    return out
+
+metrics.collectors.append(render)
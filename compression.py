@@ -0,0 +1,136 @@
+import json, os, zlib
+
+# Negotiated response compression: zstd, br or gzip, whichever the client accepts and
+# is installed (brotli and zstandard are optional packages), preferred in that order.
+# Complete bodies under COMPRESS_MIN_SIZE bytes go out as is; streamed bodies
+# (StreamingResponse) are compressed chunk by chunk and flushed after each chunk so
+# NDJSON readers still see rows as they are produced. Event streams and already
+# encoded or binary content types are never touched.
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESSIBLE = ("text/", "application/json", "application/x-ndjson", "application/xml", "application/javascript", "application/csv")
+SKIP = ("text/event-stream",)
+
+# route class -> level per encoding; reports are cached/big and worth the CPU, streams
+# favour throughput. COMPRESS_LEVELS (JSON) overrides, e.g. {"reports": {"zstd": 12}}.
+LEVELS = {
+    "reports": {"gzip": 6, "br": 5, "zstd": 6},
+    "stream": {"gzip": 1, "br": 1, "zstd": 1},
+    "default": {"gzip": 5, "br": 4, "zstd": 3},
+}
+for name, levels in json.loads(os.getenv("COMPRESS_LEVELS", "{}")).items():
+    LEVELS.setdefault(name, dict(LEVELS["default"])).update(levels)
+ROUTE_CLASSES = [("/reports", "reports")]
+
+class _Gzip:
+    def __init__(self, level):
+        self.c = zlib.compressobj(level, zlib.DEFLATED, 31)
+    def compress(self, data): return self.c.compress(data)
+    def flush(self): return self.c.flush(zlib.Z_SYNC_FLUSH)
+    def finish(self): return self.c.flush(zlib.Z_FINISH)
+
+class _Brotli:
+    def __init__(self, level):
+        self.c = brotli.Compressor(quality=level)
+    def compress(self, data): return self.c.process(data)
+    def flush(self): return self.c.flush()
+    def finish(self): return self.c.finish()
+
+class _Zstd:
+    def __init__(self, level):
+        self.c = zstandard.ZstdCompressor(level=level).compressobj()
+    def compress(self, data): return self.c.compress(data)
+    def flush(self): return self.c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+    def finish(self): return self.c.flush()
+
+ENCODERS = {"zstd": _Zstd if zstandard else None, "br": _Brotli if brotli else None, "gzip": _Gzip}
+PREFERENCE = [e for e in ("zstd", "br", "gzip") if ENCODERS[e]]
+
+def negotiate(accept_encoding: str):
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip().lower()] = q
+    wildcard = accepted.get("*", 0.0)
+    for enc in PREFERENCE:
+        if accepted.get(enc, wildcard) > 0:
+            return enc
+    return None
+
+def route_class(path: str, streaming: bool):
+    for prefix, name in ROUTE_CLASSES:
+        if path.startswith(prefix):
+            return name
+    return "stream" if streaming else "default"
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size: int = None):
+        self.app = app
+        self.min_size = MIN_SIZE if min_size is None else min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if not encoding or scope.get("method") == "HEAD":
+            return await self.app(scope, receive, send)
+
+        start = None
+        encoder = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if encoder is None:
+                resp_headers = {k.lower(): v for k, v in start.get("headers", [])}
+                ctype = resp_headers.get(b"content-type", b"").decode("latin-1").lower()
+                length = resp_headers.get(b"content-length")
+                small = (not more and len(body) < self.min_size) or (length is not None and int(length) < self.min_size)
+                if (small or b"content-encoding" in resp_headers or start["status"] in (204, 304)
+                        or ctype.startswith(SKIP) or not ctype.startswith(COMPRESSIBLE)):
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+                level = LEVELS[route_class(scope.get("path", ""), more)][encoding]
+                encoder = ENCODERS[encoding](level)
+                out_headers = [(k, v) for k, v in start.get("headers", []) if k.lower() not in (b"content-length", b"vary")]
+                vary = resp_headers.get(b"vary")
+                out_headers += [(b"content-encoding", encoding.encode()), (b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding")]
+                if not more:
+                    data = encoder.compress(body) + encoder.finish()
+                    await send({**start, "headers": out_headers + [(b"content-length", str(len(data)).encode())]})
+                    return await send({"type": "http.response.body", "body": data})
+                await send({**start, "headers": out_headers})
+            if more:
+                data = encoder.compress(body) + encoder.flush() if body else b""
+                if data:
+                    await send({"type": "http.response.body", "body": data, "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": encoder.compress(body) + encoder.finish()})
+
+        await self.app(scope, receive, send_wrapper)
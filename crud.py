@@ -1,7 +1,16 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func, and_, or_
-import pandas as pd, io, csv, datetime
-import models
+from sqlalchemy import select, func, and_, or_, insert, update, delete, case, literal, union_all
+from sqlalchemy.exc import IntegrityError
+import io, os, csv, json, datetime, heapq, itertools
+from decimal import Decimal
+import models, fx, periods, order_totals, metrics, coalesce, matviews, archive
+from database import SessionLocal
+
+# pandas/numpy and the numpy-backed helpers (depreciation, forecasting, reconcile) are
+# imported inside the functions that use them so worker boot does not pay for them
+
+class InvalidParameter(ValueError):
+    pass
 
 def row_to_dict(obj):
     if obj is None:
@@ -9,9 +18,138 @@ def row_to_dict(obj):
     return {c.name: getattr(obj, c.name) for c in obj.__table__.columns}
 
 # Generic CRUD
-def list_all(db: Session, model, skip=0, limit=100):
-    rows = db.scalars(select(model).offset(skip).limit(limit)).all()
-    return [row_to_dict(r) for r in rows]
+# List query language, validated against the model's columns and compiled into SQL:
+#   ?status=Open&due_date__lt=2026-01-01&order_by=-amount,id&fields=id,amount
+FILTER_OPS = {
+    "eq": lambda c, v: c == v, "ne": lambda c, v: c != v,
+    "lt": lambda c, v: c < v, "lte": lambda c, v: c <= v, "gt": lambda c, v: c > v, "gte": lambda c, v: c >= v,
+    "in": lambda c, v: c.in_(v), "nin": lambda c, v: c.notin_(v),
+    "like": lambda c, v: c.like(v), "ilike": lambda c, v: c.ilike(v),
+    "isnull": lambda c, v: c.is_(None) if v else c.isnot(None),
+}
+LIST_PARAMS = {"skip", "limit", "order_by", "fields"}
+# read by middleware or other layers (profiling, ?engine=, ?format=), never filters
+RESERVED_PARAMS = {"profile", "engine", "format"}
+TRUE_VALUES = {"1", "true", "yes", "on"}
+
+def _coerce(col, value: str):
+    try:
+        kind = col.type.python_type
+    except NotImplementedError:
+        return value
+    try:
+        if kind is bool:
+            if value.lower() not in TRUE_VALUES | {"0", "false", "no", "off"}:
+                raise ValueError(value)
+            return value.lower() in TRUE_VALUES
+        if kind is datetime.date:
+            return datetime.date.fromisoformat(value)
+        if kind is datetime.datetime:
+            return datetime.datetime.fromisoformat(value)
+        if kind in (int, Decimal):
+            return kind(value)
+    except (ValueError, ArithmeticError):
+        raise InvalidParameter(f"{col.name}: invalid value {value!r}")
+    return value
+
+def _list_filters(model, params):
+    cols = model.__table__.columns
+    where = []
+    for key, value in params:
+        if key in LIST_PARAMS or key in RESERVED_PARAMS:
+            continue
+        name, _, op = key.partition("__")
+        op = op or "eq"
+        if name not in cols or op not in FILTER_OPS:
+            raise InvalidParameter(f"unknown filter {key!r}; use <column>[__{'|'.join(FILTER_OPS)}] with columns {', '.join(cols.keys())}")
+        col = cols[name]
+        if op == "isnull":
+            arg = value.lower() in TRUE_VALUES
+        elif op in ("in", "nin"):
+            arg = [_coerce(col, v) for v in value.split(",") if v != ""]
+        elif op in ("like", "ilike"):
+            arg = value
+        else:
+            arg = _coerce(col, value)
+        where.append(FILTER_OPS[op](col, arg))
+    return where
+
+def _list_order(model, order_by: str):
+    cols = model.__table__.columns
+    out = []
+    for key in (k.strip() for k in (order_by or "").split(",") if k.strip()):
+        name = key.lstrip("-")
+        if name not in cols:
+            raise InvalidParameter(f"order_by: unknown column {name!r}")
+        out.append(cols[name].desc() if key.startswith("-") else cols[name].asc())
+    # primary key last keeps skip/limit pages stable
+    return out + [c for c in model.__table__.primary_key.columns]
+
+def _list_fields(model, fields: str):
+    cols = model.__table__.columns
+    if not fields:
+        return list(cols)
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    bad = [n for n in names if n not in cols]
+    if bad or not names:
+        raise InvalidParameter(f"fields: unknown column(s) {', '.join(bad)}; choose from {', '.join(cols.keys())}")
+    return [cols[n] for n in dict.fromkeys(names)]
+
+# Buffered (JSON array) pages are capped; larger reads stream as NDJSON
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+STREAM_BATCH = int(os.getenv("STREAM_BATCH", "1000"))
+NDJSON = "application/x-ndjson"
+
+def check_page(skip, limit, max_skip=None):
+    if skip < 0 or not 0 <= limit <= MAX_PAGE_SIZE:
+        raise InvalidParameter(f"skip must be >= 0 and limit between 0 and {MAX_PAGE_SIZE}; send Accept: {NDJSON} to stream larger results")
+    if max_skip is not None and skip > max_skip:
+        raise InvalidParameter(f"skip must be at most {max_skip}; narrow the range instead")
+
+def _list_query(model, skip, limit, params):
+    # params: query parameters (a Starlette QueryParams or a dict) holding filters,
+    # order_by and fields; only the selected columns of the matching rows are fetched
+    params = params or {}
+    items = params.multi_items() if hasattr(params, "multi_items") else list(params.items())
+    stmt = select(*_list_fields(model, params.get("fields"))).where(*_list_filters(model, items))
+    stmt = stmt.order_by(*_list_order(model, params.get("order_by"))).offset(skip)
+    return stmt.limit(limit) if limit is not None else stmt
+
+def list_all(db: Session, model, skip=0, limit=100, params=None):
+    check_page(skip, limit)
+    return [dict(r) for r in db.execute(_list_query(model, skip, limit, params)).mappings()]
+
+def wants_ndjson(request):
+    return NDJSON in request.headers.get("accept", "")
+
+def _json_default(v):
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (datetime.date, datetime.datetime, datetime.time)):
+        return v.isoformat()
+    if hasattr(v, "value"):  # enums
+        return v.value
+    raise TypeError(f"cannot encode {type(v).__name__}")
+
+def stream_list(model, params):
+    # one JSON object per line, read through a server-side cursor in STREAM_BATCH
+    # chunks; skip/limit are optional and uncapped. The query is validated here so
+    # errors still come back as a 400 before streaming starts; the rows are read with
+    # a session of their own because the request's is closed once the handler returns.
+    skip = int(params.get("skip", 0))
+    limit = int(params["limit"]) if "limit" in params else None
+    if skip < 0 or (limit is not None and limit < 0):
+        raise InvalidParameter("skip and limit must be >= 0")
+    stmt = _list_query(model, skip, limit, params).execution_options(yield_per=STREAM_BATCH)
+    def lines():
+        db = SessionLocal()
+        try:
+            for chunk in db.execute(stmt).mappings().partitions():
+                metrics.add_rows(len(chunk))
+                yield "".join(json.dumps(dict(r), default=_json_default) + "\n" for r in chunk).encode()
+        finally:
+            db.close()
+    return lines()
 
 def get_one(db: Session, model, id):
     return row_to_dict(db.get(model, id))
@@ -48,6 +186,7 @@ def upload_csv(db: Session, model, file_content: str):
     return [row_to_dict(o) for o in objs]
 
 def bulk_upload(db: Session, model, file_bytes: bytes, filename: str):
+    import pandas as pd
     if filename.lower().endswith('.csv'):
         df = pd.read_csv(io.BytesIO(file_bytes))
     else:
@@ -61,6 +200,10 @@ def bulk_upload(db: Session, model, file_bytes: bytes, filename: str):
     db.commit()
     return {"inserted": len(objs)}
 
+# Order header totals are maintained from their lines (see order_totals)
+def recompute_order_totals(db: Session, model, include_empty: bool = False):
+    return order_totals.recompute_all(db, model, include_empty)
+
 # Global search
 def global_search(db: Session, query: str, limit: int = 50):
     if not query: return []
@@ -77,21 +220,94 @@ def global_search(db: Session, query: str, limit: int = 50):
     return results
 
 # ---------------- REPORTS & METRICS ---------------
-def report_trial_balance(db: Session, period: str=None):
-    jel = models.JournalEntryLine
-    stmt = select(jel.account_code, func.coalesce(func.sum(jel.debit),0).label("debit"), func.coalesce(func.sum(jel.credit),0).label("credit")).group_by(jel.account_code)
-    if period:
-        # journal_entries.date is in JournalEntry; join
-        stmt = stmt.join(models.JournalEntry, models.JournalEntry.id == jel.journal_id).where(models.JournalEntry.date.like(f"{period}-%"))
-    rows = db.execute(stmt).all()
-    return [{"account_code": r[0], "debit": float(r[1]), "credit": float(r[2])} for r in rows]
+def _period_range(period: str):
+    # 'YYYY-MM' -> (first day, last day); a date range keeps the journal date index usable
+    try:
+        first = datetime.datetime.strptime(period, "%Y-%m").date()
+    except ValueError:
+        raise InvalidParameter(f"period must be YYYY-MM, got {period!r}")
+    nxt = (first.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return first, nxt - datetime.timedelta(days=1)
+
+def _month_key(db: Session, col):
+    # 'YYYY-MM' bucket expression in the backend's own date formatting
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return func.to_char(col, "YYYY-MM")
+    if dialect == "duckdb":
+        return func.strftime(col, "%Y-%m")
+    return func.strftime("%Y-%m", col)
+
+def _as_of(period: str=None):
+    # balances convert at the closing rate of the period (or today's rate)
+    return _period_range(period)[1] if period else datetime.date.today()
+
+def _frozen(db: Session, period: str, section: str):
+    ps = models.PeriodSummary
+    return db.execute(select(ps.key, ps.debit, ps.credit, ps.amount).where(ps.period == period, ps.section == section).order_by(ps.key)).all()
+
+def _with_archived(rows, archived):
+    # add archived (key, debit, credit) sums into query rows of the same shape
+    if not archived:
+        return rows
+    totals = {k: [float(d or 0), float(c or 0)] for k, d, c in rows}
+    for k, d, c in archived:
+        t = totals.setdefault(k, [0.0, 0.0])
+        t[0] += d; t[1] += c
+    return [(k, d, c) for k, (d, c) in sorted(totals.items(), key=lambda kv: (kv[0] is None, kv[0] or ""))]
+
+@coalesce.single_flight
+def report_trial_balance(db: Session, period: str=None, currency: str=None):
+    rate = fx.rate(db, currency, _as_of(period)) if currency else 1.0
+    if period and periods.is_closed(db, period):
+        return [{"account_code": k, "debit": float(d) * rate, "credit": float(c) * rate} for k, d, c, _ in _frozen(db, period, "gl")]
+    if matviews.usable(db):
+        mv = matviews.gl_monthly
+        stmt = select(mv.c.account_code, func.sum(mv.c.debit), func.sum(mv.c.credit)).group_by(mv.c.account_code).order_by(mv.c.account_code)
+        if period:
+            stmt = stmt.where(mv.c.month == _period_range(period)[0])
+        rows = [(r[0] or None, r[1], r[2]) for r in db.execute(stmt).all()]
+    else:
+        jel = models.JournalEntryLine
+        stmt = select(jel.account_code, func.coalesce(func.sum(jel.debit),0).label("debit"), func.coalesce(func.sum(jel.credit),0).label("credit")).group_by(jel.account_code).order_by(jel.account_code)
+        if period:
+            # lines carry their journal's date, no join needed
+            stmt = stmt.where(jel.date.between(*_period_range(period)))
+        rows = db.execute(stmt).all()
+    if not period:
+        # archived periods are always closed, so only the all-time balance needs them
+        rows = _with_archived(rows, archive.gl_totals(db, ["account_code"]))
+    return [{"account_code": r[0], "debit": float(r[1]) * rate, "credit": float(r[2]) * rate} for r in rows]
 
-def report_pnl(db: Session, period: str=None):
+@coalesce.single_flight
+def report_pnl(db: Session, period: str=None, currency: str=None):
     jel = models.JournalEntryLine
-    stmt = select(jel.account_code, func.coalesce(func.sum(jel.debit - jel.credit),0).label("amount")).group_by(jel.account_code)
+    if period and periods.is_closed(db, period):
+        # closed periods come from the frozen GL summary, which has no posting dates, so a
+        # currency converts at the period's closing rate like the trial balance
+        rate = fx.rate(db, currency, _as_of(period)) if currency else 1.0
+        rows = [(k, float(a) * rate) for k, _, _, a in _frozen(db, period, "gl")]
+        return _pnl_totals(db, rows)
+    amount = func.coalesce(func.sum(jel.debit - jel.credit),0).label("amount")
+    first, last = _period_range(period) if period else (None, None)
+    if currency:
+        # income and expense convert at the rate of their posting date
+        stmt = select(jel.account_code, jel.date, amount).group_by(jel.account_code, jel.date)
+    else:
+        stmt = select(jel.account_code, amount).group_by(jel.account_code)
     if period:
-        stmt = stmt.join(models.JournalEntry, models.JournalEntry.id == jel.journal_id).where(models.JournalEntry.date.like(f"{period}-%"))
+        stmt = stmt.where(jel.date.between(first, last))
     rows = db.execute(stmt).all()
+    if currency:
+        rows += [(code, d, dr - cr) for code, d, dr, cr in archive.gl_totals(db, ["account_code", "date"], first, last)]
+    else:
+        rows += [(code, dr - cr) for code, dr, cr in archive.gl_totals(db, ["account_code"], first, last)]
+    if currency:
+        conv = fx.converter(db, currency)
+        rows = [(code, conv(amt, d)) for code, d, amt in rows]
+    return _pnl_totals(db, rows)
+
+def _pnl_totals(db: Session, rows):
     types = {g.code: g.type for g in db.scalars(select(models.GLAccount)).all()}
     revenue = 0.0; expense = 0.0
     for code, amt in rows:
@@ -100,32 +316,129 @@ def report_pnl(db: Session, period: str=None):
         elif t == "Expense": expense += float(amt or 0)
     return {"revenue": revenue, "expense": expense, "net_income": revenue - expense}
 
-def report_net_sales(db: Session, period: str=None):
-    # Net sales from sales_orders total_amount (could be net of returns)
-    stmt = select(func.coalesce(func.sum(models.SalesOrder.total_amount),0))
+@coalesce.single_flight
+def report_net_sales(db: Session, period: str=None, currency: str=None):
+    # Net sales from sales_orders total_amount, kept in sync with the order lines
+    so = models.SalesOrder
+    total = func.coalesce(func.sum(so.total_amount),0)
+    if currency:
+        stmt = select(so.order_date, total).group_by(so.order_date)
+    else:
+        stmt = select(total)
     if period:
-        stmt = stmt.where(models.SalesOrder.order_date.like(f"{period}-%"))
-    val = float(db.execute(stmt).scalar() or 0)
+        stmt = stmt.where(so.order_date.between(*_period_range(period)))
+    if currency:
+        conv = fx.converter(db, currency)
+        val = sum(conv(amt, d) for d, amt in db.execute(stmt).all())
+    else:
+        val = float(db.execute(stmt).scalar() or 0)
     return {"net_sales": val}
 
-def report_actual_vs_forecast(db: Session, metric: str="net_sales", period: str=None):
+def _shift_month(period: str, n: int):
+    y, m = divmod(int(period[:4]) * 12 + int(period[5:7]) - 1 + n, 12)
+    return f"{y:04d}-{m + 1:02d}"
+
+def _months(first: str, last: str):
+    # inclusive list of 'YYYY-MM' labels
+    out = []
+    while first <= last:
+        out.append(first)
+        first = _shift_month(first, 1)
+    return out
+
+PRODUCT_SALES = "product_sales:"
+
+def _monthly_actuals(db: Session, metric: str, start: str=None, end: str=None):
+    # {metric: {'YYYY-MM': value}} from one grouped query; 'product_sales' expands to
+    # one 'product_sales:<id>' metric per product
+    if metric == "net_sales":
+        so = models.SalesOrder
+        month = _month_key(db, so.order_date)
+        stmt = select(month, func.coalesce(func.sum(so.total_amount),0)).where(so.order_date.isnot(None)).group_by(month)
+        date_col = so.order_date
+    elif metric == "net_profit":
+        # same sign convention as report_pnl: revenue - expense over sum(debit - credit)
+        jel = models.JournalEntryLine; gl = models.GLAccount
+        month = _month_key(db, jel.date)
+        amount = func.coalesce(func.sum(case((gl.type == "Revenue", jel.debit - jel.credit), else_=0)),0) - func.coalesce(func.sum(case((gl.type == "Expense", jel.debit - jel.credit), else_=0)),0)
+        stmt = select(month, amount).join(gl, gl.code == jel.account_code).where(jel.date.isnot(None)).group_by(month)
+        date_col = jel.date
+    elif metric == "product_sales" or metric.startswith(PRODUCT_SALES):
+        sol = models.SalesOrderLine; so = models.SalesOrder
+        month = _month_key(db, so.order_date)
+        stmt = select(sol.product_id, month, func.coalesce(func.sum(sol.quantity * sol.unit_price),0)).join(so, so.id == sol.so_id).where(so.order_date.isnot(None), sol.product_id.isnot(None)).group_by(sol.product_id, month)
+        if metric != "product_sales":
+            try:
+                stmt = stmt.where(sol.product_id == int(metric[len(PRODUCT_SALES):]))
+            except ValueError:
+                raise InvalidParameter(f"invalid product metric {metric!r}")
+        date_col = so.order_date
+    else:
+        raise InvalidParameter("metric must be net_sales, net_profit, product_sales or product_sales:<product_id>")
+    if start: stmt = stmt.where(date_col >= _period_range(start)[0])
+    if end: stmt = stmt.where(date_col <= _period_range(end)[1])
+    out = {}
+    if metric == "product_sales" or metric.startswith(PRODUCT_SALES):
+        for pid, m, v in db.execute(stmt).all():
+            out.setdefault(f"{PRODUCT_SALES}{pid}", {})[m] = float(v)
+    else:
+        out[metric] = {m: float(v) for m, v in db.execute(stmt).all()}
+    if metric == "net_profit":
+        archived = archive.gl_totals(db, ["month", "account_code"], start and _period_range(start)[0], end and _period_range(end)[1])
+        sign = {g.code: {"Revenue": 1, "Expense": -1}.get(g.type, 0) for g in db.scalars(select(models.GLAccount)).all()} if archived else {}
+        for m, code, dr, cr in archived:
+            if sign.get(code):
+                out[metric][m] = out[metric].get(m, 0.0) + sign[code] * (dr - cr)
+    return out
+
+def _combined_actuals(db: Session, metric: str, start: str=None, end: str=None):
+    # {'YYYY-MM': value}; plain 'product_sales' sums every product's series
+    series = _monthly_actuals(db, metric, start, end)
+    if metric != "product_sales":
+        return series.get(metric, {})
+    out = {}
+    for values in series.values():
+        for p, v in values.items():
+            out[p] = out.get(p, 0.0) + v
+    return out
+
+def _forecast_metric(metric: str):
+    # forecasts are generated per product, so 'product_sales' matches all of them
+    fc = models.Forecast
+    if metric == "product_sales":
+        return or_(fc.metric == metric, fc.metric.like(f"{PRODUCT_SALES}%"))
+    return fc.metric == metric
+
+@coalesce.single_flight
+def report_actual_vs_forecast(db: Session, metric: str="net_sales", period: str=None, start: str=None, end: str=None):
     # Actual from sales_orders or pnl; forecast from Forecast table
-    actual = 0.0
+    fc = models.Forecast
+    if start or end:
+        # series over a period range: one grouped query for actuals, one for forecasts
+        actuals = _combined_actuals(db, metric, start, end)
+        stmt = select(fc.period, func.coalesce(func.sum(fc.value),0)).where(_forecast_metric(metric)).group_by(fc.period)
+        if start: stmt = stmt.where(fc.period >= start)
+        if end: stmt = stmt.where(fc.period <= end)
+        forecasts = {p: float(v) for p, v in db.execute(stmt).all()}
+        keys = sorted(set(actuals) | set(forecasts))
+        if keys:
+            keys = _months(start or keys[0], end or keys[-1])
+        series = [{"period": p, "actual": actuals.get(p, 0.0), "forecast": forecasts.get(p, 0.0), "variance": actuals.get(p, 0.0) - forecasts.get(p, 0.0)} for p in keys]
+        return {"metric": metric, "series": series}
     if metric == "net_sales":
         actual = report_net_sales(db, period)["net_sales"]
     elif metric == "net_profit":
         actual = report_pnl(db, period)["net_income"]
-    # forecast
-    stmt = select(models.Forecast.value).where(models.Forecast.metric == metric)
+    else:
+        actual = sum(_combined_actuals(db, metric, period, period).values())
+    stmt = select(func.coalesce(func.sum(fc.value),0)).where(_forecast_metric(metric))
     if period:
-        stmt = stmt.where(models.Forecast.period == period)
-    forecast_vals = [r for r,_ in enumerate(db.execute(stmt).all())]  # placeholder; we'll sum below
-    # proper sum
-    forecast_rows = db.execute(select(func.coalesce(func.sum(models.Forecast.value),0)).where(models.Forecast.metric==metric) if not period else select(func.coalesce(func.sum(models.Forecast.value),0)).where(models.Forecast.metric==metric).where(models.Forecast.period==period)).all()
-    forecast = float(forecast_rows[0][0] if forecast_rows else 0)
+        stmt = stmt.where(fc.period == period)
+    forecast = float(db.execute(stmt).scalar() or 0)
     return {"metric": metric, "actual": actual, "forecast": forecast, "variance": actual - forecast}
 
-def report_ar_aging(db: Session):
+@coalesce.single_flight
+def report_ar_aging(db: Session, currency: str=None):
     ars = db.scalars(select(models.AccountsReceivable)).all()
     today = datetime.date.today()
     buckets = {"0-30":0,"31-60":0,"61-90":0,"90+":0}
@@ -137,15 +450,24 @@ def report_ar_aging(db: Session):
         elif days <=60: buckets["31-60"] += amt
         elif days <=90: buckets["61-90"] += amt
         else: buckets["90+"] += amt
+    if currency:
+        rate = fx.rate(db, currency)
+        buckets = {k: v * rate for k, v in buckets.items()}
     return buckets
 
+@coalesce.single_flight
 def report_inventory_value(db: Session):
-    rows = db.execute(select(models.Product.id, models.Product.name, func.coalesce(func.sum(models.Inventory.quantity),0).label("qty"), models.Product.cost).join(models.Inventory, models.Inventory.product_id==models.Product.id).group_by(models.Product.id)).all()
+    if matviews.usable(db):
+        mv = matviews.inventory_value
+        rows = db.execute(select(mv.c.product_id, mv.c.product, mv.c.quantity, mv.c.cost).order_by(mv.c.product_id)).all()
+    else:
+        rows = db.execute(select(models.Product.id, models.Product.name, func.coalesce(func.sum(models.Inventory.quantity),0).label("qty"), models.Product.cost).join(models.Inventory, models.Inventory.product_id==models.Product.id).group_by(models.Product.id, models.Product.name, models.Product.cost).order_by(models.Product.id)).all()
     out = []
     for pid,name,qty,cost in rows:
         out.append({"product_id": pid, "product": name, "quantity": float(qty), "unit_cost": float(cost or 0), "value": float((cost or 0) * (qty or 0))})
     return out
 
+@coalesce.single_flight
 def report_inventory_metrics(db: Session):
     # turnover = COGS / average inventory value (COGS approximated by journal entries to Expense GLs)
     gls = db.scalars(select(models.GLAccount)).all()
@@ -153,34 +475,568 @@ def report_inventory_metrics(db: Session):
     jel = models.JournalEntryLine
     cogs_stmt = select(func.coalesce(func.sum(jel.debit - jel.credit),0)).where(jel.account_code.in_(expense_codes))
     cogs = float(db.execute(cogs_stmt).scalar() or 0)
+    expense = set(expense_codes)
+    cogs += sum(dr - cr for code, dr, cr in archive.gl_totals(db, ["account_code"]) if code in expense)
     inv_val_rows = db.execute(select(func.coalesce(func.sum(models.Product.cost * models.Inventory.quantity),0))).all()
     inv_val = float(inv_val_rows[0][0] or 0) if inv_val_rows else 0
     turnover = (cogs / inv_val) if inv_val else None
     return {"cogs": cogs, "inventory_value": inv_val, "turnover": turnover}
 
 # Additional reports: top customers/vendors, purchase/sales report
+@coalesce.single_flight
 def report_top_customers_vendors(db: Session, top_n: int = 10):
-    ar_agg = db.execute(select(models.AccountsReceivable.customer_id, func.sum(models.AccountsReceivable.amount)).group_by(models.AccountsReceivable.customer_id).order_by(func.sum(models.AccountsReceivable.amount).desc()).limit(top_n)).all()
+    if matviews.usable(db):
+        return _top_parties_materialized(db, top_n)
+    ar_agg = db.execute(select(models.AccountsReceivable.customer_id, func.sum(models.AccountsReceivable.amount)).group_by(models.AccountsReceivable.customer_id).order_by(func.sum(models.AccountsReceivable.amount).desc(), models.AccountsReceivable.customer_id).limit(top_n)).all()
     top_customers = []
     for cid, amt in ar_agg:
         c = db.get(models.Customer, cid)
         top_customers.append({"customer_id": cid, "customer_name": c.name if c else None, "amount": float(amt or 0)})
-    ap_agg = db.execute(select(models.AccountsPayable.vendor_id, func.sum(models.AccountsPayable.amount)).group_by(models.AccountsPayable.vendor_id).order_by(func.sum(models.AccountsPayable.amount).desc()).limit(top_n)).all()
+    ap_agg = db.execute(select(models.AccountsPayable.vendor_id, func.sum(models.AccountsPayable.amount)).group_by(models.AccountsPayable.vendor_id).order_by(func.sum(models.AccountsPayable.amount).desc(), models.AccountsPayable.vendor_id).limit(top_n)).all()
     top_vendors = []
     for vid, amt in ap_agg:
         v = db.get(models.Vendor, vid)
         top_vendors.append({"vendor_id": vid, "vendor_name": v.name if v else None, "amount": float(amt or 0)})
     return {"top_customers": top_customers, "top_vendors": top_vendors}
 
-# Calendar events
-def list_calendar_events(db: Session, start: str = None, end: str = None):
-    q = select(models.CalendarEvent)
+def _top_parties_materialized(db: Session, top_n: int):
+    mv = matviews.party_totals
+    out = {}
+    for side, model, key in (("customer", models.Customer, "top_customers"), ("vendor", models.Vendor, "top_vendors")):
+        rows = db.execute(select(mv.c.party_id, mv.c.amount).where(mv.c.side == side).order_by(mv.c.amount.desc(), mv.c.party_id).limit(top_n)).all()
+        names = dict(db.execute(select(model.id, model.name).where(model.id.in_([r[0] for r in rows]))).all())
+        out[key] = [{f"{side}_id": (pid if pid != -1 else None), f"{side}_name": names.get(pid), "amount": float(amt or 0)} for pid, amt in rows]
+    return out
+
+# Budget vs actual: expense actuals for every cost center and month come from one grouped query
+@coalesce.single_flight
+def report_budget_vs_actual(db: Session, year: int=None, cost_center: str=None):
+    year = year or datetime.date.today().year
+    jel = models.JournalEntryLine
+    gl = models.GLAccount
+    month = _month_key(db, jel.date)
+    first, last = datetime.date(year,1,1), datetime.date(year,12,31)
+    stmt = select(jel.cost_center, month, func.coalesce(func.sum(jel.debit - jel.credit),0)).join(gl, gl.code == jel.account_code).where(gl.type == "Expense", jel.date.between(first, last), jel.cost_center.isnot(None)).group_by(jel.cost_center, month)
+    bstmt = select(models.Budget.cost_center, func.coalesce(func.sum(models.Budget.amount),0)).where(models.Budget.year == year).group_by(models.Budget.cost_center)
+    if cost_center:
+        stmt = stmt.where(jel.cost_center == cost_center)
+        bstmt = bstmt.where(models.Budget.cost_center == cost_center)
+    monthly = {}
+    for cc, m, amt in db.execute(stmt).all():
+        monthly.setdefault(cc, [0.0]*12)[int(m[5:7]) - 1] = float(amt)
+    archived = [r for r in archive.gl_totals(db, ["cost_center", "month", "account_code"], first, last) if r[0] is not None and (not cost_center or r[0] == cost_center)]
+    if archived:
+        expense = set(db.scalars(select(gl.code).where(gl.type == "Expense")).all())
+        for cc, m, code, dr, cr in archived:
+            if code in expense:
+                monthly.setdefault(cc, [0.0]*12)[int(m[5:7]) - 1] += dr - cr
+    budgets = {cc: float(amt) for cc, amt in db.execute(bstmt).all()}
+    today = datetime.date.today()
+    elapsed = 12 if year < today.year else (today.month if year == today.year else 0)
+    rows = []
+    for cc in sorted(set(monthly) | set(budgets), key=lambda c: (c is None, c)):
+        months = monthly.get(cc, [0.0]*12)
+        actual = sum(months); budget = budgets.get(cc, 0.0)
+        rows.append({"cost_center": cc, "budget": budget, "actual": actual, "variance": budget - actual,
+                     "burn_rate": (actual / budget) if budget else None,
+                     "projected": (actual / elapsed * 12) if elapsed else None,
+                     "monthly": months})
+    total_budget = sum(r["budget"] for r in rows); total_actual = sum(r["actual"] for r in rows)
+    return {"year": year, "months_elapsed": elapsed, "budget": total_budget, "actual": total_actual, "variance": total_budget - total_actual,
+            "burn_rate": (total_actual / total_budget) if total_budget else None, "cost_centers": rows}
+
+# Forecast generation: history for every series is forecast as one matrix and written in one batch
+GENERATED = "generated:"
+
+def generate_forecasts(db: Session, metric_names=("net_sales", "net_profit"), method: str="moving_average", horizon: int=6, history: int=24, window: int=3, alpha: float=0.3, season: int=12):
+    import numpy as np, forecasting
+    if method not in forecasting.METHODS:
+        raise InvalidParameter(f"method must be one of {', '.join(forecasting.METHODS)}")
+    if horizon < 1 or horizon > 60 or history < 1 or history > 240:
+        raise InvalidParameter("horizon must be 1-60 and history 1-240")
+    if not 0 < alpha <= 1:
+        raise InvalidParameter("alpha must be in (0, 1]")
+    # history ends with the last complete month; forecasts start at the current month
+    current = datetime.date.today().strftime("%Y-%m")
+    months = _months(_shift_month(current, -history), _shift_month(current, -1))
+    targets = [_shift_month(current, i) for i in range(horizon)]
+    series = {}
+    for metric in metric_names:
+        series.update(_monthly_actuals(db, metric, months[0], months[-1]))
+    if not series:
+        return {"method": method, "periods": targets, "metrics": 0, "inserted": 0, "skipped": 0}
+    names = sorted(series)
+    col = {p: i for i, p in enumerate(months)}
+    matrix = np.zeros((len(names), len(months)))
+    for i, name in enumerate(names):
+        for p, v in series[name].items():
+            if p in col: matrix[i, col[p]] = v
+    values = np.round(forecasting.forecast(matrix, horizon, method, window, alpha, season), 2)
+    fc = models.Forecast
+    # previously generated rows are replaced; manually entered forecasts are kept
+    manual = set(db.execute(select(fc.metric, fc.period).where(fc.metric.in_(names), fc.period.in_(targets), or_(fc.notes.is_(None), fc.notes.notlike(f"{GENERATED}%")))).all())
+    db.execute(delete(fc).where(fc.metric.in_(names), fc.period.in_(targets), fc.notes.like(f"{GENERATED}%")))
+    rows = [{"metric": name, "period": p, "value": float(values[i, j]), "notes": f"{GENERATED}{method}"} for i, name in enumerate(names) for j, p in enumerate(targets) if (name, p) not in manual]
+    if rows:
+        db.execute(insert(fc), rows)
+    db.commit()
+    return {"method": method, "periods": targets, "metrics": len(names), "inserted": len(rows), "skipped": len(names) * len(targets) - len(rows)}
+
+# Cash flow statement and short-term projection
+CASH_FLOW_CATEGORIES = ("operating", "investing", "financing")
+CLOSED_STATUSES = ("paid", "closed", "void", "cancelled")
+GRANULARITIES = {"week": "W-SUN", "month": "M", "quarter": "Q", "year": "Y"}
+
+@coalesce.single_flight
+def report_cash_flow(db: Session, start: datetime.date=None, end: datetime.date=None, granularity: str="month"):
+    import pandas as pd
+    if granularity not in GRANULARITIES:
+        raise InvalidParameter(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    cf = models.CashFlow
+    stmt = select(cf.date, cf.category, func.coalesce(func.sum(cf.amount),0)).where(cf.date.isnot(None)).group_by(cf.date, cf.category)
+    if start: stmt = stmt.where(cf.date >= start)
+    if end: stmt = stmt.where(cf.date <= end)
+    df = pd.DataFrame(db.execute(stmt).all(), columns=["date", "category", "amount"])
+    if df.empty:
+        return {"granularity": granularity, "periods": []}
+    df["amount"] = df["amount"].astype(float)
+    df["category"] = df["category"].fillna("").str.strip().str.lower()
+    df.loc[~df["category"].isin(CASH_FLOW_CATEGORIES), "category"] = "other"
+    df["period"] = pd.to_datetime(df["date"]).dt.to_period(GRANULARITIES[granularity])
+    table = df.pivot_table(index="period", columns="category", values="amount", aggfunc="sum", fill_value=0.0)
+    table = table.reindex(columns=[*CASH_FLOW_CATEGORIES, "other"], fill_value=0.0).sort_index()
+    table["net"] = table.sum(axis=1)
+    table["cumulative"] = table["net"].cumsum()
+    periods = [{"period": str(p), **{k: float(v) for k, v in row.items()}} for p, row in zip(table.index, table.to_dict(orient="records"))]
+    return {"granularity": granularity, "periods": periods}
+
+def _open_due_by_week(db: Session, model, week0: datetime.date, weeks: int):
+    import numpy as np
+    # open balances bucketed by due week in one grouped query; overdue items land in week 0
+    stmt = select(model.due_date, func.coalesce(func.sum(model.amount),0)).where(model.due_date.isnot(None), model.due_date < week0 + datetime.timedelta(weeks=weeks), or_(model.status.is_(None), func.lower(model.status).notin_(CLOSED_STATUSES))).group_by(model.due_date)
+    rows = db.execute(stmt).all()
+    if not rows:
+        return np.zeros(weeks)
+    due = np.array([r[0] for r in rows], dtype="datetime64[D]")
+    idx = np.clip((due - np.datetime64(week0, "D")).astype(np.int64) // 7, 0, None)
+    return np.bincount(idx, weights=np.array([float(r[1]) for r in rows]), minlength=weeks)[:weeks]
+
+@coalesce.single_flight
+def report_cash_flow_projection(db: Session, weeks: int=13, history_weeks: int=13):
+    import pandas as pd, numpy as np
+    # baseline = trailing average of recorded weekly cash flow; open AR/AP due in each
+    # week are added on top as receipts/payments
+    if weeks < 1 or weeks > 104 or history_weeks < 1 or history_weeks > 260:
+        raise InvalidParameter("weeks must be 1-104 and history_weeks 1-260")
+    cf = models.CashFlow
+    today = datetime.date.today()
+    week0 = today - datetime.timedelta(days=today.weekday())
+    opening = float(db.execute(select(func.coalesce(func.sum(cf.amount),0)).where(cf.date < week0)).scalar() or 0)
+    hist_start = week0 - datetime.timedelta(weeks=history_weeks)
+    hist = pd.DataFrame(db.execute(select(cf.date, func.coalesce(func.sum(cf.amount),0)).where(cf.date >= hist_start, cf.date < week0).group_by(cf.date)).all(), columns=["date", "amount"])
+    weekly = pd.Series(0.0, index=pd.date_range(hist_start, periods=history_weeks, freq="7D"))
+    if not hist.empty:
+        hist["week"] = pd.to_datetime(hist["date"]).dt.to_period("W-SUN").dt.start_time
+        weekly = weekly.add(hist.groupby("week")["amount"].sum().astype(float), fill_value=0.0)
+    rolling = weekly.rolling(history_weeks, min_periods=1).sum()
+    baseline = float(rolling.iloc[-1]) / history_weeks
+    receipts = _open_due_by_week(db, models.AccountsReceivable, week0, weeks)
+    payments = _open_due_by_week(db, models.AccountsPayable, week0, weeks)
+    net = receipts - payments + baseline
+    balance = opening + np.cumsum(net)
+    return {
+        "as_of": today, "opening_balance": opening, "baseline_weekly": baseline,
+        "weeks": [{"week_start": week0 + datetime.timedelta(weeks=i), "receipts": float(receipts[i]), "payments": float(payments[i]), "baseline": baseline, "net": float(net[i]), "balance": float(balance[i])} for i in range(weeks)],
+        "history": [{"week_start": w.date(), "net": float(v), f"rolling_{history_weeks}w": float(r)} for w, v, r in zip(weekly.index, weekly.values, rolling.values)],
+    }
+
+# Bank reconciliation
+def _cents(value):
+    return int((Decimal(str(value).replace(",", "").strip()) * 100).to_integral_value())
+
+def _parse_statement(file_content: str):
+    # CSV with date, amount (or debit/credit) and an optional reference/description column
+    reader = csv.DictReader(io.StringIO(file_content))
+    lines = []
+    for n, row in enumerate(reader, start=2):
+        row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+        try:
+            d = datetime.date.fromisoformat(row["date"][:10])
+            if row.get("amount"):
+                cents = _cents(row["amount"])
+            else:
+                cents = _cents(row.get("credit") or 0) - _cents(row.get("debit") or 0)
+        except (KeyError, ValueError, ArithmeticError):
+            raise InvalidParameter(f"statement line {n}: expected an ISO date and an amount or debit/credit")
+        lines.append((d, cents, row.get("reference") or row.get("description") or None))
+    return lines
+
+def auto_reconcile(db: Session, account_code: str, period: str, file_content: str, date_window: int=3, include_cash_flow: bool=True):
+    import reconcile
+    first, last = _period_range(period)
+    statement = _parse_statement(file_content)
+    lo, hi = first - datetime.timedelta(days=date_window), last + datetime.timedelta(days=date_window)
+    jel = models.JournalEntryLine
+    # bank account lines: debits are money in, matching positive statement amounts
+    candidates = [(d, _cents(dr or 0) - _cents(cr or 0), ref, "journal_lines", i) for i, d, dr, cr, ref in db.execute(
+        select(jel.id, jel.date, jel.debit, jel.credit, jel.description).where(jel.account_code == account_code, jel.date.between(lo, hi))).all()]
+    if include_cash_flow:
+        cf = models.CashFlow
+        candidates += [(d, _cents(amt or 0), ref, "cash_flow", i) for i, d, amt, ref in db.execute(
+            select(cf.id, cf.date, cf.amount, cf.description).where(cf.date.between(lo, hi))).all()]
+    results = reconcile.match(statement, candidates, date_window)
+    rec = db.scalars(select(models.Reconciliation).where(models.Reconciliation.account_code == account_code, models.Reconciliation.period == period)).first()
+    if rec is None:
+        rec = models.Reconciliation(account_code=account_code, period=period)
+        db.add(rec); db.flush()
+    else:
+        db.execute(delete(models.ReconciliationLine).where(models.ReconciliationLine.reconciliation_id == rec.id))
+    rows = []
+    for (d, cents, ref), (i, kind) in zip(statement, results):
+        row = {"reconciliation_id": rec.id, "statement_date": d, "amount": Decimal(cents) / 100, "reference": ref, "status": "Unmatched", "source": None, "source_id": None, "match_type": None}
+        if i is not None:
+            row.update(status="Matched", source=candidates[i][3], source_id=candidates[i][4], match_type=kind)
+        rows.append(row)
+    if rows:
+        db.execute(insert(models.ReconciliationLine), rows)
+    matched = sum(1 for i, _ in results if i is not None)
+    rec.status = "Reconciled" if matched == len(statement) else ("Partially Reconciled" if matched else "Unreconciled")
+    rec.notes = f"{matched}/{len(statement)} statement lines matched against {len(candidates)} ledger rows"
+    db.commit()
+    unmatched = [{"date": r["statement_date"], "amount": float(r["amount"]), "reference": r["reference"]} for r in rows if r["status"] == "Unmatched"]
+    return {"reconciliation_id": rec.id, "status": rec.status, "statement_lines": len(statement), "matched": matched,
+            "unmatched_ledger": len(candidates) - matched, "unmatched": unmatched[:100]}
+
+def list_reconciliation_lines(db: Session, reconciliation_id: int, status: str=None, skip=0, limit=100):
+    check_page(skip, limit)
+    rl = models.ReconciliationLine
+    stmt = select(rl).where(rl.reconciliation_id == reconciliation_id).order_by(rl.id).offset(skip).limit(limit)
+    if status:
+        stmt = stmt.where(rl.status == status)
+    return [row_to_dict(r) for r in db.scalars(stmt).all()]
+
+# Tax summary and period close
+@coalesce.single_flight
+def report_tax_summary(db: Session, period: str=None, start: str=None, end: str=None):
+    if period and periods.is_closed(db, period):
+        rows = [(period, k, a) for k, _, _, a in _frozen(db, period, "tax")]
+    else:
+        tl = models.TaxLedger
+        month = _month_key(db, tl.date)
+        stmt = select(month, tl.tax_type, func.coalesce(func.sum(tl.amount),0)).where(tl.date.isnot(None)).group_by(month, tl.tax_type).order_by(month, tl.tax_type)
+        if period: start = end = period
+        if start: stmt = stmt.where(tl.date >= _period_range(start)[0])
+        if end: stmt = stmt.where(tl.date <= _period_range(end)[1])
+        rows = db.execute(stmt).all()
+    totals = {}
+    for _, t, amt in rows:
+        totals[t] = totals.get(t, 0.0) + float(amt)
+    return {"periods": [{"period": p, "tax_type": t, "amount": float(a)} for p, t, a in rows], "totals": totals}
+
+@coalesce.single_flight
+def report_period_summary(db: Session, period: str):
+    if not periods.is_closed(db, period):
+        raise InvalidParameter(f"period {period} is not closed")
+    ps = models.PeriodSummary
+    out = {"period": period, "gl": [], "tax": {}, "ar": {}, "ap": {}}
+    for section, k, d, c, a in db.execute(select(ps.section, ps.key, ps.debit, ps.credit, ps.amount).where(ps.period == period).order_by(ps.section, ps.key)).all():
+        if section == "gl":
+            out["gl"].append({"account_code": k, "debit": float(d), "credit": float(c)})
+        else:
+            out[section][k] = float(a)
+    return out
+
+def close_period(db: Session, period: str, notes: str=None):
+    first, last = _period_range(period)
+    # ask the database, not the per-worker cache, which may predate a close on another worker
+    if db.scalars(select(models.PeriodClose.id).where(models.PeriodClose.period == period)).first():
+        raise InvalidParameter(f"period {period} is already closed")
+    jel = models.JournalEntryLine; tl = models.TaxLedger
+    rows = [{"period": period, "section": "gl", "key": k, "debit": d, "credit": c, "amount": d - c} for k, d, c in db.execute(
+        select(jel.account_code, func.coalesce(func.sum(jel.debit),0), func.coalesce(func.sum(jel.credit),0)).where(jel.date.between(first, last)).group_by(jel.account_code)).all()]
+    rows += [{"period": period, "section": "tax", "key": k, "amount": a} for k, a in db.execute(
+        select(tl.tax_type, func.coalesce(func.sum(tl.amount),0)).where(tl.date.between(first, last)).group_by(tl.tax_type)).all()]
+    for section, model in (("ar", models.AccountsReceivable), ("ap", models.AccountsPayable)):
+        rows += [{"period": period, "section": section, "key": k, "amount": a} for k, a in db.execute(
+            select(model.status, func.coalesce(func.sum(model.amount),0)).where(model.invoice_date.between(first, last)).group_by(model.status)).all()]
+    if rows:
+        db.execute(insert(models.PeriodSummary), rows)
+    db.add(models.PeriodClose(period=period, closed_at=datetime.datetime.utcnow(), notes=notes))
+    try:
+        db.commit()
+    except IntegrityError:
+        # a concurrent close of the same period won the unique constraint
+        db.rollback()
+        periods.invalidate()
+        raise InvalidParameter(f"period {period} is already closed")
+    periods.invalidate()
+    return {"period": period, "closed": True, "summary_rows": len(rows)}
+
+def reopen_period(db: Session, period: str):
+    pc = db.scalars(select(models.PeriodClose).where(models.PeriodClose.period == period)).first()
+    if not pc:
+        return False
+    if db.scalars(select(models.ArchivedPeriod.id).where(models.ArchivedPeriod.period == period)).first():
+        raise InvalidParameter(f"period {period} is archived and cannot be reopened")
+    db.execute(delete(models.PeriodSummary).where(models.PeriodSummary.period == period))
+    db.delete(pc); db.commit()
+    periods.invalidate()
+    return True
+
+# Fixed asset depreciation
+def _load_assets(db: Session):
+    import numpy as np, depreciation
+    fa = models.FixedAsset
+    rows = db.execute(select(fa.id, fa.name, fa.purchase_value, fa.purchase_date, fa.useful_life_years).where(fa.purchase_value.isnot(None), fa.purchase_date.isnot(None), fa.useful_life_years > 0).order_by(fa.id)).all()
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    names = [r[1] for r in rows]
+    cost = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+    start = depreciation.month_index([r[3] for r in rows]) if rows else np.empty(0, dtype=np.int64)
+    life = np.fromiter((r[4] * 12 for r in rows), dtype=np.int64, count=len(rows))
+    return ids, names, cost, start, life
+
+def _depreciation_params(method: str, factor: float, n_periods: int):
+    import depreciation
+    if method not in depreciation.METHODS:
+        raise InvalidParameter(f"method must be one of {', '.join(depreciation.METHODS)}")
+    if factor <= 0:
+        raise InvalidParameter("factor must be positive")
+    if n_periods < 1 or n_periods > 600:
+        raise InvalidParameter("periods must be between 1 and 600")
+
+@coalesce.single_flight
+def report_depreciation(db: Session, start: str=None, n_periods: int=12, method: str="straight_line", factor: float=2.0, as_of: datetime.date=None, detail: bool=False):
+    import depreciation
+    _depreciation_params(method, factor, n_periods)
+    as_of = as_of or datetime.date.today()
+    first = depreciation.month_index([_period_range(start)[0] if start else as_of.replace(day=1)])[0]
+    ids, names, cost, begin, life = _load_assets(db)
+    totals = depreciation.period_totals(cost, begin, life, first, n_periods, method, factor)
+    # charges through the as_of month inclusive
+    elapsed = depreciation.month_index([as_of])[0] - begin + 1
+    acc = depreciation.accumulated(cost, life, elapsed, method, factor)
+    out = {
+        "method": method,
+        "periods": [depreciation.month_label(first + i) for i in range(n_periods)],
+        "depreciation": [round(float(v), 2) for v in totals],
+        "as_of": as_of,
+        "cost": round(float(cost.sum()), 2),
+        "accumulated": round(float(acc.sum()), 2),
+        "net_book_value": round(float((cost - acc).sum()), 2),
+    }
+    if detail:
+        out["assets"] = [{"asset_id": int(i), "name": n, "cost": float(c), "accumulated": round(float(a), 2), "net_book_value": round(float(c - a), 2)} for i, n, c, a in zip(ids, names, cost, acc)]
+    return out
+
+def post_depreciation(db: Session, start: str, n_periods: int=1, method: str="straight_line", factor: float=2.0, expense_account: str="6100", accumulated_account: str="1590"):
+    import numpy as np, depreciation
+    # one journal per period: a single expense debit and one accumulated-depreciation
+    # credit per asset, lines inserted with executemany; periods already posted are skipped
+    _depreciation_params(method, factor, n_periods)
+    first = depreciation.month_index([_period_range(start)[0]])[0]
+    labels = [depreciation.month_label(first + i) for i in range(n_periods)]
+    descriptions = {f"Depreciation {p}": p for p in labels}
+    existing = set(db.scalars(select(models.JournalEntry.description).where(models.JournalEntry.description.in_(descriptions))).all())
+    ids, names, cost, begin, life = _load_assets(db)
+    charges = np.round(depreciation.schedule(cost, begin, life, first, n_periods, method, factor), 2)
+    posted, skipped, n_lines = [], [], 0
+    for j, period in enumerate(labels):
+        desc = f"Depreciation {period}"
+        col = charges[:, j]
+        nz = np.nonzero(col)[0]
+        if desc in existing or not len(nz):
+            skipped.append(period); continue
+        je = models.JournalEntry(date=_period_range(period)[1], description=desc, posted=True)
+        db.add(je); db.flush()
+        lines = [{"journal_id": je.id, "date": je.date, "account_code": expense_account, "description": desc, "debit": round(float(col[nz].sum()), 2), "credit": 0}]
+        lines += [{"journal_id": je.id, "date": je.date, "account_code": accumulated_account, "description": f"{desc} asset {int(ids[i])}", "debit": 0, "credit": float(col[i])} for i in nz]
+        db.execute(insert(models.JournalEntryLine), lines)
+        posted.append(period); n_lines += len(lines)
+    db.commit()
+    return {"posted": posted, "skipped": skipped, "lines": n_lines}
+
+# Requisition-to-PO conversion
+def _contract_sweep(db: Session):
+    # lookup(d) for dates visited in nondecreasing order -> (vendor -> contracts active on
+    # d, vendor of the earliest-started active contract). Contracts enter sorted by start
+    # and leave through a heap keyed by end, so each is pushed and popped once; open
+    # starts and ends count as date.min and date.max.
+    sc = models.SupplierContract
+    rows = sorted(db.execute(select(sc.start_date, sc.end_date, sc.vendor_id, sc.id).where(sc.vendor_id.isnot(None))).all(),
+                  key=lambda r: (r[0] or datetime.date.min, r[3]))
+    by_end, by_start, ended, vendors = [], [], set(), {}
+    pos = 0
+    def lookup(d):
+        nonlocal pos
+        while pos < len(rows) and (rows[pos][0] or datetime.date.min) <= d:
+            start, end, vendor, cid = rows[pos]; pos += 1
+            heapq.heappush(by_end, (end or datetime.date.max, cid, vendor))
+            heapq.heappush(by_start, (start or datetime.date.min, cid, vendor))
+            vendors[vendor] = vendors.get(vendor, 0) + 1
+        while by_end and by_end[0][0] < d:
+            _, cid, vendor = heapq.heappop(by_end)
+            ended.add(cid)
+            vendors[vendor] -= 1
+            if not vendors[vendor]:
+                del vendors[vendor]
+        while by_start and by_start[0][1] in ended:
+            heapq.heappop(by_start)
+        return vendors, by_start[0][2] if by_start else None
+    return lookup
+
+def convert_requisitions(db: Session, status: str = "Approved", order_status: str = "Open"):
+    pr = models.PurchaseRequisition
+    reqs = db.execute(select(pr.id, pr.product_id, pr.quantity, pr.needed_by).where(pr.status == status, pr.product_id.isnot(None)).order_by(pr.id)).all()
+    if not reqs:
+        return {"requisitions": 0, "purchase_orders": 0, "lines": 0, "orders": [], "unassigned": []}
+    today = datetime.date.today()
+    lookup = _contract_sweep(db)
+    product_ids = {r.product_id for r in reqs}
+    pol = models.PurchaseOrderLine; po = models.PurchaseOrder
+    # latest vendor and unit cost per product, from PO history, in one pass
+    last = {}
+    for pid, vid, cost in db.execute(select(pol.product_id, po.vendor_id, pol.unit_cost).join(po, po.id == pol.po_id).where(pol.product_id.in_(product_ids)).order_by(po.order_date, pol.id)).all():
+        last[pid] = (vid, cost)
+        last[(pid, vid)] = cost
+    list_cost = dict(db.execute(select(models.Product.id, models.Product.cost).where(models.Product.id.in_(product_ids))).all())
+    # vendors are picked in date order for the sweep, orders are built in requisition order
+    picked = {}
+    for r in sorted(reqs, key=lambda r: r.needed_by or today):
+        vendors, earliest = lookup(r.needed_by or today)
+        # prefer the vendor we last bought this product from, else the earliest contract
+        prev = last.get(r.product_id)
+        picked[r.id] = prev[0] if prev and prev[0] in vendors else earliest
+    groups = {}; unassigned = []
+    for r in reqs:
+        vendor = picked[r.id]
+        if vendor is None:
+            unassigned.append(r.id); continue
+        cost = last.get((r.product_id, vendor), list_cost.get(r.product_id)) or 0
+        groups.setdefault(vendor, []).append((r, Decimal(cost)))
+    orders = {vendor: po(vendor_id=vendor, order_date=today, status=order_status) for vendor in groups}
+    db.add_all(orders.values()); db.flush()
+    lines = [{"po_id": orders[vendor].id, "product_id": r.product_id, "quantity": r.quantity, "unit_cost": cost} for vendor, items in groups.items() for r, cost in items]
+    if lines:
+        db.execute(insert(pol), lines)
+        order_totals.recompute(db, po, [o.id for o in orders.values()])
+    converted = [r.id for items in groups.values() for r, _ in items]
+    if converted:
+        db.execute(update(pr).where(pr.id.in_(converted)).values(status="Ordered"))
+    db.commit()
+    return {"requisitions": len(converted), "purchase_orders": len(orders), "lines": len(lines),
+            "orders": [{"id": o.id, "vendor_id": v, "total_amount": float(o.total_amount)} for v, o in orders.items()], "unassigned": unassigned}
+
+# Analytics cube: whitelisted dimensions/measures compiled into one grouped query
+def _cube_fact(db: Session, fact: str):
+    if fact == "sales_lines":
+        line, header = models.SalesOrderLine, models.SalesOrder
+        on = header.id == line.so_id
+        amount = line.quantity * line.unit_price
+        party = {"customer": header.customer_id}
+        value = "revenue"
+    elif fact == "purchase_lines":
+        line, header = models.PurchaseOrderLine, models.PurchaseOrder
+        on = header.id == line.po_id
+        amount = line.quantity * line.unit_cost
+        party = {"vendor": header.vendor_id}
+        value = "cost"
+    else:
+        raise InvalidParameter("fact must be sales_lines or purchase_lines")
+    month = _month_key(db, header.order_date)
+    dims = {"product": line.product_id, **party, "month": month, "year": func.substr(month, 1, 4), "status": header.status}
+    measures = {"qty": func.sum(line.quantity), value: func.sum(amount), "lines": func.count(line.id)}
+    return line, header, on, dims, measures
+
+@coalesce.single_flight
+def report_cube(db: Session, fact: str, dims: list, measures: list, start: str=None, end: str=None, rollup: bool=False, order_by: str=None, limit: int=1000):
+    line, header, on, dim_cols, measure_cols = _cube_fact(db, fact)
+    bad = [d for d in dims if d not in dim_cols] + [m for m in measures if m not in measure_cols]
+    if bad or not measures or len(set(dims)) != len(dims):
+        raise InvalidParameter(f"dims must be distinct values from {sorted(dim_cols)} and measures from {sorted(measure_cols)}")
+    if not 1 <= limit <= 10000:
+        raise InvalidParameter("limit must be between 1 and 10000")
+    def grouped(rolled):
+        # rolled: number of trailing dims aggregated away (0 = full detail)
+        kept = dims[:len(dims) - rolled]
+        cols = [dim_cols[d].label(d) for d in kept] + [literal(None).label(d) for d in dims[len(kept):]]
+        stmt = select(*cols, *[func.coalesce(measure_cols[m], 0).label(m) for m in measures]).select_from(line).join(header, on)
+        if start: stmt = stmt.where(header.order_date >= _period_range(start)[0])
+        if end: stmt = stmt.where(header.order_date <= _period_range(end)[1])
+        return stmt.group_by(*[dim_cols[d] for d in kept]) if kept else stmt
+    if rollup and dims and db.get_bind().dialect.name == "postgresql":
+        stmt = grouped(0)
+        stmt = stmt.group_by(None).group_by(func.rollup(*[dim_cols[d] for d in dims])).add_columns(func.grouping(*[dim_cols[d] for d in dims]).label("grouping"))
+    elif rollup and dims:
+        # ROLLUP emulated as one UNION ALL of the grouping sets, with the same bitmask
+        parts = [grouped(k).add_columns(literal((1 << k) - 1).label("grouping")) for k in range(len(dims) + 1)]
+        stmt = select(union_all(*parts).subquery())
+    else:
+        stmt = grouped(0)
+    sub = stmt.subquery()
+    query = select(sub)
+    if order_by:
+        key = order_by.lstrip("-")
+        if key not in dims and key not in measures:
+            raise InvalidParameter("order_by must be one of the requested dims or measures")
+        query = query.order_by((sub.c[key].desc() if order_by.startswith("-") else sub.c[key].asc()).nulls_last())
+    else:
+        # explicit null placement keeps subtotal rows in the same place on every backend
+        query = query.order_by(*[sub.c[d].asc().nulls_last() for d in dims], *([sub.c.grouping] if rollup and dims else []))
+    rows = db.execute(query.limit(limit + 1)).mappings().all()
+    out = [{k: (float(v) if isinstance(v, Decimal) else v) for k, v in r.items()} for r in rows[:limit]]
+    return {"fact": fact, "dims": dims, "measures": measures, "rollup": rollup, "rows": out, "truncated": len(rows) > limit}
+
+# Calendar events: stored events overlapping the window merged with "due" events
+# generated on the fly from AR/AP due dates and supplier contract end dates
+def _parse_datetime(value, name):
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    try:
+        return datetime.datetime.fromisoformat(str(value))
+    except ValueError:
+        raise InvalidParameter(f"{name} must be an ISO date or datetime")
+
+def _due_events(db: Session, source: str, date_col, stmt, title, start, end, n):
+    # ordered by due date and capped at n so the merge only reads what the page needs
+    if start:
+        stmt = stmt.where(date_col >= start.date())
+    if end:
+        stmt = stmt.where(date_col < end.date() if end.time() == datetime.time() else date_col <= end.date())
+    for row in db.execute(stmt.where(date_col.isnot(None)).order_by(date_col, stmt.selected_columns.id).limit(n)):
+        d = datetime.datetime.combine(row.due, datetime.time())
+        yield {"id": f"{source}-{row.id}", "title": title(row), "start": d, "end": d + datetime.timedelta(days=1), "type": "due",
+               "description": None, "generated": True, "source": source, "source_id": row.id}
+
+# every source reads skip + limit rows for the merge, so deep pages are refused
+MAX_CALENDAR_SKIP = int(os.getenv("MAX_CALENDAR_SKIP", "10000"))
+
+def list_calendar_events(db: Session, start: str = None, end: str = None, skip: int = 0, limit: int = 100, include_generated: bool = True):
+    check_page(skip, limit, MAX_CALENDAR_SKIP)
+    start = _parse_datetime(start, "start"); end = _parse_datetime(end, "end")
+    ce = models.CalendarEvent
+    n = skip + limit
+    q = select(ce)
     if start:
-        q = q.where(models.CalendarEvent.start >= start)
+        # overlap: ends after the window opens (events without an end are instants)
+        q = q.where(or_(ce.end > start, ce.start >= start))
     if end:
-        q = q.where(models.CalendarEvent.end <= end)
-    rows = db.scalars(q).all()
-    return [row_to_dict(r) for r in rows]
+        q = q.where(ce.start < end)
+    stored = ({**row_to_dict(r), "generated": False} for r in db.scalars(q.order_by(ce.start.nulls_first(), ce.id).limit(n)))
+    sources = [stored]
+    if include_generated:
+        ar = models.AccountsReceivable; ap = models.AccountsPayable; sc = models.SupplierContract
+        is_open = lambda m: or_(m.status.is_(None), func.lower(m.status).notin_(CLOSED_STATUSES))
+        sources += [
+            _due_events(db, "accounts_receivable", ar.due_date, select(ar.id, ar.invoice_number, ar.amount, ar.due_date.label("due")).where(is_open(ar)),
+                        lambda r: f"AR {r.invoice_number or r.id} due ({float(r.amount or 0):.2f})", start, end, n),
+            _due_events(db, "accounts_payable", ap.due_date, select(ap.id, ap.invoice_number, ap.amount, ap.due_date.label("due")).where(is_open(ap)),
+                        lambda r: f"AP {r.invoice_number or r.id} due ({float(r.amount or 0):.2f})", start, end, n),
+            _due_events(db, "supplier_contracts", sc.end_date, select(sc.id, sc.vendor_id, sc.end_date.label("due")),
+                        lambda r: f"Supplier contract {r.id} ends (vendor {r.vendor_id})", start, end, n),
+        ]
+    # each source is sorted by start (undated first) then id; equal starts keep source order
+    merged = heapq.merge(*sources, key=lambda e: e["start"] or datetime.datetime.min)
+    return list(itertools.islice(merged, skip, n))
 
 # Convenience wrappers for router compatibility
 def get_vendors(db: Session, skip=0, limit=100): return db.scalars(select(models.Vendor).offset(skip).limit(limit)).all()
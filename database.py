@@ -1,6 +1,7 @@
-import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import os, threading
+from collections import deque
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,3 +18,102 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# SQLite profile: WAL lets readers run alongside the single writer, and sessions of this
+# process queue up for the write lock (first flush/DML until commit or rollback) instead
+# of racing for it and failing with "database is locked". The lock belongs to the
+# session, not the thread: FastAPI may finish a request's session on another threadpool
+# thread. It is released when the session's transaction ends or is rolled back,
+# including the implicit rollback of a failed flush.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB, i.e. 64 MiB
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", "10000")),  # ms
+    "temp_store": "MEMORY",
+}
+SERIALIZE_WRITES = os.getenv("SQLITE_SERIALIZE_WRITES", "1") == "1"
+
+class WriteQueueTimeout(TimeoutError):
+    pass
+
+class WriteQueue:
+    # FIFO mutex: writers are admitted in arrival order so a burst cannot starve anyone
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self._held = False
+        self.owner = None  # the holder, e.g. a session
+
+    def acquire(self, timeout=None, owner=None):
+        with self._lock:
+            if not self._held and not self._waiters:
+                self._held = True
+                self.owner = owner
+                return True
+            waiter = threading.Lock()
+            waiter.acquire()
+            self._waiters.append(waiter)
+        if waiter.acquire(timeout=-1 if timeout is None else timeout):
+            self.owner = owner
+            return True
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+                return False
+            except ValueError:
+                self.owner = owner
+                return True  # handed over just as we timed out
+
+    def release(self):
+        with self._lock:
+            self.owner = None
+            if self._waiters:
+                self._waiters.popleft().release()  # ownership passes straight to the next writer
+            else:
+                self._held = False
+
+write_queue = WriteQueue()
+
+def _acquire_write(session):
+    if session.bind is not engine or session.info.get("write_lock"):
+        return
+    if not write_queue.acquire(SQLITE_PRAGMAS["busy_timeout"] / 1000, session):
+        raise WriteQueueTimeout("timed out waiting for the SQLite write queue")
+    session.info["write_lock"] = True
+
+def _release_write(session):
+    if session.info.pop("write_lock", False):
+        write_queue.release()
+
+if engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, record):
+        cur = dbapi_conn.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cur.execute(f"PRAGMA {name}={value}")
+        cur.close()
+
+    if SERIALIZE_WRITES:
+        # on every session of the engine, not only SessionLocal ones (e.g. Session(engine))
+        @event.listens_for(Session, "before_flush")
+        def _queue_flush(session, flush_context, instances):
+            _acquire_write(session)
+
+        @event.listens_for(Session, "do_orm_execute")
+        def _queue_dml(state):
+            if not state.is_select:
+                _acquire_write(state.session)
+
+        @event.listens_for(Session, "after_transaction_end")
+        def _end_write(session, transaction):
+            if transaction.parent is None:
+                _release_write(session)
+
+        @event.listens_for(Session, "after_soft_rollback")
+        def _rolled_back(session, previous_transaction):
+            # a failed flush rolls the database transaction back at once, but the session
+            # transaction only ends when the caller rolls back or closes
+            if not session.in_transaction() or not session.get_transaction().is_active:
+                _release_write(session)
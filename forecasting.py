@@ -0,0 +1,43 @@
+import numpy as np
+
+# Forecast methods over a (series x months) matrix of monthly actuals, oldest month
+# first. Each returns a (series x horizon) matrix so every product is forecast in one
+# pass instead of one series at a time.
+
+METHODS = ("moving_average", "exponential_smoothing", "seasonal_naive")
+
+def moving_average(history, horizon, window=3):
+    window = max(1, min(window, history.shape[1]))
+    level = history[:, -window:].mean(axis=1)
+    return np.repeat(level[:, None], horizon, axis=1)
+
+def exponential_smoothing(history, horizon, alpha=0.3):
+    # simple exponential smoothing seeded with the first observation; the final level
+    # is a weighted sum of the history so it vectorizes across series
+    n = history.shape[1]
+    weights = alpha * (1.0 - alpha) ** np.arange(n - 1, -1, -1, dtype=np.float64)
+    weights[0] = (1.0 - alpha) ** (n - 1)
+    level = history @ weights
+    return np.repeat(level[:, None], horizon, axis=1)
+
+def seasonal_naive(history, horizon, season=12):
+    # value from the same month one season back; too short a history repeats the last value
+    n = history.shape[1]
+    if n < season:
+        return np.repeat(history[:, -1:], horizon, axis=1)
+    idx = n - season + (np.arange(horizon) % season)
+    return history[:, idx]
+
+def forecast(history, horizon, method="moving_average", window=3, alpha=0.3, season=12):
+    history = np.asarray(history, dtype=np.float64)
+    if history.ndim == 1:
+        history = history[None, :]
+    if history.shape[1] == 0:
+        return np.zeros((history.shape[0], horizon))
+    if method == "moving_average":
+        return moving_average(history, horizon, window)
+    if method == "exponential_smoothing":
+        return exponential_smoothing(history, horizon, alpha)
+    if method == "seasonal_naive":
+        return seasonal_naive(history, horizon, season)
+    raise ValueError(f"unknown forecast method {method!r}")
@@ -0,0 +1,97 @@
+import bisect, datetime, os, threading, time
+from sqlalchemy import select, event
+from sqlalchemy.orm import Session
+import models
+
+# Ledger amounts are stored in the base currency. FXRate.rate is quoted as units of
+# `currency` per one unit of BASE_CURRENCY, effective from `date` until the next row.
+BASE_CURRENCY = os.getenv("BASE_CURRENCY", "USD").upper()
+# other workers only see fx_rates writes through the TTL, this process through events
+INDEX_TTL = float(os.getenv("FX_INDEX_TTL", "300"))
+
+class RateNotFound(LookupError):
+    pass
+
+# sorted per-currency (dates, rates) arrays loaded in one query, looked up by bisect
+class RateIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rates = {}
+        self._stale = True
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        self._stale = True
+
+    def _ensure(self, db: Session):
+        if not self._stale and time.monotonic() - self._loaded_at < INDEX_TTL:
+            return
+        with self._lock:
+            if not self._stale and time.monotonic() - self._loaded_at < INDEX_TTL:
+                return
+            # cleared before reading so a write landing mid-load marks us stale again
+            self._stale = False
+            try:
+                fx = models.FXRate
+                rows = db.execute(select(fx.currency, fx.date, fx.rate).where(fx.currency.isnot(None), fx.date.isnot(None), fx.rate.isnot(None)).order_by(fx.currency, fx.date, fx.id)).all()
+            except Exception:
+                self._stale = True
+                raise
+            rates = {}
+            for cur, d, r in rows:
+                dates, vals = rates.setdefault(cur.upper(), ([], []))
+                if dates and dates[-1] == d:
+                    vals[-1] = float(r)  # latest row for the same day wins
+                else:
+                    dates.append(d); vals.append(float(r))
+            self._rates = rates
+            self._loaded_at = time.monotonic()
+
+    def rate(self, db: Session, currency: str, as_of=None):
+        currency = currency.upper()
+        if currency == BASE_CURRENCY:
+            return 1.0
+        if as_of is None:
+            as_of = datetime.date.today()
+        elif isinstance(as_of, datetime.datetime):
+            as_of = as_of.date()
+        self._ensure(db)
+        entry = self._rates.get(currency)
+        if not entry:
+            raise RateNotFound(f"No FX rates for currency {currency}")
+        dates, vals = entry
+        i = bisect.bisect_right(dates, as_of) - 1
+        if i < 0:
+            raise RateNotFound(f"No {currency} rate on or before {as_of}")
+        return vals[i]
+
+index = RateIndex()
+
+def rate(db: Session, currency: str, as_of=None):
+    return index.rate(db, currency, as_of)
+
+def convert(db: Session, amount, currency: str, as_of=None):
+    return float(amount or 0) * index.rate(db, currency, as_of)
+
+def converter(db: Session, currency: str):
+    # conv(amount, as_of) for converting many rows; rates are memoized per date
+    cache = {}
+    def conv(amount, as_of=None):
+        r = cache.get(as_of)
+        if r is None:
+            r = cache[as_of] = index.rate(db, currency, as_of)
+        return float(amount or 0) * r
+    return conv
+
+# refresh the index once fx_rates writes are committed
+@event.listens_for(Session, "after_flush")
+def _track_fx_writes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, models.FXRate):
+            session.info["fx_dirty"] = True
+            return
+
+@event.listens_for(Session, "after_commit")
+def _refresh_after_commit(session):
+    if session.info.pop("fx_dirty", False):
+        index.invalidate()
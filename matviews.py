@@ -0,0 +1,174 @@
+import datetime, logging, os, threading, time
+from sqlalchemy import event, select, text, table, column
+from sqlalchemy.orm import Session
+from database import engine
+import periods
+
+# Postgres materialized views behind the trial balance, inventory value and top
+# customers/vendors reports. A background thread refreshes each view CONCURRENTLY (reads
+# keep going) once MATVIEW_REFRESH_INTERVAL seconds have passed or once this worker has
+# seen MATVIEW_WRITE_THRESHOLD writes to its source tables, whichever comes first.
+# Refresh times live in report_view_refreshes so every worker reports the same
+# freshness. Other databases (SQLite, the DuckDB mirror) keep the live queries.
+
+ENABLED = os.getenv("REPORT_MATVIEWS", "1") == "1"
+REFRESH_INTERVAL = float(os.getenv("MATVIEW_REFRESH_INTERVAL", "300"))
+WRITE_THRESHOLD = int(os.getenv("MATVIEW_WRITE_THRESHOLD", "1000"))
+FRESHNESS_TTL = 5.0
+log = logging.getLogger("balancebuilt.matviews")
+NO_MONTH = "0001-01-01"  # journal lines without a journal; unique index columns must be non-null
+
+# name -> (source tables, SELECT, unique index columns)
+VIEWS = {
+    # buckets by the line's own date, like the live trial balance; a journal's date
+    # change rewrites its lines' dates, so journals stay a source
+    "mv_gl_monthly": ({"journal_entry_lines", "journal_entries"}, f"""
+        SELECT coalesce(l.account_code, '') AS account_code,
+               coalesce(date_trunc('month', l.date)::date, DATE '{NO_MONTH}') AS month,
+               coalesce(sum(l.debit), 0) AS debit, coalesce(sum(l.credit), 0) AS credit
+        FROM journal_entry_lines l
+        GROUP BY 1, 2""", ("account_code", "month")),
+    "mv_inventory_value": ({"products", "inventory"}, """
+        SELECT p.id AS product_id, p.name AS product, coalesce(sum(i.quantity), 0) AS quantity, p.cost AS cost
+        FROM products p JOIN inventory i ON i.product_id = p.id
+        GROUP BY p.id, p.name, p.cost""", ("product_id",)),
+    "mv_party_totals": ({"accounts_receivable", "accounts_payable"}, """
+        SELECT 'customer' AS side, coalesce(customer_id, -1) AS party_id, coalesce(sum(amount), 0) AS amount
+        FROM accounts_receivable GROUP BY 2
+        UNION ALL
+        SELECT 'vendor', coalesce(vendor_id, -1), coalesce(sum(amount), 0)
+        FROM accounts_payable GROUP BY 2""", ("side", "party_id")),
+}
+
+gl_monthly = table("mv_gl_monthly", column("account_code"), column("month"), column("debit"), column("credit"))
+inventory_value = table("mv_inventory_value", column("product_id"), column("product"), column("quantity"), column("cost"))
+party_totals = table("mv_party_totals", column("side"), column("party_id"), column("amount"))
+refreshes = table("report_view_refreshes", column("name"), column("refreshed_at"))
+REPORT_VIEWS = {"trial_balance": "mv_gl_monthly", "inventory_value": "mv_inventory_value", "top_customers_vendors": "mv_party_totals"}
+# reports that serve a closed period from its period-close summaries
+FROZEN_REPORTS = {"trial_balance", "pnl"}
+
+def create(conn, names=None):
+    # migration step (all views, or just `names`); a no-op outside Postgres
+    if conn.dialect.name != "postgresql":
+        return
+    conn.execute(text("CREATE TABLE IF NOT EXISTS report_view_refreshes (name varchar(100) PRIMARY KEY, refreshed_at timestamp NOT NULL)"))
+    for name, (_, sql, unique) in VIEWS.items():
+        if names is not None and name not in names:
+            continue
+        conn.execute(text(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {sql} WITH DATA"))
+        conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{name} ON {name} ({', '.join(unique)})"))
+        _stamp(conn, name)
+
+def recreate(conn, name):
+    # migration step for a changed view definition; a no-op outside Postgres
+    if conn.dialect.name != "postgresql":
+        return
+    conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {name}"))
+    create(conn, {name})
+
+def _stamp(conn, name):
+    conn.execute(text("INSERT INTO report_view_refreshes (name, refreshed_at) VALUES (:n, now() AT TIME ZONE 'utc') "
+                      "ON CONFLICT (name) DO UPDATE SET refreshed_at = excluded.refreshed_at"), {"n": name})
+
+def usable(db: Session):
+    return ENABLED and db.get_bind().dialect.name == "postgresql"
+
+_lock = threading.Lock()
+_pending = {name: 0 for name in VIEWS}
+_freshness = {}
+_freshness_at = 0.0
+
+def refresh(name: str):
+    # one refresher per view across workers; returns False when another holds it
+    with engine.begin() as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_xact_lock(hashtext(:n))"), {"n": name}).scalar():
+            return False
+        conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}"))
+        _stamp(conn, name)
+    with _lock:
+        _pending[name] = 0
+    invalidate()
+    return True
+
+def invalidate():
+    global _freshness_at
+    _freshness_at = 0.0
+
+def freshness(db: Session):
+    # name -> refreshed_at (UTC), cached for a few seconds
+    global _freshness, _freshness_at
+    if time.monotonic() - _freshness_at > FRESHNESS_TTL:
+        _freshness = dict(db.execute(select(refreshes.c.name, refreshes.c.refreshed_at)).all())
+        _freshness_at = time.monotonic()
+    return _freshness
+
+def headers(db: Session, report: str, period: str = None):
+    # response headers describing where a report's data came from: frozen (period-close
+    # summaries), columnar (the DuckDB mirror), materialized or live
+    if period and report in FROZEN_REPORTS and periods.is_closed(db, period):
+        return {"X-Data-Source": "frozen"}
+    if db.get_bind().dialect.name == "duckdb":
+        return {"X-Data-Source": "columnar"}
+    if report not in REPORT_VIEWS or not usable(db):
+        return {"X-Data-Source": "live"}
+    at = freshness(db).get(REPORT_VIEWS[report])
+    if at is None:
+        return {"X-Data-Source": "materialized"}
+    age = (datetime.datetime.utcnow() - at).total_seconds()
+    return {"X-Data-Source": "materialized", "X-Data-Freshness": at.isoformat(timespec="seconds") + "Z", "X-Data-Age": str(max(0, int(age)))}
+
+def _count_writes(tables, n=1):
+    with _lock:
+        for name, (sources, _, _) in VIEWS.items():
+            if sources & tables:
+                _pending[name] += n
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    if ENABLED:
+        touched = {}
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            t = getattr(obj, "__tablename__", None)
+            touched[t] = touched.get(t, 0) + 1
+        for t, n in touched.items():
+            _count_writes({t}, n)
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_dml(state):
+    if ENABLED and (state.is_insert or state.is_update or state.is_delete):
+        t = getattr(state.statement, "table", None)
+        if t is not None:
+            # bulk UPDATE/DELETE row counts are unknown up front, so they force a refresh
+            rows = len(state.parameters) if isinstance(state.parameters, list) else 1
+            _count_writes({t.name}, rows if state.is_insert else WRITE_THRESHOLD)
+
+def _due(name, now):
+    at = _freshness.get(name)
+    return _pending[name] >= WRITE_THRESHOLD or at is None or (now - at).total_seconds() >= REFRESH_INTERVAL
+
+class Refresher(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True, name="matview-refresher")
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(min(REFRESH_INTERVAL, 5.0)):
+            try:
+                with Session(engine) as db:
+                    freshness(db)
+                now = datetime.datetime.utcnow()
+                for name in VIEWS:
+                    if _due(name, now):
+                        refresh(name)
+            except Exception:
+                log.exception("materialized view refresh failed")
+
+refresher = None
+
+def start():
+    global refresher
+    if ENABLED and engine.dialect.name == "postgresql" and refresher is None:
+        refresher = Refresher()
+        refresher.start()
+    return refresher
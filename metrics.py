@@ -0,0 +1,159 @@
+import bisect, contextvars, logging, os, threading, time
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from fastapi.responses import JSONResponse as _JSONResponse
+
+# Per-route request metrics in Prometheus text format: latency, DB query count and DB
+# time per request (from cursor execute events), rows serialized and response bytes.
+# Queries slower than SLOW_QUERY_MS are logged and kept in a small ring buffer.
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+log = logging.getLogger("balancebuilt.slow_query")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+class Histogram:
+    def __init__(self, name, help, buckets):
+        self.name, self.help, self.buckets = name, help, buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        s = self.series.get(labels)
+        if s is None:
+            s = self.series.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            s[0][i] += 1
+        s[1] += value; s[2] += 1
+
+    def render(self, names):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, n) in sorted(self.series.items()):
+            lbl = ",".join(f'{k}="{v}"' for k, v in zip(names, labels))
+            cum = 0
+            for b, c in zip(self.buckets, counts):
+                cum += c
+                out.append(f'{self.name}_bucket{{{lbl},le="{b}"}} {cum}')
+            out.append(f'{self.name}_bucket{{{lbl},le="+Inf"}} {n}')
+            out.append(f"{self.name}_sum{{{lbl}}} {total}")
+            out.append(f"{self.name}_count{{{lbl}}} {n}")
+        return out
+
+class Counter:
+    def __init__(self, name, help):
+        self.name, self.help = name, help
+        self.series = {}
+
+    def inc(self, labels, value=1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self, names):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, v in sorted(self.series.items()):
+            lbl = ",".join(f'{k}="{v}"' for k, v in zip(names, labels))
+            out.append(f"{self.name}{{{lbl}}} {v}")
+        return out
+
+_lock = threading.Lock()
+REQUEST_LABELS = ("method", "route", "status")
+ROUTE_LABELS = ("method", "route")
+latency = Histogram("http_request_duration_seconds", "Request latency", LATENCY_BUCKETS)
+db_queries = Histogram("http_request_db_queries", "DB queries per request", COUNT_BUCKETS)
+db_seconds = Histogram("http_request_db_seconds", "DB time per request", LATENCY_BUCKETS)
+response_bytes = Histogram("http_response_bytes", "Response body bytes", BYTES_BUCKETS)
+rows_total = Counter("http_response_rows_total", "Rows serialized into responses")
+slow_total = Counter("db_slow_queries_total", "Queries slower than SLOW_QUERY_MS")
+slow_queries = deque(maxlen=100)
+# extra render() callables other modules register, each returning exposition lines
+collectors = []
+
+def route_of(scope):
+    # the router stores the matched route on the (shared) scope
+    return getattr(scope.get("route"), "path", None) or "<unmatched>"
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "db_time", "rows")
+    def __init__(self, scope):
+        self.scope = scope; self.queries = 0; self.db_time = 0.0; self.rows = 0
+
+current = contextvars.ContextVar("request_stats", default=None)
+
+def add_rows(n):
+    stats = current.get()
+    if stats is not None:
+        stats.rows += n
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats = current.get()
+    if stats is not None:
+        stats.queries += 1; stats.db_time += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        route = route_of(stats.scope) if stats else None
+        log.warning("slow query %.1fms route=%s: %s", elapsed * 1000, route, statement[:1000])
+        with _lock:
+            slow_total.inc((conn.engine.dialect.name,))
+            slow_queries.append({"at": time.time(), "ms": round(elapsed * 1000, 1), "route": route, "statement": statement[:1000]})
+
+class JSONResponse(_JSONResponse):
+    # default response class: counts rows as the top-level list length (or the
+    # lengths of list values of a dict payload)
+    def render(self, content):
+        if isinstance(content, list):
+            add_rows(len(content))
+        elif isinstance(content, dict):
+            add_rows(sum(len(v) for v in content.values() if isinstance(v, list)) or 1)
+        return super().render(content)
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats(scope)
+        token = current.set(stats)
+        status = 500; size = 0
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current.reset(token)
+            route = route_of(scope)
+            method = scope.get("method", "")
+            with _lock:
+                latency.observe((method, route, str(status)), time.perf_counter() - start)
+                db_queries.observe((method, route), stats.queries)
+                db_seconds.observe((method, route), stats.db_time)
+                response_bytes.observe((method, route), size)
+                if stats.rows:
+                    rows_total.inc((method, route), stats.rows)
+
+def render():
+    with _lock:
+        lines = latency.render(REQUEST_LABELS) + db_queries.render(ROUTE_LABELS) + db_seconds.render(ROUTE_LABELS)
+        lines += response_bytes.render(ROUTE_LABELS) + rows_total.render(ROUTE_LABELS) + slow_total.render(("dialect",))
+    for collect in collectors:
+        lines += collect()
+    return "\n".join(lines) + "\n"
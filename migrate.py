@@ -0,0 +1,143 @@
+import argparse, datetime
+from sqlalchemy import MetaData, Table, Column, Index, ForeignKey, Integer, String, Date, DateTime, Text, Numeric, select, insert, text, inspect
+from database import engine
+import matviews, partitions, schema_baseline
+
+# Versioned schema migrations, run once per deploy (`python migrate.py`) instead of
+# create_all in every worker at import. Each migration is a function of a connection,
+# applied in order in its own transaction and recorded in schema_migrations. 0001 is the
+# frozen schema from before migrations (schema_baseline.py); every table, column and
+# index added since has its own migration that skips what a database already has, so
+# databases built by an older create_all are brought up to date as well.
+
+meta = MetaData()
+schema_migrations = Table("schema_migrations", meta,
+                          Column("version", String(50), primary_key=True),
+                          Column("description", String(255)),
+                          Column("applied_at", DateTime))
+
+MIGRATIONS = []
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+def _reflect(conn, *names):
+    md = MetaData()
+    for name in names:
+        Table(name, md, autoload_with=conn)
+    return md
+
+def _create_index(conn, name, table, *columns):
+    t = _reflect(conn, table).tables[table]
+    Index(name, *(t.c[c] for c in columns)).create(conn, checkfirst=True)
+
+@migration("0001", "baseline schema")
+def baseline(conn):
+    # creates only what is missing, so databases built by the old create_all are adopted as is
+    schema_baseline.metadata.create_all(conn)
+
+@migration("0002", "report materialized views (Postgres only)")
+def report_views(conn):
+    # the journal view needs line dates; 0009 creates it
+    matviews.create(conn, set(matviews.VIEWS) - {"mv_gl_monthly"})
+
+@migration("0003", "journal line dates and archived periods")
+def journal_line_dates(conn):
+    # lines carry their journal's date (the partition and pruning key), backfilled here
+    if "date" not in {c["name"] for c in inspect(conn).get_columns("journal_entry_lines")}:
+        conn.execute(text("ALTER TABLE journal_entry_lines ADD COLUMN date DATE"))
+    conn.execute(text("UPDATE journal_entry_lines SET date = (SELECT j.date FROM journal_entries j WHERE j.id = journal_entry_lines.journal_id) "
+                      "WHERE date IS NULL AND journal_id IS NOT NULL"))
+    _create_index(conn, "ix_journal_entry_lines_date", "journal_entry_lines", "date")
+    Table("archived_periods", MetaData(), Column("id", Integer, primary_key=True, index=True),
+          Column("period", String(20), unique=True, nullable=False), Column("archived_at", DateTime),
+          Column("journal_entries", Integer), Column("journal_lines", Integer), Column("path", String(500))).create(conn, checkfirst=True)
+
+@migration("0004", "journal indexes")
+def journal_indexes(conn):
+    _create_index(conn, "ix_journal_entries_date", "journal_entries", "date")
+    _create_index(conn, "ix_journal_entry_lines_journal_id", "journal_entry_lines", "journal_id")
+    _create_index(conn, "ix_journal_entry_lines_cost_center", "journal_entry_lines", "cost_center")
+
+@migration("0005", "order line indexes")
+def order_line_indexes(conn):
+    _create_index(conn, "ix_sales_order_lines_so_id", "sales_order_lines", "so_id")
+    _create_index(conn, "ix_purchase_order_lines_po_id", "purchase_order_lines", "po_id")
+
+@migration("0006", "due date and calendar range indexes")
+def due_date_indexes(conn):
+    _create_index(conn, "ix_accounts_receivable_due_date", "accounts_receivable", "due_date")
+    _create_index(conn, "ix_accounts_payable_due_date", "accounts_payable", "due_date")
+    _create_index(conn, "ix_supplier_contracts_end_date", "supplier_contracts", "end_date")
+    _create_index(conn, "ix_calendar_events_start_end", "calendar_events", "start", "end")
+
+@migration("0007", "reconciliation lines")
+def reconciliation_lines(conn):
+    md = _reflect(conn, "reconciliation")
+    Table("reconciliation_lines", md, Column("id", Integer, primary_key=True, index=True),
+          Column("reconciliation_id", Integer, ForeignKey("reconciliation.id"), index=True), Column("statement_date", Date),
+          Column("amount", Numeric(14,2)), Column("reference", String(255)), Column("status", String(50)),
+          Column("source", String(50)), Column("source_id", Integer), Column("match_type", String(50))).create(conn, checkfirst=True)
+
+@migration("0008", "period close and summary tables")
+def period_close(conn):
+    md = MetaData()
+    Table("period_closes", md, Column("id", Integer, primary_key=True, index=True), Column("period", String(20), unique=True, nullable=False),
+          Column("closed_at", DateTime), Column("notes", Text))
+    Table("period_summaries", md, Column("id", Integer, primary_key=True, index=True), Column("period", String(20), nullable=False),
+          Column("section", String(20), nullable=False), Column("key", String(100)), Column("debit", Numeric(14,2)),
+          Column("credit", Numeric(14,2)), Column("amount", Numeric(14,2)),
+          Index("ix_period_summaries_period_section", "period", "section"))
+    md.create_all(conn)
+
+@migration("0009", "monthly GL view on line dates (Postgres only)")
+def gl_view_line_dates(conn):
+    matviews.recreate(conn, "mv_gl_monthly")
+
+def applied(conn):
+    meta.create_all(conn)
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+def upgrade(bind=engine):
+    done = []
+    with bind.connect() as lock:
+        if bind.dialect.name == "postgresql":
+            # one migrator at a time when several containers start together
+            lock.execute(text("SELECT pg_advisory_lock(hashtext('schema_migrations'))"))
+        try:
+            with bind.begin() as conn:
+                versions = applied(conn)
+            for version, description, fn in sorted(MIGRATIONS):
+                if version in versions:
+                    continue
+                with bind.begin() as conn:
+                    fn(conn)
+                    conn.execute(insert(schema_migrations).values(version=version, description=description, applied_at=datetime.datetime.utcnow()))
+                done.append(version)
+            with bind.begin() as conn:
+                # upcoming monthly journal line partitions, when the table is partitioned
+                partitions.ensure(conn)
+        finally:
+            if bind.dialect.name == "postgresql":
+                lock.execute(text("SELECT pg_advisory_unlock(hashtext('schema_migrations'))"))
+                lock.commit()
+    return done
+
+def status():
+    with engine.begin() as conn:
+        versions = applied(conn)
+    return [{"version": v, "description": d, "applied": v in versions} for v, d, _ in sorted(MIGRATIONS)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--status", action="store_true", help="list migrations without applying")
+    args = parser.parse_args()
+    if args.status:
+        for m in status():
+            print(f"{m['version']}  {'applied' if m['applied'] else 'pending':8s}  {m['description']}")
+    else:
+        done = upgrade()
+        print(f"applied {', '.join(done)}" if done else "schema up to date")
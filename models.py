@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Text, Numeric, Boolean, Enum
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Text, Numeric, Boolean, Enum, Index
 from sqlalchemy.orm import relationship
 from database import Base
 import enum
@@ -54,7 +54,7 @@ class PurchaseOrder(Base):
 class PurchaseOrderLine(Base):
     __tablename__ = "purchase_order_lines"
     id = Column(Integer, primary_key=True, index=True)
-    po_id = Column(Integer, ForeignKey("purchase_orders.id"))
+    po_id = Column(Integer, ForeignKey("purchase_orders.id"), index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Numeric(14,2))
     unit_cost = Column(Numeric(14,2))
@@ -71,7 +71,7 @@ class SalesOrder(Base):
 class SalesOrderLine(Base):
     __tablename__ = "sales_order_lines"
     id = Column(Integer, primary_key=True, index=True)
-    so_id = Column(Integer, ForeignKey("sales_orders.id"))
+    so_id = Column(Integer, ForeignKey("sales_orders.id"), index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Numeric(14,2))
     unit_price = Column(Numeric(14,2))
@@ -96,7 +96,7 @@ class SupplierContract(Base):
     id = Column(Integer, primary_key=True, index=True)
     vendor_id = Column(Integer, ForeignKey("vendors.id"))
     start_date = Column(Date)
-    end_date = Column(Date)
+    end_date = Column(Date, index=True)
     terms = Column(Text)
 
 # Finance
@@ -113,7 +113,7 @@ class AccountsPayable(Base):
     vendor_id = Column(Integer, ForeignKey("vendors.id"))
     invoice_number = Column(String(100))
     invoice_date = Column(Date)
-    due_date = Column(Date)
+    due_date = Column(Date, index=True)
     amount = Column(Numeric(14,2))
     status = Column(String(50))
     vendor = relationship("Vendor", lazy="joined")
@@ -124,7 +124,7 @@ class AccountsReceivable(Base):
     customer_id = Column(Integer, ForeignKey("customers.id"))
     invoice_number = Column(String(100))
     invoice_date = Column(Date)
-    due_date = Column(Date)
+    due_date = Column(Date, index=True)
     amount = Column(Numeric(14,2))
     status = Column(String(50))
     customer = relationship("Customer", lazy="joined")
@@ -154,19 +154,20 @@ class FXRate(Base):
 class JournalEntry(Base):
     __tablename__ = "journal_entries"
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date)
+    date = Column(Date, index=True)
     description = Column(String(255))
     posted = Column(Boolean, default=False)
 
 class JournalEntryLine(Base):
     __tablename__ = "journal_entry_lines"
     id = Column(Integer, primary_key=True, index=True)
-    journal_id = Column(Integer, ForeignKey("journal_entries.id"))
+    journal_id = Column(Integer, ForeignKey("journal_entries.id"), index=True)
     account_code = Column(String(100))
     description = Column(String(255))
     debit = Column(Numeric(14,2), default=0)
     credit = Column(Numeric(14,2), default=0)
-    cost_center = Column(String(100))
+    cost_center = Column(String(100), index=True)
+    date = Column(Date, index=True)  # copy of the journal's date, the partition key on Postgres
 
 class CostCenter(Base):
     __tablename__ = "cost_centers"
@@ -198,6 +199,47 @@ class Reconciliation(Base):
     status = Column(String(50))
     notes = Column(Text)
 
+# Statement lines of a reconciliation run and the ledger row each one matched
+class ReconciliationLine(Base):
+    __tablename__ = "reconciliation_lines"
+    id = Column(Integer, primary_key=True, index=True)
+    reconciliation_id = Column(Integer, ForeignKey("reconciliation.id"), index=True)
+    statement_date = Column(Date)
+    amount = Column(Numeric(14,2))
+    reference = Column(String(255))
+    status = Column(String(50))  # Matched/Unmatched
+    source = Column(String(50))  # journal_lines/cash_flow
+    source_id = Column(Integer)
+    match_type = Column(String(50))  # reference/amount_date
+
+# Period close: frozen per-period rollups served instead of live aggregates
+class PeriodClose(Base):
+    __tablename__ = "period_closes"
+    id = Column(Integer, primary_key=True, index=True)
+    period = Column(String(20), unique=True, nullable=False)  # '2025-08'
+    closed_at = Column(DateTime)
+    notes = Column(Text)
+
+class ArchivedPeriod(Base):
+    __tablename__ = "archived_periods"
+    id = Column(Integer, primary_key=True, index=True)
+    period = Column(String(20), unique=True, nullable=False)  # '2023-01', journals moved to Parquet
+    archived_at = Column(DateTime)
+    journal_entries = Column(Integer)
+    journal_lines = Column(Integer)
+    path = Column(String(500))
+
+class PeriodSummary(Base):
+    __tablename__ = "period_summaries"
+    __table_args__ = (Index("ix_period_summaries_period_section", "period", "section"),)
+    id = Column(Integer, primary_key=True, index=True)
+    period = Column(String(20), nullable=False)
+    section = Column(String(20), nullable=False)  # gl/tax/ar/ap
+    key = Column(String(100))  # account code, tax type or invoice status
+    debit = Column(Numeric(14,2), default=0)
+    credit = Column(Numeric(14,2), default=0)
+    amount = Column(Numeric(14,2), default=0)
+
 # Forecasts (for Actual vs Forecast)
 class Forecast(Base):
     __tablename__ = "forecasts"
@@ -210,6 +252,7 @@ class Forecast(Base):
 # Calendar events for dashboard
 class CalendarEvent(Base):
     __tablename__ = "calendar_events"
+    __table_args__ = (Index("ix_calendar_events_start_end", "start", "end"),)
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255))
     start = Column(DateTime)
@@ -0,0 +1,63 @@
+from sqlalchemy import event, select, update, func, exists
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+import models, changefeed
+
+# Order header total_amount is derived from its lines. Every flush that touches lines,
+# or writes a header's total_amount directly, recomputes just the affected headers; recompute_all() repairs every header with one
+# UPDATE ... FROM (SELECT ... GROUP BY). Bulk paths that insert lines with core
+# statements call recompute() for the headers they touched.
+
+# header model -> (line model, foreign key attribute, line amount)
+ORDERS = {
+    models.SalesOrder: (models.SalesOrderLine, "so_id", models.SalesOrderLine.quantity * models.SalesOrderLine.unit_price),
+    models.PurchaseOrder: (models.PurchaseOrderLine, "po_id", models.PurchaseOrderLine.quantity * models.PurchaseOrderLine.unit_cost),
+}
+LINES = {line: (header, fk) for header, (line, fk, _) in ORDERS.items()}
+
+def _line_total(header):
+    line, fk, amount = ORDERS[header]
+    return select(func.round(func.coalesce(func.sum(amount), 0), 2)).where(getattr(line, fk) == header.id).scalar_subquery()
+
+def recompute(session: Session, header, ids):
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return
+    table = header.__table__
+    session.connection().execute(update(table).where(table.c.id.in_(ids)).values(total_amount=_line_total(header)))
+    changefeed.record(session, {table.name}, {table.name}, {table.name: ids})
+    # loaded headers would otherwise keep the old total
+    for i in ids:
+        obj = session.identity_map.get(session.identity_key(header, i))
+        if obj is not None:
+            session.expire(obj, ["total_amount"])
+
+def recompute_all(session: Session, header, include_empty: bool = False):
+    line, fk, amount = ORDERS[header]
+    table = header.__table__
+    fk_col = line.__table__.c[fk]
+    totals = select(fk_col.label("order_id"), func.round(func.sum(amount), 2).label("total")).where(fk_col.isnot(None)).group_by(fk_col).subquery()
+    updated = session.execute(update(table).where(table.c.id == totals.c.order_id, table.c.total_amount.is_distinct_from(totals.c.total)).values(total_amount=totals.c.total)).rowcount
+    emptied = 0
+    if include_empty:
+        emptied = session.execute(update(table).where(~exists().where(fk_col == table.c.id), table.c.total_amount != 0).values(total_amount=0)).rowcount
+    session.commit()
+    return {"table": table.name, "updated": updated, "emptied": emptied}
+
+@event.listens_for(Session, "after_flush")
+def _sync_order_totals(session, flush_context):
+    touched = {}
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if type(obj) in ORDERS:
+            # a client-supplied total is overwritten with the line total
+            if obj not in session.deleted and get_history(obj, "total_amount").added:
+                touched.setdefault(type(obj), set()).add(obj.id)
+            continue
+        target = LINES.get(type(obj))
+        if not target:
+            continue
+        header, fk = target
+        hist = get_history(obj, fk)
+        touched.setdefault(header, set()).update((getattr(obj, fk), *hist.deleted))
+    for header, ids in touched.items():
+        recompute(session, header, ids)
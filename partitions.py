@@ -0,0 +1,150 @@
+import argparse, datetime, os, re
+from sqlalchemy import event, select, update, text
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from database import engine
+import models, matviews, changefeed
+
+# journal_entry_lines.date is a copy of its journal's date, kept in step on every flush,
+# so date filters on lines need no join and Postgres can prune by it. On Postgres the
+# table can be converted (once, `python partitions.py --convert`) into a table
+# partitioned by month on that date: one partition per month plus a default partition
+# for undated lines and months not created yet. Partitions for the coming
+# JOURNAL_PARTITION_AHEAD months are added by every `python migrate.py` (or
+# `python partitions.py`); archive.py detaches and drops the partitions of archived months.
+
+TABLE = "journal_entry_lines"
+DEFAULT = f"{TABLE}_default"
+AHEAD = int(os.getenv("JOURNAL_PARTITION_AHEAD", "3"))
+NAME = re.compile(rf"^{TABLE}_p(\d{{4}})(\d{{2}})$")
+
+# Line dates
+@event.listens_for(Session, "before_flush")
+def _stamp_line_dates(session, flush_context, instances):
+    lines = [obj for obj in session.new if isinstance(obj, models.JournalEntryLine)]
+    lines += [obj for obj in session.dirty if isinstance(obj, models.JournalEntryLine) and get_history(obj, "journal_id").has_changes()]
+    lines = [obj for obj in lines if obj.journal_id is not None]
+    if not lines:
+        return
+    je = models.JournalEntry
+    dates = {}
+    missing = set()
+    for j in {obj.journal_id for obj in lines}:
+        journal = session.identity_map.get(session.identity_key(je, j))
+        if journal is not None:
+            dates[j] = journal.date
+        else:
+            missing.add(j)
+    if missing:
+        dates.update(session.execute(select(je.id, je.date).where(je.id.in_(missing))).all())
+    for obj in lines:
+        obj.date = dates.get(obj.journal_id)
+
+@event.listens_for(Session, "after_flush")
+def _move_line_dates(session, flush_context):
+    moved = {obj.id: obj.date for obj in session.dirty if isinstance(obj, models.JournalEntry) and get_history(obj, "date").has_changes()}
+    if not moved:
+        return
+    jel = models.JournalEntryLine.__table__
+    for j, d in moved.items():
+        session.connection().execute(update(jel).where(jel.c.journal_id == j).values(date=d))
+    changefeed.record(session, {TABLE}, {TABLE})
+    # loaded lines would otherwise keep the old date
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, models.JournalEntryLine) and obj.journal_id in moved:
+            session.expire(obj, ["date"])
+
+# Postgres partitions
+def next_month(month: datetime.date):
+    return (month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+def partition_name(month: datetime.date):
+    return f"{TABLE}_p{month:%Y%m}"
+
+def is_partitioned(conn):
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                             "WHERE c.relname = :t AND pg_table_is_visible(c.oid))"), {"t": TABLE}).scalar()
+
+def partitions(conn):
+    # month -> name of the attached monthly partitions
+    names = conn.execute(text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                              "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :t"), {"t": TABLE}).scalars()
+    out = {}
+    for name in names:
+        m = NAME.match(name)
+        if m:
+            out[datetime.date(int(m[1]), int(m[2]), 1)] = name
+    return out
+
+def add_partition(conn, month: datetime.date):
+    # rows of that month already parked in the default partition move into the new one
+    name, lo, hi = partition_name(month), month, next_month(month)
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)"))
+    conn.execute(text(f"WITH moved AS (DELETE FROM {DEFAULT} WHERE date >= :lo AND date < :hi RETURNING *) "
+                      f"INSERT INTO {name} SELECT * FROM moved"), {"lo": lo, "hi": hi})
+    conn.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{lo}') TO ('{hi}')"))
+    return name
+
+def ensure(conn, ahead: int = AHEAD, today: datetime.date = None):
+    # create the missing partitions from this month through `ahead` months out
+    if not is_partitioned(conn):
+        return []
+    existing = partitions(conn)
+    month = (today or datetime.date.today()).replace(day=1)
+    added = []
+    for _ in range(ahead + 1):
+        if month not in existing:
+            added.append(add_partition(conn, month))
+        month = next_month(month)
+    return added
+
+def convert(conn, ahead: int = AHEAD):
+    # one-off: rebuild journal_entry_lines as a table partitioned by month on date. Takes
+    # an exclusive lock and copies every line, so run it in a maintenance window.
+    if is_partitioned(conn):
+        return ensure(conn, ahead)
+    old = f"{TABLE}_unpartitioned"
+    conn.execute(text(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE"))
+    seq = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": TABLE}).scalar()
+    lo, hi = conn.execute(text(f"SELECT min(date), max(date) FROM {TABLE}")).one()
+    # the view depends on the table; it is created again on the new one below
+    conn.execute(text("DROP MATERIALIZED VIEW IF EXISTS mv_gl_monthly"))
+    conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {old}"))
+    conn.execute(text(f"CREATE TABLE {TABLE} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (date)"))
+    conn.execute(text(f"CREATE TABLE {DEFAULT} PARTITION OF {TABLE} DEFAULT"))
+    today = datetime.date.today().replace(day=1)
+    month, last = (lo or today).replace(day=1), max(hi or today, today).replace(day=1)
+    for _ in range(ahead):
+        last = next_month(last)
+    added = []
+    while month <= last:
+        name = partition_name(month)
+        conn.execute(text(f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM ('{month}') TO ('{next_month(month)}')"))
+        added.append(name)
+        month = next_month(month)
+    conn.execute(text(f"INSERT INTO {TABLE} SELECT * FROM {old}"))
+    if seq:
+        conn.execute(text(f"ALTER SEQUENCE {seq} OWNED BY {TABLE}.id"))
+    conn.execute(text(f"DROP TABLE {old}"))
+    # partitioned tables cannot have a primary key without the partition key, and date
+    # may be null, so id keeps a plain index
+    for index in models.JournalEntryLine.__table__.indexes:
+        index.create(conn)
+    conn.execute(text(f"ALTER TABLE {TABLE} ADD FOREIGN KEY (journal_id) REFERENCES journal_entries (id)"))
+    matviews.create(conn)
+    return added
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monthly partitions of journal_entry_lines (Postgres)")
+    parser.add_argument("--convert", action="store_true", help="convert the table to a partitioned one (exclusive lock, copies every line)")
+    parser.add_argument("--ahead", type=int, default=AHEAD, help="months ahead to create partitions for")
+    args = parser.parse_args()
+    if engine.dialect.name != "postgresql":
+        parser.error("journal partitioning needs Postgres")
+    with engine.begin() as conn:
+        if not args.convert and not is_partitioned(conn):
+            parser.error(f"{TABLE} is not partitioned; run with --convert first")
+        added = convert(conn, args.ahead) if args.convert else ensure(conn, args.ahead)
+    print(f"created {', '.join(added)}" if added else "partitions up to date")
@@ -0,0 +1,77 @@
+import datetime, os, threading, time
+from sqlalchemy import select, event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+import models
+
+# Closed accounting periods. The closed set is tiny, so each worker caches it and
+# checks every flush against it: rows dated into a closed period cannot be inserted,
+# changed or deleted.
+CACHE_TTL = float(os.getenv("PERIOD_CACHE_TTL", "60"))
+
+DATED = {
+    models.JournalEntry: "date",
+    models.TaxLedger: "date",
+    models.CashFlow: "date",
+    models.AccountsReceivable: "invoice_date",
+    models.AccountsPayable: "invoice_date",
+}
+
+class PeriodClosedError(Exception):
+    pass
+
+_lock = threading.Lock()
+_closed = None
+_loaded_at = 0.0
+
+def invalidate():
+    global _closed
+    _closed = None
+
+def closed_periods(db: Session):
+    global _closed, _loaded_at
+    closed = _closed
+    if closed is not None and time.monotonic() - _loaded_at < CACHE_TTL:
+        return closed
+    with _lock:
+        closed = frozenset(db.scalars(select(models.PeriodClose.period)).all())
+        _closed, _loaded_at = closed, time.monotonic()
+    return closed
+
+def is_closed(db: Session, period: str):
+    return period in closed_periods(db)
+
+def period_of(value):
+    if value is None:
+        return None
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime("%Y-%m")
+    return str(value)[:7]
+
+def _touched_periods(obj, attr, new):
+    hist = get_history(obj, attr)
+    values = [getattr(obj, attr)] if new else [*hist.added, *hist.unchanged, *hist.deleted]
+    return {period_of(v) for v in values} - {None}
+
+# first in line, so a rejected flush never queues for the SQLite write lock
+@event.listens_for(Session, "before_flush", insert=True)
+def _reject_closed_period_writes(session, flush_context, instances):
+    checks = [(obj, True) for obj in session.new] + [(obj, False) for obj in session.dirty if session.is_modified(obj)] + [(obj, False) for obj in session.deleted]
+    if not checks:
+        return
+    touched = set()
+    journal_ids = set()
+    for obj, new in checks:
+        attr = DATED.get(type(obj))
+        if attr:
+            touched |= _touched_periods(obj, attr, new)
+        elif isinstance(obj, models.JournalEntryLine):
+            journal_ids |= {v for v in (obj.journal_id, *get_history(obj, "journal_id").deleted) if v is not None}
+    if journal_ids:
+        je = models.JournalEntry
+        touched |= {period_of(d) for d in session.scalars(select(je.date).where(je.id.in_(journal_ids))).all()} - {None}
+    if not touched:
+        return
+    blocked = touched & closed_periods(session)
+    if blocked:
+        raise PeriodClosedError(f"Period {', '.join(sorted(blocked))} is closed")
@@ -0,0 +1,135 @@
+import hmac, os, re, sys, threading, time
+from collections import Counter
+from urllib.parse import parse_qs
+import anyio
+from starlette.responses import JSONResponse
+
+# Sampling profiler. A request sent with `X-Profile: 1` (or ?profile=1) and a matching
+# `X-Admin-Token: $PROFILE_ADMIN_TOKEN` is sampled while it runs; the folded stacks
+# (flamegraph.pl / speedscope input) land in PROFILE_DIR and the file name is returned
+# in the X-Profile-Artifact header. Stacks of every busy thread are sampled, so
+# concurrent requests show up in the same profile. With PROFILE_SAMPLE_HZ > 0 a
+# background sampler also aggregates the whole process at that rate and writes a file
+# every PROFILE_FLUSH_INTERVAL seconds.
+
+ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+REQUEST_HZ = float(os.getenv("PROFILE_REQUEST_HZ", "500"))
+SAMPLE_HZ = float(os.getenv("PROFILE_SAMPLE_HZ", "0"))
+FLUSH_INTERVAL = float(os.getenv("PROFILE_FLUSH_INTERVAL", "60"))
+
+# threads parked in these modules are idle pool workers / the idle event loop
+IDLE_FILES = ("threading.py", "selectors.py", "queue.py", "thread.py", "base_events.py")
+
+def _label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+def folded(frame):
+    stack = []
+    while frame is not None:
+        stack.append(_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+class Sampler(threading.Thread):
+    def __init__(self, hz):
+        super().__init__(daemon=True, name="profiler")
+        self.interval = 1.0 / hz
+        self.counts = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        me = threading.get_ident()
+        frames = sys._current_frames()
+        with self.lock:
+            self.samples += 1
+            for tid, frame in frames.items():
+                if tid == me or os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                    continue
+                self.counts[folded(frame)] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def drain(self):
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+        return counts
+
+def write(name, counts):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, name)
+    with open(path, "w") as f:
+        for stack, n in counts.most_common():
+            f.write(f"{stack} {n}\n")
+    return path
+
+def _artifact_name(scope):
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", scope.get("path", "")).strip("_") or "root"
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{slug}.folded"
+
+def _requested(scope):
+    headers = dict(scope.get("headers") or [])
+    flag = headers.get(b"x-profile", b"").decode("latin-1") or parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile", [""])[0]
+    # the token stays bytes: compare_digest only takes ASCII str
+    return flag.lower() in ("1", "true", "yes"), headers.get(b"x-admin-token", b"")
+
+class ProfileMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        wanted, token = _requested(scope)
+        if not wanted:
+            return await self.app(scope, receive, send)
+        if not ADMIN_TOKEN or not hmac.compare_digest(token, ADMIN_TOKEN.encode()):
+            return await JSONResponse({"detail": "Profiling requires a valid X-Admin-Token"}, status_code=403)(scope, receive, send)
+        name = _artifact_name(scope)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-artifact", name.encode())]}
+            await send(message)
+
+        sampler = Sampler(REQUEST_HZ)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # joining the sampler and writing the artifact would block the event loop
+            await anyio.to_thread.run_sync(sampler.stop)
+            await anyio.to_thread.run_sync(lambda: write(name, sampler.drain()))
+
+class BackgroundProfiler(Sampler):
+    # low-rate whole-process sampling, flushed to disk periodically
+    def run(self):
+        flushed = time.monotonic()
+        while not self.stopped.wait(self.interval):
+            self.sample()
+            if time.monotonic() - flushed >= FLUSH_INTERVAL:
+                self.flush()
+                flushed = time.monotonic()
+        self.flush()
+
+    def flush(self):
+        counts = self.drain()
+        if counts:
+            write(f"continuous-{time.strftime('%Y%m%dT%H%M%S')}.folded", counts)
+
+background = None
+
+def start_background():
+    global background
+    if SAMPLE_HZ > 0 and background is None:
+        background = BackgroundProfiler(SAMPLE_HZ)
+        background.start()
+    return background
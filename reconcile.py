@@ -0,0 +1,82 @@
+from collections import defaultdict
+import numpy as np
+
+# Bank statement matching. Ledger candidates are indexed once: by reference in a hash
+# map, and by amount and date in a single sorted key array (cents << 20 | date ordinal),
+# so the candidate window of every statement line is two vectorized searchsorted calls
+# instead of a scan over the ledger. Each ledger row is matched at most once.
+
+ORD_BITS = 20  # date ordinals stay below 2**20 until the year 2870
+
+def normalize_ref(ref):
+    return "".join(str(ref).split()).upper() if ref else ""
+
+def _keys(cents, ords):
+    return (np.asarray(cents, dtype=np.int64) << ORD_BITS) | np.asarray(ords, dtype=np.int64)
+
+class LedgerIndex:
+    def __init__(self, candidates):
+        # candidates: sequence of (date, cents, reference, source, source_id)
+        self.rows = candidates
+        self.used = bytearray(len(candidates))
+        self.ords = np.fromiter((c[0].toordinal() for c in candidates), dtype=np.int64, count=len(candidates))
+        cents = np.fromiter((c[1] for c in candidates), dtype=np.int64, count=len(candidates))
+        keys = _keys(cents, self.ords)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+        self.by_ref = defaultdict(list)
+        for i, c in enumerate(candidates):
+            key = normalize_ref(c[2])
+            if key:
+                self.by_ref[key].append(i)
+
+    def windows(self, statement, window):
+        # [lo, hi) slices of the sorted keys holding same-amount candidates within the window
+        ords = np.fromiter((s[0].toordinal() for s in statement), dtype=np.int64, count=len(statement))
+        cents = np.fromiter((s[1] for s in statement), dtype=np.int64, count=len(statement))
+        lo = np.searchsorted(self.keys, _keys(cents, ords - window), side="left")
+        hi = np.searchsorted(self.keys, _keys(cents, ords + window), side="right")
+        return ords, lo.tolist(), hi.tolist()
+
+    def match_reference(self, d, cents, ref, window):
+        for i in self.by_ref.get(normalize_ref(ref), ()):
+            rd, rc = self.rows[i][0], self.rows[i][1]
+            if not self.used[i] and rc == cents and abs((rd - d).days) <= window:
+                self.used[i] = 1
+                return i
+        return None
+
+    def match_amount(self, o, lo, hi):
+        # closest unused candidate inside the precomputed window
+        best = None; best_gap = None
+        for k in range(lo, hi):
+            i = int(self.order[k])
+            if self.used[i]:
+                continue
+            gap = abs(int(self.ords[i]) - o)
+            if best is None or gap < best_gap:
+                best, best_gap = i, gap
+        if best is not None:
+            self.used[best] = 1
+        return best
+
+def match(statement, candidates, window=3):
+    # statement: sequence of (date, cents, reference); returns one (candidate index or
+    # None, match type) per statement line. Reference matches are taken first so they
+    # cannot be claimed by an amount/date match on another line.
+    results = [(None, None)] * len(statement)
+    if not statement or not candidates:
+        return results
+    index = LedgerIndex(candidates)
+    for n, (d, cents, ref) in enumerate(statement):
+        if ref:
+            i = index.match_reference(d, cents, ref, window)
+            if i is not None:
+                results[n] = (i, "reference")
+    ords, lo, hi = index.windows(statement, window)
+    for n in range(len(statement)):
+        if results[n][0] is None and lo[n] < hi[n]:
+            i = index.match_amount(int(ords[n]), lo[n], hi[n])
+            if i is not None:
+                results[n] = (i, "amount_date")
+    return results
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import crud, models
 from database import get_db
@@ -6,8 +7,10 @@ from database import get_db
 router = APIRouter(prefix="/accounts_payable", tags=["accounts_payable"])
 
 @router.get("/")
-def list_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.list_all(db, models.AccountsPayable, skip, limit)
+def list_items(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    if crud.wants_ndjson(request):
+        return StreamingResponse(crud.stream_list(models.AccountsPayable, request.query_params), media_type=crud.NDJSON)
+    return crud.list_all(db, models.AccountsPayable, skip, limit, request.query_params)
 
 @router.get("/{item_id}")
 def get_item(item_id: int, db: Session = Depends(get_db)):
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import crud, models
 from database import get_db
@@ -6,8 +7,14 @@ from database import get_db
 router = APIRouter(prefix="/calendar_events", tags=["calendar_events"])
 
 @router.get("/")
-def list_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.list_all(db, models.CalendarEvent, skip, limit)
+def list_items(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    if crud.wants_ndjson(request):
+        return StreamingResponse(crud.stream_list(models.CalendarEvent, request.query_params), media_type=crud.NDJSON)
+    return crud.list_all(db, models.CalendarEvent, skip, limit, request.query_params)
+
+@router.get("/range")
+def list_range(start: str = None, end: str = None, skip: int = 0, limit: int = 100, include_generated: bool = True, db: Session = Depends(get_db)):
+    return crud.list_calendar_events(db, start, end, skip, limit, include_generated)
 
 @router.get("/{item_id}")
 def get_item(item_id: int, db: Session = Depends(get_db)):
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from database import Base
+import changefeed
+router = APIRouter(prefix="/events", tags=["events"])
+
+def _names(value, known, what):
+    names = [n.strip() for n in (value or "").split(",") if n.strip()]
+    unknown = [n for n in names if n not in known]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown {what}: {', '.join(unknown)}")
+    return names
+
+@router.get("/stream")
+def stream(request: Request, tables: str = None, reports: str = None):
+    # Server-Sent Events: `change` events name the changed tables and affected reports,
+    # `resync` asks the client to refetch everything
+    tables = _names(tables, Base.metadata.tables, "tables")
+    reports = _names(reports, changefeed.REPORT_TABLES, "reports")
+    return StreamingResponse(changefeed.stream(tables, reports, request.headers.get("last-event-id")), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
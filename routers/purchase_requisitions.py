@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import crud, models
 from database import get_db
@@ -6,8 +7,10 @@ from database import get_db
 router = APIRouter(prefix="/purchase_requisitions", tags=["purchase_requisitions"])
 
 @router.get("/")
-def list_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.list_all(db, models.PurchaseRequisition, skip, limit)
+def list_items(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    if crud.wants_ndjson(request):
+        return StreamingResponse(crud.stream_list(models.PurchaseRequisition, request.query_params), media_type=crud.NDJSON)
+    return crud.list_all(db, models.PurchaseRequisition, skip, limit, request.query_params)
 
 @router.get("/{item_id}")
 def get_item(item_id: int, db: Session = Depends(get_db)):
@@ -34,6 +37,10 @@ def delete_item(item_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="PurchaseRequisition not found")
     return {"ok": True}
 
+@router.post("/convert")
+def convert(status: str = "Approved", order_status: str = "Open", db: Session = Depends(get_db)):
+    return crud.convert_requisitions(db, status, order_status)
+
 @router.post("/upload")
 def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db)):
     content = file.file.read()
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import crud, models
 from database import get_db
@@ -6,8 +7,14 @@ from database import get_db
 router = APIRouter(prefix="/reconciliation", tags=["reconciliation"])
 
 @router.get("/")
-def list_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.list_all(db, models.Reconciliation, skip, limit)
+def list_items(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    if crud.wants_ndjson(request):
+        return StreamingResponse(crud.stream_list(models.Reconciliation, request.query_params), media_type=crud.NDJSON)
+    return crud.list_all(db, models.Reconciliation, skip, limit, request.query_params)
+
+@router.get("/{item_id}/lines")
+def list_lines(item_id: int, status: str = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    return crud.list_reconciliation_lines(db, item_id, status, skip, limit)
 
 @router.get("/{item_id}")
 def get_item(item_id: int, db: Session = Depends(get_db)):
@@ -38,3 +45,8 @@ def delete_item(item_id: int, db: Session = Depends(get_db)):
 def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db)):
     content = file.file.read()
     return crud.bulk_upload(db, models.Reconciliation, content, file.filename)
+
+@router.post("/auto_match")
+def auto_match(account_code: str, period: str, date_window: int = 3, include_cash_flow: bool = True, file: UploadFile = File(...), db: Session = Depends(get_db)):
+    content = file.file.read().decode("utf-8-sig")
+    return crud.auto_reconcile(db, account_code, period, content, date_window, include_cash_flow)
@@ -1,36 +1,115 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from database import get_db
-import crud
+import crud, datetime, admission, matviews
 router = APIRouter(prefix="/reports", tags=["reports"])
 
+def _guarded(db, request):
+    # statement timeout + cancel on client disconnect (see admission)
+    release = admission.guard_session(db, request.scope)
+    try:
+        yield db
+    except Exception as e:
+        if admission.is_timeout(e):
+            raise HTTPException(status_code=504, detail="Report query timed out or was cancelled")
+        raise
+    finally:
+        release()
+
+def report_db(request: Request, engine: str = "primary", db = Depends(get_db)):
+    # ?engine=columnar runs the same report queries on the DuckDB mirror (see analytics)
+    if engine == "primary":
+        yield from _guarded(db, request)
+    elif engine == "columnar":
+        import analytics
+        try:
+            sessions = analytics.get_db()
+            columnar = next(sessions)
+        except analytics.ColumnarUnavailable as e:
+            raise HTTPException(status_code=501, detail=str(e))
+        except analytics.ColumnarStale as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(1, round(analytics.MAX_WAIT)))})
+        try:
+            yield from _guarded(columnar, request)
+        finally:
+            sessions.close()
+    else:
+        raise HTTPException(status_code=400, detail="engine must be primary or columnar")
+
 @router.get("/trial_balance")
-def trial_balance(period: str = None, db = Depends(get_db)):
-    return crud.report_trial_balance(db, period)
+def trial_balance(response: Response, period: str = None, currency: str = None, db = Depends(report_db)):
+    response.headers.update(matviews.headers(db, "trial_balance", period))
+    return crud.report_trial_balance(db, period, currency)
 
 @router.get("/pnl")
-def pnl(period: str = None, db = Depends(get_db)):
-    return crud.report_pnl(db, period)
+def pnl(response: Response, period: str = None, currency: str = None, db = Depends(report_db)):
+    response.headers.update(matviews.headers(db, "pnl", period))
+    return crud.report_pnl(db, period, currency)
 
 @router.get("/net_sales")
-def net_sales(period: str = None, db = Depends(get_db)):
-    return crud.report_net_sales(db, period)
+def net_sales(period: str = None, currency: str = None, db = Depends(report_db)):
+    return crud.report_net_sales(db, period, currency)
 
 @router.get("/actual_vs_forecast")
-def actual_vs_forecast(metric: str = "net_sales", period: str = None, db = Depends(get_db)):
-    return crud.report_actual_vs_forecast(db, metric, period)
+def actual_vs_forecast(metric: str = "net_sales", period: str = None, start: str = None, end: str = None, db = Depends(report_db)):
+    return crud.report_actual_vs_forecast(db, metric, period, start, end)
 
 @router.get("/ar_aging")
-def ar_aging(db = Depends(get_db)):
-    return crud.report_ar_aging(db)
+def ar_aging(currency: str = None, db = Depends(report_db)):
+    return crud.report_ar_aging(db, currency)
 
 @router.get("/inventory_value")
-def inventory_value(db = Depends(get_db)):
+def inventory_value(response: Response, db = Depends(report_db)):
+    response.headers.update(matviews.headers(db, "inventory_value"))
     return crud.report_inventory_value(db)
 
 @router.get("/inventory_metrics")
-def inventory_metrics(db = Depends(get_db)):
+def inventory_metrics(db = Depends(report_db)):
     return crud.report_inventory_metrics(db)
 
 @router.get("/top_customers_vendors")
-def top_customers_vendors(db = Depends(get_db)):
+def top_customers_vendors(response: Response, db = Depends(report_db)):
+    response.headers.update(matviews.headers(db, "top_customers_vendors"))
     return crud.report_top_customers_vendors(db)
+
+@router.get("/budget_vs_actual")
+def budget_vs_actual(year: int = None, cost_center: str = None, db = Depends(report_db)):
+    return crud.report_budget_vs_actual(db, year, cost_center)
+
+@router.get("/cash_flow")
+def cash_flow(start: datetime.date = None, end: datetime.date = None, granularity: str = "month", db = Depends(report_db)):
+    return crud.report_cash_flow(db, start, end, granularity)
+
+@router.get("/cash_flow/projection")
+def cash_flow_projection(weeks: int = 13, history_weeks: int = 13, db = Depends(report_db)):
+    return crud.report_cash_flow_projection(db, weeks, history_weeks)
+
+@router.get("/tax_summary")
+def tax_summary(period: str = None, start: str = None, end: str = None, db = Depends(report_db)):
+    return crud.report_tax_summary(db, period, start, end)
+
+@router.get("/period_summary")
+def period_summary(period: str, db = Depends(report_db)):
+    return crud.report_period_summary(db, period)
+
+@router.post("/period_close")
+def close_period(period: str, notes: str = None, db = Depends(get_db)):
+    return crud.close_period(db, period, notes)
+
+@router.delete("/period_close")
+def reopen_period(period: str, db = Depends(get_db)):
+    if not crud.reopen_period(db, period):
+        raise HTTPException(status_code=404, detail="Period not closed")
+    return {"ok": True}
+
+@router.get("/cube")
+def cube(fact: str, dims: str = "", measures: str = "qty", start: str = None, end: str = None, rollup: bool = False, order_by: str = None, limit: int = 1000, db = Depends(report_db)):
+    split = lambda v: [x.strip() for x in v.split(",") if x.strip()]
+    return crud.report_cube(db, fact, split(dims), split(measures), start, end, rollup, order_by, limit)
+
+@router.get("/depreciation")
+def depreciation(start: str = None, periods: int = 12, method: str = "straight_line", factor: float = 2.0, as_of: datetime.date = None, detail: bool = False, db = Depends(report_db)):
+    return crud.report_depreciation(db, start, periods, method, factor, as_of, detail)
+
+@router.post("/depreciation/post")
+def post_depreciation(start: str, periods: int = 1, method: str = "straight_line", factor: float = 2.0, expense_account: str = "6100", accumulated_account: str = "1590", db = Depends(get_db)):
+    return crud.post_depreciation(db, start, periods, method, factor, expense_account, accumulated_account)
@@ -0,0 +1,57 @@
+from sqlalchemy import MetaData, Table, Column, Integer, String, Date, DateTime, ForeignKey, Text, Numeric, Boolean
+
+# The schema as it stood before versioned migrations (the original create_all), frozen
+# for migration 0001. Never edit it: schema changes go into new migrations in migrate.py.
+
+metadata = MetaData()
+
+def _table(name, *columns):
+    return Table(name, metadata, Column("id", Integer, primary_key=True, index=True), *columns)
+
+# Master data
+_table("vendors", Column("name", String(255), nullable=False, unique=True), Column("email", String(255)),
+       Column("phone", String(100)), Column("address", Text))
+_table("customers", Column("name", String(255), nullable=False, unique=True), Column("email", String(255)),
+       Column("phone", String(100)), Column("address", Text))
+_table("products", Column("sku", String(100), unique=True, nullable=False), Column("name", String(255), nullable=False),
+       Column("description", Text), Column("price", Numeric(14,2)), Column("cost", Numeric(14,2)), Column("uom", String(50)))
+_table("warehouses", Column("name", String(255), nullable=False), Column("location", String(255)))
+
+# Supply chain
+_table("purchase_orders", Column("vendor_id", Integer, ForeignKey("vendors.id")), Column("order_date", Date),
+       Column("status", String(50)), Column("total_amount", Numeric(14,2)))
+_table("purchase_order_lines", Column("po_id", Integer, ForeignKey("purchase_orders.id")), Column("product_id", Integer, ForeignKey("products.id")),
+       Column("quantity", Numeric(14,2)), Column("unit_cost", Numeric(14,2)))
+_table("sales_orders", Column("customer_id", Integer, ForeignKey("customers.id")), Column("order_date", Date),
+       Column("status", String(50)), Column("total_amount", Numeric(14,2)))
+_table("sales_order_lines", Column("so_id", Integer, ForeignKey("sales_orders.id")), Column("product_id", Integer, ForeignKey("products.id")),
+       Column("quantity", Numeric(14,2)), Column("unit_price", Numeric(14,2)))
+_table("inventory", Column("product_id", Integer, ForeignKey("products.id")), Column("warehouse_id", Integer, ForeignKey("warehouses.id")),
+       Column("quantity", Numeric(14,2)))
+_table("purchase_requisitions", Column("product_id", Integer, ForeignKey("products.id")), Column("quantity", Numeric(14,2)),
+       Column("status", String(50)), Column("needed_by", Date))
+_table("supplier_contracts", Column("vendor_id", Integer, ForeignKey("vendors.id")), Column("start_date", Date),
+       Column("end_date", Date), Column("terms", Text))
+
+# Finance
+_table("gl_accounts", Column("code", String(100), unique=True), Column("name", String(255)), Column("type", String(50)))
+_table("accounts_payable", Column("vendor_id", Integer, ForeignKey("vendors.id")), Column("invoice_number", String(100)),
+       Column("invoice_date", Date), Column("due_date", Date), Column("amount", Numeric(14,2)), Column("status", String(50)))
+_table("accounts_receivable", Column("customer_id", Integer, ForeignKey("customers.id")), Column("invoice_number", String(100)),
+       Column("invoice_date", Date), Column("due_date", Date), Column("amount", Numeric(14,2)), Column("status", String(50)))
+_table("budgets", Column("cost_center", String(100)), Column("year", Integer), Column("amount", Numeric(14,2)))
+_table("fixed_assets", Column("name", String(255)), Column("purchase_date", Date), Column("purchase_value", Numeric(14,2)),
+       Column("useful_life_years", Integer))
+_table("fx_rates", Column("currency", String(10)), Column("rate", Numeric(14,6)), Column("date", Date))
+_table("journal_entries", Column("date", Date), Column("description", String(255)), Column("posted", Boolean))
+_table("journal_entry_lines", Column("journal_id", Integer, ForeignKey("journal_entries.id")), Column("account_code", String(100)),
+       Column("description", String(255)), Column("debit", Numeric(14,2)), Column("credit", Numeric(14,2)), Column("cost_center", String(100)))
+_table("cost_centers", Column("code", String(100), unique=True), Column("name", String(255)))
+_table("tax_ledger", Column("tax_type", String(100)), Column("reference", String(100)), Column("date", Date), Column("amount", Numeric(14,2)))
+_table("cash_flow", Column("date", Date), Column("category", String(100)), Column("description", String(255)), Column("amount", Numeric(14,2)))
+_table("reconciliation", Column("account_code", String(100)), Column("period", String(20)), Column("status", String(50)), Column("notes", Text))
+
+# Forecasts and calendar
+_table("forecasts", Column("period", String(20)), Column("metric", String(100)), Column("value", Numeric(14,2)), Column("notes", Text))
+_table("calendar_events", Column("title", String(255)), Column("start", DateTime), Column("end", DateTime),
+       Column("type", String(50)), Column("description", Text))
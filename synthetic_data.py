@@ -0,0 +1,198 @@
+import argparse, datetime, random, time
+from sqlalchemy import insert, select, func, text
+from database import engine, SessionLocal
+import models, crud, periods, migrate
+
+# Deterministic synthetic data for load tests. Volumes grow linearly with --scale
+# (1.0 is ~300k journal lines, 60k order lines and 20k AR/AP rows; 10 gives millions)
+# and rows go in with batched core INSERTs, ids assigned here so children can point
+# at parents without a round trip. Same --seed and --scale, same data.
+# Months older than --open-months are closed through crud.close_period, so the frozen
+# period paths get exercised too.
+#   python synthetic_data.py --scale 1 --seed 42
+
+BATCH = 10000
+YEARS = 3
+ACCOUNTS = [("1000", "Cash", "Asset"), ("1100", "Accounts Receivable", "Asset"), ("1200", "Inventory", "Asset"),
+            ("1500", "Equipment", "Asset"), ("1590", "Accumulated Depreciation", "Asset"),
+            ("2000", "Accounts Payable", "Liability"), ("2100", "VAT Payable", "Liability"), ("3000", "Equity", "Equity"),
+            ("4000", "Sales Revenue", "Revenue"), ("4100", "Service Revenue", "Revenue"), ("5000", "COGS", "Expense"),
+            ("6000", "Salaries", "Expense"), ("6100", "Depreciation", "Expense"), ("6200", "Rent", "Expense"),
+            ("6300", "Utilities", "Expense")]
+COST_CENTERS = ["CC100", "CC200", "CC300", "CC400", "CC500"]
+CURRENCIES = {"EUR": 0.92, "GBP": 0.79, "JPY": 149.0}
+STATUSES = ["Open", "Open", "Open", "Paid", "Closed"]
+
+def volumes(scale):
+    n = lambda base: max(1, int(base * scale))
+    return {"vendors": n(200), "customers": n(1000), "products": n(500), "warehouses": 5, "orders": n(10000),
+            "journals": n(100000), "invoices": n(20000), "cash_flow": n(20000), "tax": n(10000), "assets": n(100),
+            "contracts": n(200), "requisitions": n(2000), "events": n(500)}
+
+class Loader:
+    def __init__(self, conn):
+        self.conn = conn
+        self.counts = {}
+        self.next_ids = {}
+
+    def ids(self, model, n):
+        # continue after existing rows so the generator can be run on a non-empty database
+        t = model.__table__
+        start = self.next_ids.get(t.name)
+        if start is None:
+            start = (self.conn.execute(select(func.max(t.c.id))).scalar() or 0) + 1
+        self.next_ids[t.name] = start + n
+        return range(start, start + n)
+
+    def insert(self, model, rows):
+        buf = []
+        for row in rows:
+            buf.append(row)
+            if len(buf) >= BATCH:
+                self.flush(model, buf); buf = []
+        if buf:
+            self.flush(model, buf)
+
+    def flush(self, model, rows):
+        self.conn.execute(insert(model.__table__), rows)
+        self.counts[model.__tablename__] = self.counts.get(model.__tablename__, 0) + len(rows)
+
+    def fix_sequences(self):
+        # explicit ids leave postgres serial sequences behind
+        if self.conn.dialect.name != "postgresql":
+            return
+        for name in self.counts:
+            self.conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), (SELECT max(id) FROM {name}))"))
+
+def generate(scale=1.0, seed=42, today=None, open_months=12):
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    first = today - datetime.timedelta(days=365 * YEARS)
+    day = lambda: first + datetime.timedelta(days=rng.randrange((today - first).days + 1))
+    money = lambda lo, hi: round(rng.uniform(lo, hi), 2)
+    v = volumes(scale)
+    migrate.upgrade()
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        load = Loader(conn)
+        tag = f"s{seed}"
+
+        existing = set(conn.execute(select(models.GLAccount.code)).scalars())
+        load.insert(models.GLAccount, [{"code": c, "name": n, "type": t} for c, n, t in ACCOUNTS if c not in existing])
+        existing = set(conn.execute(select(models.CostCenter.code)).scalars())
+        load.insert(models.CostCenter, [{"code": c, "name": f"Cost center {c}"} for c in COST_CENTERS if c not in existing])
+
+        vendors = load.ids(models.Vendor, v["vendors"])
+        load.insert(models.Vendor, ({"id": i, "name": f"Vendor {tag}-{i}", "email": f"ap{i}@vendor.example", "phone": f"+1555{i:07d}", "address": f"{i} Supply Rd"} for i in vendors))
+        customers = load.ids(models.Customer, v["customers"])
+        load.insert(models.Customer, ({"id": i, "name": f"Customer {tag}-{i}", "email": f"ar{i}@customer.example", "phone": f"+1666{i:07d}", "address": f"{i} Market St"} for i in customers))
+        products = load.ids(models.Product, v["products"])
+        costs = {}
+        rows = []
+        for i in products:
+            cost = money(2, 400)
+            costs[i] = cost
+            rows.append({"id": i, "sku": f"SKU-{tag}-{i:06d}", "name": f"Product {i}", "description": "Synthetic", "price": round(cost * rng.uniform(1.1, 1.9), 2), "cost": cost, "uom": "EA"})
+        load.insert(models.Product, rows)
+        warehouses = load.ids(models.Warehouse, v["warehouses"])
+        load.insert(models.Warehouse, ({"id": i, "name": f"WH {i}", "location": f"City {i}"} for i in warehouses))
+        load.insert(models.Inventory, ({"product_id": p, "warehouse_id": w, "quantity": rng.randint(0, 500)} for p in products for w in warehouses))
+
+        # orders with 1-5 lines; header totals are the sum of their lines
+        for header, line, party, fk, price_col in ((models.SalesOrder, models.SalesOrderLine, customers, "customer_id", "unit_price"),
+                                                   (models.PurchaseOrder, models.PurchaseOrderLine, vendors, "vendor_id", "unit_cost")):
+            order_ids = load.ids(header, v["orders"])
+            headers, lines = [], []
+            for o in order_ids:
+                total = 0
+                for _ in range(rng.randint(1, 5)):
+                    p = rng.choice(products)
+                    qty = rng.randint(1, 20)
+                    price = round(costs[p] * (rng.uniform(1.1, 1.9) if header is models.SalesOrder else 1), 2)
+                    total += qty * price
+                    lines.append({"so_id" if header is models.SalesOrder else "po_id": o, "product_id": p, "quantity": qty, price_col: price})
+                headers.append({"id": o, fk: rng.choice(party), "order_date": day(), "status": rng.choice(STATUSES), "total_amount": round(total, 2)})
+            load.insert(header, headers)
+            load.insert(line, lines)
+
+        # balanced journals: one credit line against two debits, one to an expense/asset
+        revenue = [c for c, _, t in ACCOUNTS if t == "Revenue"]
+        debit_accounts = [c for c, _, t in ACCOUNTS if t in ("Expense", "Asset")]
+        journal_ids = load.ids(models.JournalEntry, v["journals"])
+        dates = {j: day() for j in journal_ids}
+        load.insert(models.JournalEntry, ({"id": j, "date": dates[j], "description": f"Journal {j}", "posted": rng.random() < 0.95} for j in journal_ids))
+
+        def journal_lines():
+            for j in journal_ids:
+                amount = money(10, 20000)
+                split = round(amount * rng.uniform(0.2, 0.8), 2)
+                cc = rng.choice(COST_CENTERS)
+                d = dates[j]
+                yield {"journal_id": j, "account_code": rng.choice(revenue), "description": "Revenue", "debit": 0, "credit": amount, "cost_center": cc, "date": d}
+                yield {"journal_id": j, "account_code": rng.choice(debit_accounts), "description": "Cost", "debit": split, "credit": 0, "cost_center": cc, "date": d}
+                yield {"journal_id": j, "account_code": "1000", "description": "Cash", "debit": round(amount - split, 2), "credit": 0, "cost_center": None, "date": d}
+        load.insert(models.JournalEntryLine, journal_lines())
+
+        def invoices(party, prefix, fk):
+            for n in range(v["invoices"]):
+                d = day()
+                yield {fk: rng.choice(party), "invoice_number": f"{prefix}-{tag}-{n:07d}", "invoice_date": d,
+                       "due_date": d + datetime.timedelta(days=rng.choice((15, 30, 45, 60))), "amount": money(50, 50000),
+                       "status": "Paid" if d < today - datetime.timedelta(days=120) and rng.random() < 0.9 else rng.choice(STATUSES)}
+        load.insert(models.AccountsReceivable, invoices(customers, "INV", "customer_id"))
+        load.insert(models.AccountsPayable, invoices(vendors, "BILL", "vendor_id"))
+
+        categories = ["Operating"] * 6 + ["Investing", "Financing"]
+        load.insert(models.CashFlow, ({"date": day(), "category": rng.choice(categories), "description": f"CF-{tag}-{n}",
+                                       "amount": money(-25000, 30000)} for n in range(v["cash_flow"])))
+        load.insert(models.TaxLedger, ({"tax_type": rng.choice(("VAT", "WHT", "Sales Tax")), "reference": f"TX-{tag}-{n}", "date": day(),
+                                        "amount": money(5, 5000)} for n in range(v["tax"])))
+        load.insert(models.FixedAsset, ({"name": f"Asset {n}", "purchase_date": day(), "purchase_value": money(1000, 250000),
+                                         "useful_life_years": rng.choice((3, 5, 7, 10))} for n in range(v["assets"])))
+        load.insert(models.Budget, ({"cost_center": cc, "year": y, "amount": money(100000, 2000000)}
+                                    for cc in COST_CENTERS for y in range(first.year, today.year + 1)))
+        load.insert(models.FXRate, ({"currency": cur, "rate": round(base * rng.uniform(0.95, 1.05), 6), "date": first + datetime.timedelta(days=d)}
+                                    for cur, base in CURRENCIES.items() for d in range((today - first).days + 1)))
+
+        def contracts():
+            for n in range(v["contracts"]):
+                start = day()
+                yield {"vendor_id": rng.choice(vendors), "start_date": start, "end_date": start + datetime.timedelta(days=rng.choice((180, 365, 730))), "terms": "Net 30"}
+        load.insert(models.SupplierContract, contracts())
+        load.insert(models.PurchaseRequisition, ({"product_id": rng.choice(products), "quantity": rng.randint(1, 100),
+                                                  "status": rng.choice(("Open", "Approved", "Ordered")), "needed_by": day()} for n in range(v["requisitions"])))
+
+        def events():
+            for n in range(v["events"]):
+                start = datetime.datetime.combine(day(), datetime.time(rng.randint(8, 17)))
+                yield {"title": f"Event {n}", "start": start, "end": start + datetime.timedelta(hours=1), "type": rng.choice(("reminder", "meeting")), "description": None}
+        load.insert(models.CalendarEvent, events())
+        load.fix_sequences()
+    closed = close_months(first, today, open_months)
+    return {"scale": scale, "seed": seed, "seconds": round(time.perf_counter() - started, 2), "rows": load.counts, "closed_periods": closed}
+
+def close_months(first, today, open_months):
+    # close every generated month before the last open_months
+    db = SessionLocal()
+    try:
+        month = first.replace(day=1)
+        cutoff = crud._shift_month(today.strftime("%Y-%m"), -open_months)
+        closed = []
+        while month.strftime("%Y-%m") < cutoff:
+            period = month.strftime("%Y-%m")
+            if not periods.is_closed(db, period):
+                crud.close_period(db, period, "synthetic data")
+                closed.append(period)
+            month = (month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        return closed
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load deterministic synthetic data")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--today", type=datetime.date.fromisoformat, default=None, help="anchor date (default: today)")
+    parser.add_argument("--open-months", type=int, default=12, help="months left open; older ones are closed")
+    args = parser.parse_args()
+    print(generate(args.scale, args.seed, args.today, args.open_months))
@@ -0,0 +1,37 @@
+import os, sys, tempfile
+
+# every test run gets its own SQLite file; set before anything imports database
+_dir = tempfile.mkdtemp(prefix="balancebuilt-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_dir, 'test.db')}"
+os.environ["PROFILE_ADMIN_TOKEN"] = "test-token"
+os.environ["ARCHIVE_DIR"] = os.path.join(_dir, "archive")
+os.environ["PROFILE_DIR"] = os.path.join(_dir, "profiles")
+os.environ["ANALYTICS_URL"] = f"duckdb:///{os.path.join(_dir, 'analytics.duckdb')}"
+os.environ["ANALYTICS_SYNC_INTERVAL"] = "1"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import migrate
+migrate.upgrade()
+from database import SessionLocal, Base, engine
+import fx, periods
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+        fx.index.invalidate()
+        periods.invalidate()
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+    import app
+    with TestClient(app.app) as c:
+        yield c
@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+import admission, crud
+
+SLOW = text("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 50000000) SELECT count(*) FROM c")
+
+def test_statement_timeout_interrupts_sqlite(db):
+    release = admission.guard_session(db, {}, timeout_ms=50)
+    try:
+        with pytest.raises(OperationalError) as e:
+            db.execute(SLOW)
+        assert admission.is_timeout(e.value)
+    finally:
+        release()
+    db.rollback()
+    assert db.execute(text("SELECT 1")).scalar() == 1
+
+def test_report_timeout_is_a_504(client, monkeypatch):
+    monkeypatch.setattr(admission, "STATEMENT_TIMEOUT_MS", 50)
+    monkeypatch.setattr(crud, "report_pnl", lambda db, *args: db.execute(SLOW).scalar())
+    r = client.get("/reports/pnl")
+    assert r.status_code == 504
+
+def test_limiter_queues_then_rejects():
+    async def scenario():
+        limiter = admission.Limiter("t", 1, 1, 0.05)
+        await limiter.acquire()
+        queued = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(admission.Rejected) as full:
+            await limiter.acquire()
+        assert full.value.status == 429 and full.value.retry_after >= 1
+        with pytest.raises(admission.Rejected) as waited:
+            await queued
+        assert waited.value.status == 503
+        # a waiter that is still queued gets the slot handed over on release
+        queued = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release(0.5)
+        await queued
+        assert limiter.active == 1 and not limiter.waiters
+        limiter.release(0.5)
+        assert limiter.active == 0 and limiter.rejected == {429: 1, 503: 1}
+    asyncio.run(scenario())
@@ -0,0 +1,68 @@
+import datetime, os
+import pytest
+import models
+
+analytics = pytest.importorskip("analytics")
+pytest.importorskip("duckdb_engine")
+
+def balances(client, engine):
+    r = client.get(f"/reports/trial_balance?engine={engine}")
+    assert r.status_code == 200, r.text
+    return {row["account_code"]: (row["debit"], row["credit"]) for row in r.json()}
+
+def test_columnar_follows_inserts_updates_and_deletes(client, db):
+    # rows removed behind the change feed's back by the previous tests' cleanup
+    analytics._changed(None)
+    je = models.JournalEntry(date=datetime.date(2025, 4, 1))
+    db.add(je); db.flush()
+    lines = [models.JournalEntryLine(journal_id=je.id, account_code="1000", debit=50), models.JournalEntryLine(journal_id=je.id, account_code="4000", credit=50)]
+    db.add_all(lines); db.commit()
+    assert balances(client, "columnar") == balances(client, "primary") == {"1000": (50.0, 0.0), "4000": (0.0, 50.0)}
+    lines[0].debit = 70
+    db.commit()
+    assert balances(client, "columnar")["1000"] == (70.0, 0.0)
+    db.delete(lines[1]); db.commit()
+    assert balances(client, "columnar") == balances(client, "primary") == {"1000": (70.0, 0.0)}
+
+def test_pending_updates_are_not_served_stale(client, db, monkeypatch):
+    analytics._changed(None)
+    je = models.JournalEntry(date=datetime.date(2025, 4, 1))
+    db.add(je); db.flush()
+    line = models.JournalEntryLine(journal_id=je.id, account_code="1000", debit=5)
+    db.add(line); db.commit()
+    assert balances(client, "columnar") == {"1000": (5.0, 0.0)}
+    monkeypatch.setattr(analytics, "MAX_WAIT", 0.2)
+    with analytics._sync_lock:
+        line.debit = 6
+        db.commit()
+        r = client.get("/reports/trial_balance?engine=columnar")
+        assert r.status_code == 503 and "Retry-After" in r.headers
+    monkeypatch.setattr(analytics, "MAX_WAIT", 5.0)
+    assert balances(client, "columnar") == {"1000": (6.0, 0.0)}
+
+def test_columnar_responses_say_so(client, db):
+    analytics._changed(None)
+    r = client.get("/reports/trial_balance?engine=columnar")
+    assert r.status_code == 200 and r.headers["X-Data-Source"] == "columnar"
+
+def test_order_headers_reload_rewritten_rows(client, db, monkeypatch):
+    analytics._changed(None)
+    orders = [models.SalesOrder(order_date=datetime.date(2025, 4, 1)) for _ in range(3)]
+    db.add_all(orders); db.flush()
+    lines = [models.SalesOrderLine(so_id=o.id, quantity=1, unit_price=10) for o in orders]
+    db.add_all(lines); db.commit()
+    net = lambda engine: client.get(f"/reports/net_sales?period=2025-04&engine={engine}").json()["net_sales"]
+    assert net("columnar") == net("primary") == 30.0
+    # a line change rewrites one header by id, not the whole table
+    full = []
+    monkeypatch.setattr(analytics, "_reload", lambda *a, _reload=analytics._reload: full.append(a[2].name) or _reload(*a))
+    lines[1].quantity = 5
+    db.commit()
+    assert net("columnar") == net("primary") == 70.0
+    assert "sales_orders" in full and "sales_orders" not in analytics._rewritten
+    db.delete(orders[0]); db.delete(lines[0]); db.commit()
+    assert net("columnar") == net("primary") == 60.0
+
+def test_mirror_file_is_per_process(monkeypatch):
+    monkeypatch.setattr(analytics, "ANALYTICS_URL", "duckdb:///./analytics.{pid}.duckdb")
+    assert analytics.mirror_url() == f"duckdb:///./analytics.{os.getpid()}.duckdb"
@@ -0,0 +1,56 @@
+import datetime
+import pytest
+import archive, crud, models
+
+pytest.importorskip("pyarrow")
+
+def post(db, d, *lines):
+    je = models.JournalEntry(date=d, description="t")
+    db.add(je); db.flush()
+    db.add_all([models.JournalEntryLine(journal_id=je.id, account_code=code, cost_center=cc, debit=dr, credit=cr) for code, cc, dr, cr in lines])
+    db.commit()
+    return je
+
+def reports(db):
+    return {
+        "trial_balance": crud.report_trial_balance(db),
+        "trial_balance_month": crud.report_trial_balance(db, "2023-06"),
+        "pnl": crud.report_pnl(db),
+        "pnl_month": crud.report_pnl(db, "2023-06"),
+        "pnl_eur": crud.report_pnl(db, None, "EUR"),
+        "budget_vs_actual": crud.report_budget_vs_actual(db, 2023),
+    }
+
+def test_archiving_leaves_every_report_unchanged(db):
+    db.add_all([models.GLAccount(code="1000", name="Cash", type="Asset"), models.GLAccount(code="4000", name="Sales", type="Revenue"),
+                models.GLAccount(code="6000", name="Rent", type="Expense"), models.Budget(cost_center="OPS", year=2023, amount=1200),
+                models.FXRate(currency="EUR", date=datetime.date(2023, 1, 1), rate=0.9), models.FXRate(currency="EUR", date=datetime.date(2023, 6, 15), rate=0.8)])
+    post(db, datetime.date(2023, 6, 3), ("1000", None, 500, 0), ("4000", None, 0, 500))
+    post(db, datetime.date(2023, 6, 20), ("6000", "OPS", 200, 0), ("1000", None, 0, 200))
+    post(db, datetime.date(2023, 7, 1), ("6000", "OPS", 50, 0), ("1000", None, 0, 50))
+    crud.close_period(db, "2023-06")
+    before = reports(db)
+    out = archive.archive_period("2023-06")
+    assert out["journal_entries"] == 2 and out["journal_lines"] == 4
+    assert db.query(models.JournalEntryLine).count() == 2
+    assert reports(db) == before
+    assert before["pnl"] == {"revenue": -500.0, "expense": 250.0, "net_income": -750.0}
+    assert [r["actual"] for r in before["budget_vs_actual"]["cost_centers"]] == [250.0]
+    with pytest.raises(archive.ArchiveError):
+        archive.archive_period("2023-06")
+    with pytest.raises(archive.ArchiveError):
+        archive.archive_period("2023-07")  # not closed
+
+def test_moving_a_journal_restamps_its_lines(db):
+    je = post(db, datetime.date(2025, 3, 1), ("1000", None, 10, 0), ("4000", None, 0, 10))
+    other = post(db, datetime.date(2025, 4, 1))
+    lines = db.query(models.JournalEntryLine).filter_by(journal_id=je.id).all()
+    assert {l.date for l in lines} == {datetime.date(2025, 3, 1)}
+    # loaded lines see the new date without a refresh
+    je.date = datetime.date(2025, 3, 15); db.commit()
+    assert all(l.date == datetime.date(2025, 3, 15) for l in lines)
+    # a line moved to another journal takes that journal's date
+    lines[0].journal_id = other.id; db.commit()
+    assert lines[0].date == datetime.date(2025, 4, 1)
+    tb = {r["account_code"]: r for r in crud.report_trial_balance(db, "2025-03")}
+    assert set(tb) == {"4000"}
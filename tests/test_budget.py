@@ -0,0 +1,41 @@
+import datetime
+import crud, models
+
+def post(db, d, code, cost_center, debit=0, credit=0):
+    je = models.JournalEntry(date=d)
+    db.add(je); db.flush()
+    db.add(models.JournalEntryLine(journal_id=je.id, account_code=code, cost_center=cost_center, debit=debit, credit=credit))
+
+def seed(db):
+    db.add_all([models.GLAccount(code="6000", name="Rent", type="Expense"), models.GLAccount(code="4000", name="Sales", type="Revenue")])
+    db.add_all([models.Budget(cost_center="OPS", year=2024, amount=1000), models.Budget(cost_center="OPS", year=2024, amount=200),
+                models.Budget(cost_center="HR", year=2024, amount=500), models.Budget(cost_center="OPS", year=2023, amount=9999)])
+    post(db, datetime.date(2024, 1, 10), "6000", "OPS", debit=300)
+    post(db, datetime.date(2024, 1, 20), "6000", "OPS", debit=100, credit=40)
+    post(db, datetime.date(2024, 3, 5), "6000", "OPS", debit=240)
+    post(db, datetime.date(2024, 2, 1), "6000", "IT", debit=50)
+    post(db, datetime.date(2024, 2, 1), "4000", "OPS", credit=5000)  # revenue is not spend
+    post(db, datetime.date(2025, 1, 1), "6000", "OPS", debit=777)  # other year
+    post(db, datetime.date(2024, 2, 1), "6000", None, debit=60)  # no cost center
+    db.commit()
+
+def test_variance_burn_rate_and_monthly_pivot(db):
+    seed(db)
+    out = crud.report_budget_vs_actual(db, 2024)
+    rows = {r["cost_center"]: r for r in out["cost_centers"]}
+    assert list(rows) == ["HR", "IT", "OPS"]
+    ops = rows["OPS"]
+    assert ops["budget"] == 1200.0 and ops["actual"] == 600.0 and ops["variance"] == 600.0 and ops["burn_rate"] == 0.5
+    assert ops["monthly"] == [360.0, 0.0, 240.0] + [0.0] * 9
+    # a past year has all twelve months elapsed
+    assert out["months_elapsed"] == 12 and ops["projected"] == 600.0
+    assert rows["HR"]["actual"] == 0.0 and rows["HR"]["burn_rate"] == 0.0
+    assert rows["IT"]["budget"] == 0.0 and rows["IT"]["burn_rate"] is None and rows["IT"]["variance"] == -50.0
+    assert out["budget"] == 1700.0 and out["actual"] == 650.0 and out["variance"] == 1050.0
+
+def test_single_cost_center_and_future_year(client, db):
+    seed(db)
+    out = client.get("/reports/budget_vs_actual?year=2024&cost_center=IT").json()
+    assert [r["cost_center"] for r in out["cost_centers"]] == ["IT"] and out["actual"] == 50.0
+    future = crud.report_budget_vs_actual(db, datetime.date.today().year + 1)
+    assert future["months_elapsed"] == 0 and future["cost_centers"] == []
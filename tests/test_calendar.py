@@ -0,0 +1,39 @@
+import datetime
+import crud, models
+
+def at(day, hour=0):
+    return datetime.datetime(2025, 5, day, hour)
+
+def seed(db):
+    db.add_all([
+        models.CalendarEvent(title="undated"),
+        models.CalendarEvent(title="long", start=at(1), end=at(20)),
+        models.CalendarEvent(title="instant", start=at(10, 9)),
+        models.CalendarEvent(title="later", start=at(25), end=at(26)),
+        models.AccountsReceivable(invoice_number="INV-1", amount=10, due_date=datetime.date(2025, 5, 10)),
+        models.AccountsReceivable(invoice_number="INV-2", amount=10, due_date=datetime.date(2025, 5, 30), status="Paid"),
+        models.AccountsPayable(invoice_number="BILL-1", amount=5, due_date=datetime.date(2025, 5, 12)),
+    ])
+    db.commit()
+
+def titles(events):
+    return [e["title"] for e in events]
+
+def test_range_overlap_and_generated_due_events(db):
+    seed(db)
+    out = crud.list_calendar_events(db, "2025-05-10", "2025-05-15")
+    assert titles(out) == ["long", "AR INV-1 due (10.00)", "instant", "AP BILL-1 due (5.00)"]
+    assert titles(crud.list_calendar_events(db, "2025-05-10", "2025-05-15", include_generated=False)) == ["long", "instant"]
+
+def test_pages_follow_the_merged_order(db):
+    seed(db)
+    everything = crud.list_calendar_events(db, limit=100)
+    # undated events sort first on every backend
+    assert everything[0]["title"] == "undated"
+    paged = [e for skip in range(0, len(everything), 2) for e in crud.list_calendar_events(db, skip=skip, limit=2)]
+    assert titles(paged) == titles(everything)
+
+def test_bad_range_parameters(client):
+    assert client.get("/calendar_events/range?start=tomorrow").status_code == 400
+    assert client.get(f"/calendar_events/range?skip={crud.MAX_CALENDAR_SKIP + 1}").status_code == 400
+    assert client.get("/calendar_events/range?limit=100000").status_code == 400
@@ -0,0 +1,57 @@
+import datetime
+import crud, models
+
+def test_category_pivot_net_and_cumulative(db):
+    d = datetime.date
+    db.add_all([
+        models.CashFlow(date=d(2024, 1, 5), category="Operating", amount=1000),
+        models.CashFlow(date=d(2024, 1, 20), category=" operating ", amount=-300),
+        models.CashFlow(date=d(2024, 1, 25), category="Investing", amount=-500),
+        models.CashFlow(date=d(2024, 2, 3), category="Financing", amount=2000),
+        models.CashFlow(date=d(2024, 2, 9), category="Misc", amount=-50),
+        models.CashFlow(date=d(2024, 2, 10), category=None, amount=-25),
+        models.CashFlow(date=None, category="Operating", amount=99999),  # undated rows are ignored
+    ])
+    db.commit()
+    out = crud.report_cash_flow(db)
+    jan, feb = out["periods"]
+    assert jan == {"period": "2024-01", "operating": 700.0, "investing": -500.0, "financing": 0.0, "other": 0.0, "net": 200.0, "cumulative": 200.0}
+    assert feb == {"period": "2024-02", "operating": 0.0, "investing": 0.0, "financing": 2000.0, "other": -75.0, "net": 1925.0, "cumulative": 2125.0}
+    q = crud.report_cash_flow(db, start=d(2024, 2, 1), granularity="quarter")["periods"]
+    assert q == [{"period": "2024Q1", "operating": 0.0, "investing": 0.0, "financing": 2000.0, "other": -75.0, "net": 1925.0, "cumulative": 1925.0}]
+
+def test_cash_flow_validation_and_empty(client, db):
+    assert crud.report_cash_flow(db) == {"granularity": "month", "periods": []}
+    assert client.get("/reports/cash_flow?granularity=fortnight").status_code == 400
+    assert client.get("/reports/cash_flow/projection?weeks=0").status_code == 400
+
+def test_projection_weekly_buckets(db):
+    today = datetime.date.today()
+    week0 = today - datetime.timedelta(days=today.weekday())
+    w = lambda n, days=0: week0 + datetime.timedelta(weeks=n, days=days)
+    db.add_all([
+        models.CashFlow(date=w(-30), category="Operating", amount=400),  # before history: opening only
+        models.CashFlow(date=w(-2, 1), category="Operating", amount=260),
+        models.CashFlow(date=w(-1, 3), category="Operating", amount=-130),
+        models.AccountsReceivable(due_date=w(-5), amount=100, status="Open"),  # overdue
+        models.AccountsReceivable(due_date=w(0, 4), amount=50, status=None),
+        models.AccountsReceivable(due_date=w(2, 6), amount=70, status="open"),
+        models.AccountsReceivable(due_date=w(1), amount=999, status="Paid"),
+        models.AccountsReceivable(due_date=w(4), amount=999, status="open"),  # beyond the horizon
+        models.AccountsPayable(due_date=w(-1), amount=40, status="Open"),  # overdue
+        models.AccountsPayable(due_date=w(3), amount=30, status="Open"),
+        models.AccountsPayable(due_date=w(3, 2), amount=5, status="VOID"),
+    ])
+    db.commit()
+    out = crud.report_cash_flow_projection(db, weeks=4, history_weeks=13)
+    assert out["opening_balance"] == 530.0
+    assert out["baseline_weekly"] == 10.0
+    weeks = out["weeks"]
+    assert [x["week_start"] for x in weeks] == [w(i) for i in range(4)]
+    assert [x["receipts"] for x in weeks] == [150.0, 0.0, 70.0, 0.0]
+    assert [x["payments"] for x in weeks] == [40.0, 0.0, 0.0, 30.0]
+    assert [x["net"] for x in weeks] == [120.0, 10.0, 80.0, -20.0]
+    assert [x["balance"] for x in weeks] == [650.0, 660.0, 740.0, 720.0]
+    hist = out["history"]
+    assert len(hist) == 13 and hist[-1]["week_start"] == w(-1) and hist[-1]["net"] == -130.0 and hist[-2]["net"] == 260.0
+    assert hist[-1]["rolling_13w"] == 130.0
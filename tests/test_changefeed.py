@@ -0,0 +1,89 @@
+import asyncio, datetime
+import pytest
+import archive, changefeed, crud, models
+
+@pytest.fixture
+def events():
+    seen = []
+    hook = lambda ev: seen.append(ev)
+    changefeed.bus.hooks.append(hook)
+    yield seen
+    changefeed.bus.hooks.remove(hook)
+
+def tables(events):
+    return set().union(*(ev["tables"] for ev in events if ev))
+
+def rewritten(events):
+    return set().union(*(ev["rewritten"] for ev in events if ev))
+
+def test_commits_publish_once_and_rollbacks_not_at_all(db, events):
+    db.add(models.Vendor(name="A")); db.flush()
+    db.add(models.Customer(name="B")); db.commit()
+    assert len(events) == 1 and events[0]["tables"] == ["customers", "vendors"] and events[0]["rewritten"] == []
+    db.add(models.Vendor(name="C")); db.flush(); db.rollback()
+    assert len(events) == 1
+
+def test_order_total_recompute_is_published(db, events):
+    so = models.SalesOrder(order_date=datetime.date(2025, 1, 1))
+    db.add(so); db.commit()
+    events.clear()
+    db.add(models.SalesOrderLine(so_id=so.id, quantity=2, unit_price=5)); db.commit()
+    assert {"sales_order_lines", "sales_orders"} <= tables(events)
+    assert "sales_orders" in rewritten(events)
+    assert "net_sales" in events[0]["reports"]
+
+def test_journal_date_move_is_published_as_a_line_rewrite(db, events):
+    je = models.JournalEntry(date=datetime.date(2025, 1, 1))
+    db.add(je); db.flush()
+    db.add(models.JournalEntryLine(journal_id=je.id, account_code="1000", debit=1)); db.commit()
+    events.clear()
+    je.date = datetime.date(2025, 2, 1); db.commit()
+    assert "journal_entry_lines" in tables(events) and "journal_entry_lines" in rewritten(events)
+
+def test_archiving_is_published(db, events):
+    pytest.importorskip("pyarrow")
+    je = models.JournalEntry(date=datetime.date(2024, 1, 5))
+    db.add(je); db.flush()
+    db.add(models.JournalEntryLine(journal_id=je.id, account_code="1000", debit=1)); db.commit()
+    crud.close_period(db, "2024-01")
+    events.clear()
+    archive.archive_period("2024-01")
+    assert tables(events) == archive.CHANGED and rewritten(events) == changefeed.JOURNALS
+
+def test_subscriptions_filter_and_replay():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        first = changefeed.bus.publish({"vendors"})
+        sub, missed = changefeed.bus.subscribe(loop, tables={"customers"}, last_event_id=first["id"])
+        try:
+            assert missed == []
+            changefeed.bus.publish({"vendors"})
+            ev = changefeed.bus.publish({"customers", "vendors"})
+            got = await asyncio.wait_for(sub.queue.get(), 1)
+            assert got["id"] == ev["id"] and got["tables"] == ["customers"]
+            late, replay = changefeed.bus.subscribe(loop, last_event_id=first["id"])
+            changefeed.bus.unsubscribe(late)
+            assert [e["seq"] for e in replay] == [first["seq"] + 1, ev["seq"]]
+            other, unknown = changefeed.bus.subscribe(loop, last_event_id="elsewhere-1")
+            changefeed.bus.unsubscribe(other)
+            assert unknown is None
+        finally:
+            changefeed.bus.unsubscribe(sub)
+    asyncio.run(scenario())
+
+def test_stream_rejects_unknown_names(client):
+    assert client.get("/events/stream?tables=nope").status_code == 400
+    assert client.get("/events/stream?reports=nope").status_code == 400
+
+def test_rewritten_row_ids_are_published_when_known(db, events, monkeypatch):
+    vendors = [models.Vendor(name=n) for n in "ABC"]
+    db.add_all(vendors); db.commit()
+    events.clear()
+    vendors[0].name = "A2"; db.delete(vendors[1]); db.commit()
+    assert events[-1]["rows"] == {"vendors": sorted([vendors[0].id, vendors[1].id])}
+    # a statement-level update names no rows, so the whole table counts as rewritten
+    db.execute(models.Vendor.__table__.update().values(email="x@example.com")); db.commit()
+    assert events[-1]["rewritten"] == ["vendors"] and events[-1]["rows"] == {}
+    monkeypatch.setattr(changefeed, "ROW_LIMIT", 1)
+    vendors[0].name = "A3"; vendors[2].name = "C3"; db.commit()
+    assert events[-1]["rewritten"] == ["vendors"] and events[-1]["rows"] == {}
@@ -0,0 +1,109 @@
+import threading, time
+import coalesce
+
+class FakeDB:
+    def __init__(self, url="sqlite:///a.db", cancel=None):
+        self.url = url
+        self.info = {"db_cancel": cancel} if cancel else {}
+    def get_bind(self):
+        return self
+
+def gated(gate, calls):
+    @coalesce.single_flight
+    def report_fake(db, period=None):
+        calls.append(period)
+        gate.wait(5)
+        if period == "bad":
+            raise ValueError("boom")
+        return {"period": period}
+    return report_fake
+
+def run_concurrently(fn, argsets):
+    results = [None] * len(argsets)
+    def call(i, args):
+        try:
+            results[i] = fn(*args)
+        except Exception as e:
+            results[i] = e
+    threads = [threading.Thread(target=call, args=(i, a)) for i, a in enumerate(argsets)]
+    for t in threads:
+        t.start()
+    return threads, results
+
+def test_concurrent_identical_calls_run_once():
+    gate, calls = threading.Event(), []
+    fn = gated(gate, calls)
+    threads, results = run_concurrently(fn, [(FakeDB(), "2025-01")] * 5)
+    time.sleep(0.1)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert calls == ["2025-01"]
+    assert all(r is results[0] for r in results) and results[0] == {"period": "2025-01"}
+    assert coalesce.coalesced["report_fake"] >= 4
+    # nothing is cached once the call is done
+    fn(FakeDB(), "2025-01")
+    assert len(calls) == 2
+
+def test_different_arguments_or_databases_are_not_merged():
+    gate, calls = threading.Event(), []
+    fn = gated(gate, calls)
+    threads, _ = run_concurrently(fn, [(FakeDB(), "2025-01"), (FakeDB(), "2025-02"), (FakeDB("duckdb:///m"), "2025-01")])
+    time.sleep(0.1)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert sorted(calls) == ["2025-01", "2025-01", "2025-02"]
+
+def test_errors_reach_every_waiter():
+    gate, calls = threading.Event(), []
+    fn = gated(gate, calls)
+    threads, results = run_concurrently(fn, [(FakeDB(), "bad")] * 3)
+    time.sleep(0.1)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert calls == ["bad"] and all(isinstance(r, ValueError) for r in results)
+    assert coalesce._calls == {}
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(coalesce, "ENABLED", False)
+    gate, calls = threading.Event(), []
+    gate.set()
+    fn = gated(gate, calls)
+    fn(FakeDB(), "x"); fn(FakeDB(), "x")
+    assert calls == ["x", "x"]
+
+def test_disconnect_cancels_only_when_no_caller_is_left():
+    gate, calls, cancelled = threading.Event(), [], []
+    fn = gated(gate, calls)
+    leader, a, b = FakeDB(cancel=lambda: cancelled.append(1)), FakeDB(), FakeDB()
+    threads, results = run_concurrently(fn, [(leader, "2025-01")])
+    time.sleep(0.05)
+    more, more_results = run_concurrently(fn, [(a, "2025-01"), (b, "2025-01")])
+    time.sleep(0.05)
+    # the leader's client goes away: its followers still want the result
+    assert coalesce.abandon(leader) is False and cancelled == []
+    assert coalesce.abandon(a) is False and cancelled == []
+    assert coalesce.abandon(b) is False and cancelled == [1]
+    gate.set()
+    for t in threads + more:
+        t.join()
+    assert calls == ["2025-01"] and more_results[0] == {"period": "2025-01"}
+    # outside a shared call a caller cancels its own query
+    assert coalesce.abandon(leader) is True
+
+def test_follower_keeps_the_result_when_the_leader_disconnects():
+    gate, calls, cancelled = threading.Event(), [], []
+    fn = gated(gate, calls)
+    leader = FakeDB(cancel=lambda: cancelled.append(1))
+    threads, results = run_concurrently(fn, [(leader, "2025-02")])
+    time.sleep(0.05)
+    more, more_results = run_concurrently(fn, [(FakeDB(), "2025-02")])
+    time.sleep(0.05)
+    assert coalesce.abandon(leader) is False
+    gate.set()
+    for t in threads + more:
+        t.join()
+    assert cancelled == [] and more_results == [{"period": "2025-02"}]
+    assert "single_flight" not in leader.info
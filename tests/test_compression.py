@@ -0,0 +1,62 @@
+import asyncio, gzip, zlib
+import pytest
+import compression
+
+@pytest.fixture(autouse=True)
+def gzip_only(monkeypatch):
+    # brotli/zstandard are optional; pin the preference so results do not depend on them
+    monkeypatch.setattr(compression, "PREFERENCE", ["gzip"])
+
+def run(app, accept="gzip", path="/x"):
+    sent = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        sent.append(message)
+    scope = {"type": "http", "method": "GET", "path": path, "headers": [(b"accept-encoding", accept.encode())] if accept is not None else []}
+    asyncio.run(compression.CompressionMiddleware(app, min_size=100)(scope, receive, send))
+    return dict(sent[0]["headers"]), sent[1:]
+
+def respond(ctype, *chunks):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", ctype.encode())]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+def test_negotiation_honours_q_values():
+    assert compression.negotiate("gzip") == "gzip"
+    assert compression.negotiate("deflate, gzip;q=0.5") == "gzip"
+    assert compression.negotiate("gzip;q=0") is None
+    assert compression.negotiate("gzip;q=0, *;q=1") is None
+    assert compression.negotiate("*") == "gzip"
+    assert compression.negotiate("identity, br;q=1") is None
+    assert compression.negotiate("gzip;q=oops") is None
+
+def test_large_json_is_gzipped():
+    body = b'{"rows": [' + b",".join(b'{"n": %d}' % i for i in range(100)) + b"]}"
+    headers, messages = run(respond("application/json", body))
+    assert headers[b"content-encoding"] == b"gzip" and headers[b"vary"] == b"Accept-Encoding"
+    data = b"".join(m["body"] for m in messages)
+    assert headers[b"content-length"] == str(len(data)).encode() and gzip.decompress(data) == body
+    # a client that refuses gzip gets it as is
+    headers, messages = run(respond("application/json", body), accept="gzip;q=0")
+    assert b"content-encoding" not in headers and messages[0]["body"] == body
+
+def test_small_bodies_and_event_streams_pass_through():
+    headers, messages = run(respond("application/json", b'{"ok": true}'))
+    assert b"content-encoding" not in headers and messages[0]["body"] == b'{"ok": true}'
+    events = [b"data: %d\n\n" % i * 20 for i in range(3)]
+    headers, messages = run(respond("text/event-stream", *events))
+    assert b"content-encoding" not in headers and [m["body"] for m in messages] == events
+    headers, _ = run(respond("image/png", b"\x89PNG" * 100))
+    assert b"content-encoding" not in headers
+
+def test_ndjson_stream_is_compressed_chunk_by_chunk():
+    chunks = [b"".join(b'{"id": %d, "name": "row %d"}\n' % (i, i) for i in range(n, n + 10)) for n in (0, 10, 20)]
+    headers, messages = run(respond("application/x-ndjson", *chunks), path="/sales_orders/")
+    assert headers[b"content-encoding"] == b"gzip" and b"content-length" not in headers
+    d = zlib.decompressobj(31)
+    # every chunk is flushed, so a reader decodes each one as soon as it arrives
+    assert [d.decompress(m["body"]) for m in messages[:-1]] == chunks[:-1]
+    assert d.decompress(messages[-1]["body"]) + d.flush() == chunks[-1] and messages[-1].get("more_body", False) is False
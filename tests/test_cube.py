@@ -0,0 +1,37 @@
+import datetime
+import crud, models
+
+def seed(db):
+    db.add_all([models.Customer(id=1, name="C1"), models.Customer(id=2, name="C2")])
+    db.add_all([models.Product(id=1, sku="P1", name="P1"), models.Product(id=2, sku="P2", name="P2")])
+    for customer, d, product, qty, price in [(1, datetime.date(2025, 1, 5), 1, 2, 10), (1, datetime.date(2025, 2, 5), 2, 1, 30),
+                                             (2, datetime.date(2025, 2, 9), 1, 4, 10), (None, datetime.date(2025, 3, 1), 1, 1, 10)]:
+        so = models.SalesOrder(customer_id=customer, order_date=d)
+        db.add(so); db.flush()
+        db.add(models.SalesOrderLine(so_id=so.id, product_id=product, quantity=qty, unit_price=price))
+    db.commit()
+
+def test_grouped_measures(db):
+    seed(db)
+    out = crud.report_cube(db, "sales_lines", ["customer"], ["qty", "revenue", "lines"])
+    assert out["rows"] == [{"customer": 1, "qty": 3.0, "revenue": 50.0, "lines": 2}, {"customer": 2, "qty": 4.0, "revenue": 40.0, "lines": 1},
+                           {"customer": None, "qty": 1.0, "revenue": 10.0, "lines": 1}]
+    ranged = crud.report_cube(db, "sales_lines", ["month"], ["revenue"], start="2025-02", end="2025-02", order_by="-revenue")
+    assert ranged["rows"] == [{"month": "2025-02", "revenue": 70.0}]
+
+def test_rollup_emulation_matches_grouping_sets(db):
+    seed(db)
+    rows = crud.report_cube(db, "sales_lines", ["customer", "product"], ["qty"], rollup=True)["rows"]
+    got = {(r["customer"], r["product"], r["grouping"]): r["qty"] for r in rows}
+    assert got == {(1, 1, 0): 2.0, (1, 2, 0): 1.0, (1, None, 1): 3.0, (2, 1, 0): 4.0, (2, None, 1): 4.0,
+                   (None, 1, 0): 1.0, (None, None, 1): 1.0, (None, None, 3): 8.0}
+    # subtotals follow their detail rows and the grand total comes last
+    assert [r["grouping"] for r in rows] == [0, 0, 1, 0, 1, 0, 1, 3]
+
+def test_truncation_and_bad_parameters(client, db):
+    seed(db)
+    out = crud.report_cube(db, "sales_lines", ["customer"], ["qty"], limit=2)
+    assert len(out["rows"]) == 2 and out["truncated"] is True
+    for q in ("fact=orders&measures=qty", "fact=sales_lines&dims=colour", "fact=sales_lines&measures=cost",
+              "fact=sales_lines&dims=month,month", "fact=sales_lines&limit=0", "fact=sales_lines&dims=month&order_by=revenue"):
+        assert client.get(f"/reports/cube?{q}").status_code == 400, q
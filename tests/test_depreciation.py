@@ -0,0 +1,58 @@
+import datetime
+import numpy as np
+import pytest
+import depreciation, models, crud
+
+def test_straight_line_is_even_and_stops_at_cost():
+    start = depreciation.month_index([datetime.date(2025, 1, 15)])
+    charges = depreciation.schedule([1200.0], start, [12], start[0], 15)[0]
+    assert np.allclose(charges[:12], 100.0)
+    assert np.allclose(charges[12:], 0.0)
+
+def test_schedule_starts_in_the_purchase_month():
+    start = depreciation.month_index([datetime.date(2025, 3, 1)])
+    charges = depreciation.schedule([1200.0], start, [12], start[0] - 2, 4)[0]
+    assert list(charges) == [0.0, 0.0, 100.0, 100.0]
+
+def test_declining_balance_switches_to_straight_line():
+    cost, life, factor = 1000.0, 10, 2.0
+    charges = depreciation.schedule([cost], [0], [life], 0, life, "declining_balance", factor)[0]
+    # reference: declining balance at factor/life until straight line over the
+    # remaining life gives the larger charge, then straight line
+    book, expected, straight = cost, [], None
+    for month in range(life):
+        declining = book * factor / life
+        if straight is None and book / (life - month) >= declining:
+            straight = book / (life - month)
+        charge = straight if straight is not None else declining
+        expected.append(charge)
+        book -= charge
+    assert np.allclose(charges, expected)
+    assert charges.sum() == pytest.approx(cost)
+    assert np.all(np.diff(charges) <= 1e-9)
+
+def test_period_totals_match_the_schedule():
+    start = depreciation.month_index([datetime.date(2024, 5, 1), datetime.date(2025, 2, 1)])
+    args = ([5000.0, 1200.0], start, [36, 12], start[0], 24)
+    assert np.allclose(depreciation.period_totals(*args, "declining_balance", 1.5),
+                       depreciation.schedule(*args, "declining_balance", 1.5).sum(axis=0))
+
+def test_accumulated_rejects_unknown_method():
+    with pytest.raises(ValueError):
+        depreciation.accumulated(np.array([1.0]), np.array([12]), np.array([1]), "sum_of_years")
+
+def test_post_depreciation_posts_balanced_journals_once(db):
+    db.add(models.FixedAsset(name="Van", purchase_value=1200, purchase_date=datetime.date(2025, 1, 1), useful_life_years=1))
+    db.commit()
+    first = crud.post_depreciation(db, "2025-01", 2)
+    assert first["posted"] == ["2025-01", "2025-02"]
+    again = crud.post_depreciation(db, "2025-02", 2)
+    assert again["posted"] == ["2025-03"] and again["skipped"] == ["2025-02"]
+    lines = db.query(models.JournalEntryLine).all()
+    assert sum(float(l.debit) for l in lines) == sum(float(l.credit) for l in lines) == 300.0
+    assert {l.date for l in lines} == {datetime.date(2025, 1, 31), datetime.date(2025, 2, 28), datetime.date(2025, 3, 31)}
+
+def test_depreciation_parameters_are_validated(client):
+    assert client.get("/reports/depreciation?method=sum_of_years").status_code == 400
+    assert client.get("/reports/depreciation?periods=0").status_code == 400
+    assert client.get("/reports/depreciation?factor=0&method=declining_balance").status_code == 400
@@ -0,0 +1,69 @@
+import datetime
+import numpy as np
+import pytest
+import forecasting, models, crud
+
+HISTORY = np.array([[1.0, 2.0, 3.0, 4.0, 5.0, 6.0], [10.0, 10.0, 10.0, 10.0, 10.0, 40.0]])
+
+def test_moving_average():
+    assert np.allclose(forecasting.forecast(HISTORY, 2, "moving_average", window=3), [[5.0, 5.0], [20.0, 20.0]])
+
+def test_exponential_smoothing_matches_the_recursion():
+    alpha = 0.4
+    out = forecasting.forecast(HISTORY, 3, "exponential_smoothing", alpha=alpha)
+    for row, expected in zip(out, HISTORY):
+        level = expected[0]
+        for v in expected[1:]:
+            level = alpha * v + (1 - alpha) * level
+        assert np.allclose(row, level)
+
+def test_seasonal_naive():
+    assert np.allclose(forecasting.forecast(HISTORY, 4, "seasonal_naive", season=3), [[4.0, 5.0, 6.0, 4.0], [10.0, 10.0, 40.0, 10.0]])
+    # shorter than a season: the last value repeats
+    assert np.allclose(forecasting.forecast(HISTORY, 2, "seasonal_naive", season=12), [[6.0, 6.0], [40.0, 40.0]])
+
+def test_empty_history_and_unknown_method():
+    assert forecasting.forecast(np.zeros((2, 0)), 3).shape == (2, 3)
+    with pytest.raises(ValueError):
+        forecasting.forecast(HISTORY, 1, "arima")
+
+def months_ago(n):
+    d = datetime.date.today().replace(day=15)
+    for _ in range(n):
+        d = (d.replace(day=1) - datetime.timedelta(days=1)).replace(day=15)
+    return d
+
+def add_sales(db, product_id, amounts):
+    # amounts[i] is sold i + 1 months ago
+    for i, amount in enumerate(amounts):
+        so = models.SalesOrder(order_date=months_ago(i + 1))
+        db.add(so); db.flush()
+        db.add(models.SalesOrderLine(so_id=so.id, product_id=product_id, quantity=1, unit_price=amount))
+    db.commit()
+
+def test_product_sales_series_sums_every_product(db):
+    db.add_all([models.Product(id=1, sku="A", name="A"), models.Product(id=2, sku="B", name="B")]); db.commit()
+    add_sales(db, 1, [100, 100, 100])
+    add_sales(db, 2, [50, 50, 50])
+    out = crud.generate_forecasts(db, ["product_sales"], horizon=1, history=3)
+    assert out["metrics"] == 2 and out["inserted"] == 2
+    last, current = months_ago(1).strftime("%Y-%m"), datetime.date.today().strftime("%Y-%m")
+    series = {p["period"]: p for p in crud.report_actual_vs_forecast(db, "product_sales", start=last, end=current)["series"]}
+    assert series[last]["actual"] == 150.0
+    assert series[current]["forecast"] == 150.0
+    single = crud.report_actual_vs_forecast(db, "product_sales:1", start=current, end=current)["series"]
+    assert single[0]["forecast"] == 100.0
+    assert crud.report_actual_vs_forecast(db, "product_sales", period=current)["forecast"] == 150.0
+
+def test_regeneration_keeps_manual_forecasts(db):
+    db.add(models.SalesOrder(order_date=months_ago(1), total_amount=300)); db.commit()
+    current = datetime.date.today().strftime("%Y-%m")
+    db.add(models.Forecast(metric="net_sales", period=current, value=999)); db.commit()
+    out = crud.generate_forecasts(db, ["net_sales"], horizon=2, history=1)
+    assert out["inserted"] == 1 and out["skipped"] == 1
+    assert crud.report_actual_vs_forecast(db, "net_sales", period=current)["forecast"] == 999.0
+
+def test_forecast_parameters_are_validated(client):
+    assert client.post("/forecasts/generate?method=arima").status_code == 400
+    assert client.post("/forecasts/generate?alpha=0").status_code == 400
+    assert client.get("/reports/actual_vs_forecast?metric=bogus&start=2025-01").status_code == 400
@@ -0,0 +1,37 @@
+import datetime
+import pytest
+import models, fx, crud
+
+def add_rates(db, *rows):
+    db.add_all([models.FXRate(currency=c, date=d, rate=r) for c, d, r in rows])
+    db.commit()
+
+def test_rate_is_the_latest_on_or_before_the_date(db):
+    add_rates(db, ("EUR", datetime.date(2025, 1, 1), 0.9), ("EUR", datetime.date(2025, 2, 1), 0.8))
+    assert fx.rate(db, "eur", datetime.date(2025, 1, 31)) == 0.9
+    assert fx.rate(db, "EUR", datetime.date(2025, 2, 1)) == 0.8
+    assert fx.rate(db, fx.BASE_CURRENCY) == 1.0
+
+def test_missing_rate_raises(db):
+    add_rates(db, ("EUR", datetime.date(2025, 1, 1), 0.9))
+    with pytest.raises(fx.RateNotFound):
+        fx.rate(db, "EUR", datetime.date(2024, 12, 31))
+    with pytest.raises(fx.RateNotFound):
+        fx.rate(db, "GBP")
+
+def test_committed_rates_refresh_the_index(db):
+    add_rates(db, ("EUR", datetime.date(2025, 1, 1), 0.9))
+    assert fx.rate(db, "EUR", datetime.date(2025, 6, 1)) == 0.9
+    add_rates(db, ("EUR", datetime.date(2025, 3, 1), 0.5))
+    assert fx.rate(db, "EUR", datetime.date(2025, 6, 1)) == 0.5
+
+def test_report_currency_conversion(db):
+    add_rates(db, ("EUR", datetime.date(2025, 1, 1), 0.5))
+    so = models.SalesOrder(order_date=datetime.date(2025, 1, 10))
+    db.add(so); db.flush()
+    db.add(models.SalesOrderLine(so_id=so.id, quantity=1, unit_price=100))
+    db.commit()
+    assert crud.report_net_sales(db, "2025-01", "EUR")["net_sales"] == 50.0
+
+def test_unknown_currency_is_422(client, db):
+    assert client.get("/reports/trial_balance?currency=XYZ").status_code == 422
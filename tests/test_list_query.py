@@ -0,0 +1,43 @@
+import datetime
+import models
+
+def seed(db):
+    db.add_all([
+        models.AccountsReceivable(invoice_number="A1", amount=100, status="Open", due_date=datetime.date(2025, 1, 10)),
+        models.AccountsReceivable(invoice_number="A2", amount=250, status="Open", due_date=datetime.date(2025, 3, 1)),
+        models.AccountsReceivable(invoice_number="A3", amount=75, status="Paid", due_date=None),
+    ])
+    db.commit()
+
+def invoices(client, query):
+    r = client.get(f"/accounts_receivable/?{query}")
+    assert r.status_code == 200, r.text
+    return [row["invoice_number"] for row in r.json()]
+
+def test_filters_order_and_fields(client, db):
+    seed(db)
+    assert invoices(client, "status=Open&order_by=-amount") == ["A2", "A1"]
+    assert invoices(client, "amount__gte=100&amount__lt=250") == ["A1"]
+    assert invoices(client, "status__in=Paid,Void") == ["A3"]
+    assert invoices(client, "status__nin=Paid&due_date__lt=2025-02-01") == ["A1"]
+    assert invoices(client, "due_date__isnull=true") == ["A3"]
+    assert invoices(client, "invoice_number__like=A%25&order_by=amount") == ["A3", "A1", "A2"]
+    assert invoices(client, "order_by=-amount&skip=1&limit=1") == ["A1"]
+    assert client.get("/accounts_receivable/?fields=id,amount&limit=1").json()[0].keys() == {"id", "amount"}
+
+def test_bad_queries_are_400(client):
+    for q in ("colour=red", "amount__approx=1", "amount=lots", "due_date=yesterday", "order_by=colour", "fields=id,colour", "limit=100000", "skip=-1"):
+        assert client.get(f"/accounts_receivable/?{q}").status_code == 400, q
+
+def test_reserved_parameters_are_not_filters(client, db):
+    seed(db)
+    assert invoices(client, "engine=columnar&format=json&status=Paid") == ["A3"]
+    r = client.get("/vendors/?profile=1", headers={"X-Admin-Token": "test-token"})
+    assert r.status_code == 200 and "X-Profile-Artifact" in r.headers
+
+def test_ndjson_stream(client, db):
+    seed(db)
+    r = client.get("/accounts_receivable/?status=Open&fields=invoice_number", headers={"Accept": "application/x-ndjson"})
+    assert r.status_code == 200
+    assert r.text.splitlines() == ['{"invoice_number": "A1"}', '{"invoice_number": "A2"}']
+    assert client.get("/accounts_receivable/?colour=red", headers={"Accept": "application/x-ndjson"}).status_code == 400
@@ -0,0 +1,35 @@
+import models, metrics
+
+def scrape(client):
+    out = {}
+    for line in client.get("/metrics").text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            out[name] = float(value)
+    return out
+
+def test_requests_are_labelled_by_route_template(client, db):
+    v = models.Vendor(name="Acme"); db.add(v); db.commit()
+    before = scrape(client)
+    key = 'method="GET",route="/vendors/{item_id}"'
+    r = client.get(f"/vendors/{v.id}")
+    assert client.get("/no/such/path").status_code == 404
+    after = scrape(client)
+    count = lambda m, lbl: after.get(f"{m}_count{{{lbl}}}", 0) - before.get(f"{m}_count{{{lbl}}}", 0)
+    total = lambda m, lbl: after.get(f"{m}_sum{{{lbl}}}", 0) - before.get(f"{m}_sum{{{lbl}}}", 0)
+    assert count("http_request_duration_seconds", key + ',status="200"') == 1
+    assert count("http_request_duration_seconds", 'method="GET",route="<unmatched>",status="404"') == 1
+    assert not any(f"/vendors/{v.id}" in name for name in after)
+    # one lookup per request, and the body size as sent
+    assert count("http_request_db_queries", key) == 1 and total("http_request_db_queries", key) >= 1
+    assert total("http_response_bytes", key) == len(r.content)
+    assert after.get(f"http_response_rows_total{{{key}}}", 0) - before.get(f"http_response_rows_total{{{key}}}", 0) == 1
+
+def test_slow_queries_are_captured(client, db, monkeypatch):
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 0)
+    metrics.slow_queries.clear()
+    client.get("/vendors/")
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 500)
+    slow = client.get("/metrics/slow_queries").json()
+    assert any(q["route"] == "/vendors/" and "vendors" in q["statement"] for q in slow)
+    assert scrape(client)['db_slow_queries_total{dialect="sqlite"}'] >= 1
@@ -0,0 +1,37 @@
+import os, tempfile
+import pytest
+from sqlalchemy import create_engine, inspect
+from database import Base
+import migrate, schema_baseline
+
+@pytest.fixture
+def bind():
+    path = os.path.join(tempfile.mkdtemp(prefix="balancebuilt-migrate-"), "m.db")
+    e = create_engine(f"sqlite:///{path}")
+    yield e
+    e.dispose()
+
+def assert_matches_models(e):
+    insp = inspect(e)
+    for table in Base.metadata.sorted_tables:
+        assert insp.has_table(table.name), table.name
+        assert {c["name"] for c in insp.get_columns(table.name)} == set(table.c.keys()), table.name
+        have = {i["name"] for i in insp.get_indexes(table.name)}
+        assert {i.name for i in table.indexes} <= have, table.name
+
+def test_fresh_database(bind):
+    assert migrate.upgrade(bind) == [v for v, _, _ in sorted(migrate.MIGRATIONS)]
+    assert_matches_models(bind)
+    assert migrate.upgrade(bind) == []
+
+def test_database_built_by_the_original_create_all(bind):
+    # tables exist but none of the indexes, columns or tables added since
+    schema_baseline.metadata.create_all(bind)
+    assert not inspect(bind).has_table("period_closes")
+    migrate.upgrade(bind)
+    assert_matches_models(bind)
+
+def test_database_built_by_the_current_models(bind):
+    Base.metadata.create_all(bind)
+    migrate.upgrade(bind)
+    assert_matches_models(bind)
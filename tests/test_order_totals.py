@@ -0,0 +1,52 @@
+import datetime
+import crud, models
+
+def order(db, *lines):
+    so = models.SalesOrder(order_date=datetime.date(2025, 1, 5), status="Open")
+    db.add(so); db.flush()
+    db.add_all([models.SalesOrderLine(so_id=so.id, quantity=q, unit_price=p) for q, p in lines])
+    db.commit()
+    return so
+
+def total(db, model, id):
+    db.expire_all()
+    return float(db.get(model, id).total_amount)
+
+def test_line_changes_keep_the_header_in_sync(client, db):
+    a = order(db, (2, 10), (1, 5.5))
+    b = order(db)
+    assert total(db, models.SalesOrder, a.id) == 25.5 and total(db, models.SalesOrder, b.id) == 0.0
+    line = db.query(models.SalesOrderLine).filter_by(so_id=a.id, quantity=2).one()
+    assert client.put(f"/sales_order_lines/{line.id}", json={"quantity": 3}).status_code == 200
+    assert total(db, models.SalesOrder, a.id) == 35.5
+    # moving a line updates both the old and the new order
+    assert client.put(f"/sales_order_lines/{line.id}", json={"so_id": b.id}).status_code == 200
+    assert total(db, models.SalesOrder, a.id) == 5.5 and total(db, models.SalesOrder, b.id) == 30.0
+    assert client.delete(f"/sales_order_lines/{line.id}").status_code == 200
+    assert total(db, models.SalesOrder, b.id) == 0.0
+
+def test_client_supplied_totals_are_ignored(client, db):
+    so = order(db, (4, 25))
+    assert client.put(f"/sales_orders/{so.id}", json={"total_amount": 999, "status": "Shipped"}).json()["total_amount"] == 100.0
+    created = client.post("/sales_orders/", json={"status": "Open", "total_amount": 500}).json()
+    assert created["total_amount"] == 0.0
+    po = client.post("/purchase_orders/", json={"status": "Open", "total_amount": 500}).json()
+    assert po["total_amount"] == 0.0
+    r = client.post("/sales_orders/upload", files={"file": ("so.csv", b"status,total_amount\nOpen,123\n", "text/csv")})
+    assert r.json() == {"inserted": 1}
+    uploaded = db.query(models.SalesOrder).filter(models.SalesOrder.id > created["id"]).one()
+    assert float(uploaded.total_amount) == 0.0
+
+def test_recompute_all_repairs_core_writes(client, db):
+    a = order(db, (2, 10))
+    b = order(db)
+    c = order(db, (1, 7))
+    so = models.SalesOrder.__table__
+    # core statements bypass the flush hook
+    db.execute(so.update().values(total_amount=1))
+    db.commit()
+    assert client.post("/sales_orders/recompute_totals").json() == {"table": "sales_orders", "updated": 2, "emptied": 0}
+    assert total(db, models.SalesOrder, a.id) == 20.0 and total(db, models.SalesOrder, c.id) == 7.0
+    assert total(db, models.SalesOrder, b.id) == 1.0
+    assert client.post("/sales_orders/recompute_totals?include_empty=true").json()["emptied"] == 1
+    assert total(db, models.SalesOrder, b.id) == 0.0
@@ -0,0 +1,70 @@
+import datetime
+import pytest
+import models, periods
+
+def journal(db, d, code="1000", debit=100, credit=0):
+    je = models.JournalEntry(date=d, description="t")
+    db.add(je); db.flush()
+    db.add(models.JournalEntryLine(journal_id=je.id, account_code=code, debit=debit, credit=credit))
+    db.commit()
+    return je.id
+
+def test_closed_period_rejects_writes(client, db):
+    j = journal(db, datetime.date(2025, 1, 15))
+    assert client.post("/reports/period_close?period=2025-01").json()["closed"] is True
+    r = client.post("/journal_entries/", json={"date": "2025-01-20", "description": "late"})
+    assert r.status_code == 409 and "2025-01" in r.json()["detail"]
+    # moving a journal out of the closed period, or a line onto one of its journals, is a change to it too
+    assert client.put(f"/journal_entries/{j}", json={"date": "2025-02-01"}).status_code == 409
+    db.add(models.JournalEntryLine(journal_id=j, account_code="4000", credit=100))
+    with pytest.raises(periods.PeriodClosedError):
+        db.commit()
+    db.rollback()
+    journal(db, datetime.date(2025, 2, 1))
+
+def test_double_close_and_reopen(client, db):
+    assert client.post("/reports/period_close?period=2025-01").status_code == 200
+    assert client.post("/reports/period_close?period=2025-01").status_code == 400
+    assert client.post("/reports/period_close?period=2025-1x").status_code == 400
+    assert client.delete("/reports/period_close?period=2025-01").json() == {"ok": True}
+    assert client.delete("/reports/period_close?period=2025-01").status_code == 404
+    assert client.get("/reports/period_summary?period=2025-01").status_code == 400
+
+def test_trial_balance_of_a_closed_period_is_frozen(client, db):
+    journal(db, datetime.date(2025, 1, 15), "1000", 100, 0)
+    journal(db, datetime.date(2025, 1, 16), "4000", 0, 100)
+    client.post("/reports/period_close?period=2025-01")
+    # a write that bypasses the guard does not change the closed figures
+    db.execute(models.JournalEntryLine.__table__.update().values(debit=999).where(models.JournalEntryLine.account_code == "1000"))
+    db.commit()
+    tb = {r["account_code"]: r for r in client.get("/reports/trial_balance?period=2025-01").json()}
+    assert tb["1000"]["debit"] == 100.0 and tb["4000"]["credit"] == 100.0
+    summary = client.get("/reports/period_summary?period=2025-01").json()
+    assert {g["account_code"] for g in summary["gl"]} == {"1000", "4000"}
+
+def test_trial_balance_reports_its_source(client, db):
+    journal(db, datetime.date(2025, 1, 15))
+    assert client.get("/reports/trial_balance?period=2025-01").headers["X-Data-Source"] == "live"
+    client.post("/reports/period_close?period=2025-01")
+    assert client.get("/reports/trial_balance?period=2025-01").headers["X-Data-Source"] == "frozen"
+    assert client.get("/reports/trial_balance").headers["X-Data-Source"] == "live"
+
+def test_close_checks_the_database_not_the_worker_cache(client, db, monkeypatch):
+    assert client.post("/reports/period_close?period=2025-01").status_code == 200
+    # another worker's cache has not seen the close yet
+    monkeypatch.setattr(periods, "_closed", frozenset())
+    monkeypatch.setattr(periods, "_loaded_at", periods.time.monotonic())
+    assert client.post("/reports/period_close?period=2025-01").status_code == 400
+
+def test_pnl_of_a_closed_period_is_frozen(client, db):
+    db.add_all([models.GLAccount(code="4000", name="Sales", type="Revenue"), models.GLAccount(code="6000", name="Rent", type="Expense")])
+    journal(db, datetime.date(2025, 1, 15), "4000", 0, 300)
+    journal(db, datetime.date(2025, 1, 16), "6000", 120, 0)
+    live = client.get("/reports/pnl?period=2025-01")
+    assert live.headers["X-Data-Source"] == "live"
+    client.post("/reports/period_close?period=2025-01")
+    db.execute(models.JournalEntryLine.__table__.update().values(debit=999).where(models.JournalEntryLine.account_code == "6000"))
+    db.commit()
+    frozen = client.get("/reports/pnl?period=2025-01")
+    assert frozen.headers["X-Data-Source"] == "frozen"
+    assert frozen.json() == live.json() == {"revenue": -300.0, "expense": 120.0, "net_income": -420.0}
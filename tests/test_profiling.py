@@ -0,0 +1,15 @@
+import os
+import profiling
+
+def test_profile_needs_the_admin_token(client):
+    assert client.get("/health?profile=1").status_code == 403
+    assert client.get("/health", headers={"X-Profile": "1", "X-Admin-Token": "wrong"}).status_code == 403
+    # non-ASCII tokens are refused, not a 500
+    assert client.get("/health?profile=1", headers={"X-Admin-Token": "töken".encode("latin-1")}).status_code == 403
+    assert client.get("/health?profile=1", headers={"X-Admin-Token": "töken".encode()}).status_code == 403
+
+def test_profiled_request_writes_an_artifact(client):
+    r = client.get("/health", headers={"X-Profile": "1", "X-Admin-Token": "test-token"})
+    assert r.status_code == 200
+    assert os.path.exists(os.path.join(profiling.PROFILE_DIR, r.headers["X-Profile-Artifact"]))
+    assert "X-Profile-Artifact" not in client.get("/health").headers
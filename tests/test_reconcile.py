@@ -0,0 +1,47 @@
+import datetime
+import models, reconcile
+
+D = datetime.date(2025, 3, 10)
+
+def day(n):
+    return D + datetime.timedelta(days=n)
+
+def test_reference_match_beats_amount_match():
+    candidates = [(day(0), 5000, None, "cash_flow", 1), (day(2), 5000, "inv 42", "journal_lines", 2)]
+    # the second line would take candidate 0 by amount and date, so references go first
+    statement = [(day(1), 5000, None), (day(0), 5000, "INV42")]
+    assert reconcile.match(statement, candidates) == [(0, "amount_date"), (1, "reference")]
+
+def test_amount_match_takes_the_closest_unused_date():
+    candidates = [(day(-3), 1200, None, "cash_flow", 1), (day(1), 1200, None, "cash_flow", 2), (day(0), 1300, None, "cash_flow", 3)]
+    statement = [(day(0), 1200, None), (day(0), 1200, None), (day(0), 1200, None)]
+    assert reconcile.match(statement, candidates) == [(1, "amount_date"), (0, "amount_date"), (None, None)]
+
+def test_window_and_sign_are_respected():
+    candidates = [(day(4), 700, "X", "cash_flow", 1), (day(0), -700, None, "cash_flow", 2)]
+    statement = [(day(0), 700, "X")]
+    assert reconcile.match(statement, candidates, window=3) == [(None, None)]
+    assert reconcile.match(statement, candidates, window=4) == [(0, "reference")]
+    assert reconcile.match([], candidates) == []
+    assert reconcile.match(statement, []) == [(None, None)]
+
+def test_auto_match_endpoint(client, db):
+    db.add(models.CashFlow(date=day(0), amount=250, description="Rent"))
+    db.add(models.CashFlow(date=day(5), amount=-80, description="Fees"))
+    db.commit()
+    csv = "date,amount,reference\n2025-03-11,250.00,\n2025-03-15,-80,FEES\n2025-03-20,9.99,\n"
+    r = client.post("/reconciliation/auto_match?account_code=1000&period=2025-03", files={"file": ("s.csv", csv)})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["matched"] == 2 and body["status"] == "Partially Reconciled"
+    assert body["unmatched"] == [{"date": "2025-03-20", "amount": 9.99, "reference": None}]
+    lines = client.get(f"/reconciliation/{body['reconciliation_id']}/lines?status=Matched").json()
+    assert sorted(l["match_type"] for l in lines) == ["amount_date", "reference"]
+    # rerunning replaces the lines instead of adding to them
+    client.post("/reconciliation/auto_match?account_code=1000&period=2025-03", files={"file": ("s.csv", csv)})
+    assert len(client.get(f"/reconciliation/{body['reconciliation_id']}/lines").json()) == 3
+
+def test_bad_statement_is_rejected(client):
+    r = client.post("/reconciliation/auto_match?account_code=1000&period=2025-03", files={"file": ("s.csv", "date,amount\nnot-a-date,1\n")})
+    assert r.status_code == 400 and "line 2" in r.json()["detail"]
+    assert client.post("/reconciliation/auto_match?account_code=1000&period=2025-13", files={"file": ("s.csv", "date,amount\n")}).status_code == 400
@@ -0,0 +1,45 @@
+import datetime
+import crud, models
+
+def day(m, d=1):
+    return datetime.date(2025, m, d)
+
+def seed(db):
+    db.add_all([models.Vendor(id=i, name=f"V{i}") for i in (1, 2, 3)])
+    db.add_all([models.Product(id=1, sku="P1", name="P1", cost=4), models.Product(id=2, sku="P2", name="P2", cost=7)])
+    db.add_all([
+        models.SupplierContract(id=1, vendor_id=1, start_date=None, end_date=day(3, 31)),
+        models.SupplierContract(id=2, vendor_id=2, start_date=day(2), end_date=None),
+        models.SupplierContract(id=3, vendor_id=3, start_date=day(6), end_date=day(6, 30)),
+    ])
+    db.commit()
+
+def test_contract_sweep_matches_a_scan(db):
+    seed(db)
+    contracts = [(None, day(3, 31), 1), (day(2), None, 2), (day(6), day(6, 30), 3)]
+    lookup = crud._contract_sweep(db)
+    d = day(1)
+    while d <= day(8):
+        active = [v for s, e, v in contracts if (s is None or s <= d) and (e is None or e >= d)]
+        vendors, earliest = lookup(d)
+        assert sorted(vendors) == active
+        assert earliest == (active[0] if active else None)
+        d += datetime.timedelta(days=5)
+
+def test_convert_requisitions(client, db):
+    seed(db)
+    db.add_all([
+        models.PurchaseRequisition(id=1, product_id=1, quantity=2, status="Approved", needed_by=day(7, 15)),
+        models.PurchaseRequisition(id=2, product_id=2, quantity=1, status="Approved", needed_by=day(1, 10)),
+        models.PurchaseRequisition(id=3, product_id=1, quantity=3, status="Approved", needed_by=day(6, 10)),
+        models.PurchaseRequisition(id=4, product_id=2, quantity=1, status="Draft", needed_by=day(1, 10)),
+    ])
+    # product 1 was last bought from vendor 3, which is under contract in June only
+    po = models.PurchaseOrder(vendor_id=3, order_date=day(1))
+    db.add(po); db.flush()
+    db.add(models.PurchaseOrderLine(po_id=po.id, product_id=1, quantity=1, unit_cost=5))
+    db.commit()
+    out = client.post("/purchase_requisitions/convert").json()
+    assert out["requisitions"] == 3 and out["unassigned"] == []
+    assert {o["vendor_id"]: o["total_amount"] for o in out["orders"]} == {2: 8.0, 1: 7.0, 3: 15.0}
+    assert client.post("/purchase_requisitions/convert").json()["requisitions"] == 0
@@ -0,0 +1,81 @@
+import datetime, threading, time
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import database, models, periods
+from database import WriteQueue, write_queue, SessionLocal, engine
+
+def test_waiters_are_admitted_in_arrival_order():
+    q = WriteQueue()
+    assert q.acquire()
+    order = []
+    def writer(n):
+        q.acquire()
+        order.append(n)
+        q.release()
+    threads = []
+    for n in range(4):
+        threads.append(threading.Thread(target=writer, args=(n,)))
+        threads[-1].start()
+        time.sleep(0.02)
+    assert not q.acquire(timeout=0.01)
+    q.release()
+    for t in threads:
+        t.join()
+    assert order == [0, 1, 2, 3]
+
+def hold_from_another_thread():
+    held, done = threading.Event(), threading.Event()
+    def holder():
+        write_queue.acquire()
+        held.set()
+        done.wait(5)
+        write_queue.release()
+    t = threading.Thread(target=holder)
+    t.start()
+    held.wait(5)
+    return done, t
+
+def test_queue_timeout_is_a_503(client, monkeypatch):
+    monkeypatch.setitem(database.SQLITE_PRAGMAS, "busy_timeout", 50)
+    done, t = hold_from_another_thread()
+    try:
+        r = client.post("/vendors/", json={"name": "Acme"})
+    finally:
+        done.set(); t.join()
+    assert r.status_code == 503 and r.headers["Retry-After"] == "1"
+    assert client.post("/vendors/", json={"name": "Acme"}).status_code == 200
+
+def test_lock_belongs_to_the_session_not_the_thread(db):
+    db.add(models.Vendor(name="A")); db.flush()
+    assert write_queue.owner is db
+    # the holder finishes on another thread, as FastAPI may do with a request's session
+    t = threading.Thread(target=db.commit)
+    t.start(); t.join()
+    assert write_queue.owner is None
+    with SessionLocal() as other:
+        other.add(models.Vendor(name="B")); other.commit()
+
+def test_failed_flush_releases_the_lock(db):
+    db.add(models.Product(name="no sku"))
+    with pytest.raises(IntegrityError):
+        db.flush()
+    assert write_queue.owner is None
+    with SessionLocal() as other:
+        other.add(models.Vendor(name="B")); other.commit()
+    db.rollback()
+
+def test_closed_period_rejection_never_takes_the_lock(client, db):
+    assert client.post("/reports/period_close?period=2025-01").status_code == 200
+    db.add(models.JournalEntry(date=datetime.date(2025, 1, 20)))
+    with pytest.raises(periods.PeriodClosedError):
+        db.flush()
+    assert write_queue.owner is None
+    db.rollback()
+
+def test_plain_sessions_on_the_engine_queue_too():
+    with Session(engine) as s:
+        s.add(models.Vendor(name="C")); s.flush()
+        assert write_queue.owner is s
+        s.rollback()
+    assert write_queue.owner is None